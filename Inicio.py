@@ -1,6 +1,7 @@
 # streamlit_app: Inicio
 # app.py (Página Principal)
 import streamlit as st
+from segmentador.vista import mostrar_memoria
 
 # Configuración general de la página. Esto se aplicará a todas las páginas.
 st.set_page_config(
@@ -15,6 +16,8 @@ with st.sidebar:
     st.image("logo.png", width=200)
     st.title("Menú de Navegación")
     st.info("Selecciona el tipo de reporte que deseas procesar en el menú de arriba.")
+# Uso de memoria de esta sesión y del servidor compartido.
+mostrar_memoria()
 
 # --- CONTENIDO PRINCIPAL DE LA PÁGINA DE BIENVENIDA ---
 st.title("Bienvenido a la Herramienta de Automatización del cortee de los Reportes")
@@ -0,0 +1,52 @@
+# pages/5_Reportes_Lote.py
+import streamlit as st
+from datetime import datetime
+from segmentador.lote import REGIONES, identificar_corte, procesar_lote, region_sugerida
+from segmentador.paralelo import trabajadores_disponibles
+from segmentador.salida import extension_salida, mime_salida
+from segmentador.memoria import gobernador_global
+from segmentador.vista import datos_descarga, elegir_compresion, mostrar_memoria, registrar_subida
+
+# --- Interfaz de Usuario ---
+st.title("Segmentador de Reportes - Lote")
+st.markdown("Sube varios consolidados (Lima o Provincia, Corte 1 o Corte 2) y descarga todos los reportes en un solo archivo.")
+st.info("El corte se reconoce por la hoja 'Reporte CORTE 1' o 'Reporte CORTE 2'. Si varios archivos traen la misma hoja BASE, se lee una sola vez.")
+
+uploaded_files = st.file_uploader("Sube tus archivos Excel", type=["xlsx"], accept_multiple_files=True, key="lote_uploader")
+
+if uploaded_files:
+    archivos = []
+    for i, uploaded_file in enumerate(uploaded_files):
+        try:
+            corte = identificar_corte(uploaded_file)
+        except Exception:
+            corte = None
+        columna_nombre, columna_region = st.columns([3, 1])
+        columna_nombre.write(f"**{uploaded_file.name}** — " + (f"Corte {corte}" if corte else "sin hoja de reporte reconocida"))
+        # La BASE de Lima y la de Provincia tienen las mismas columnas: la región la confirma quien sube el archivo.
+        region = columna_region.selectbox("Región", REGIONES, index=REGIONES.index(region_sugerida(uploaded_file.name)),
+                                          format_func=str.capitalize, key=f"lote_region_{i}", label_visibility="collapsed")
+        archivos.append((uploaded_file.name, uploaded_file.getvalue(), region))
+        registrar_subida(f"lote_{i}", uploaded_file)
+    paralelo = st.number_input("Archivos procesados a la vez", min_value=1, max_value=trabajadores_disponibles(),
+                               value=min(len(archivos), trabajadores_disponibles()), key="lote_paralelo")
+    compresion = elegir_compresion("lote_compresion")
+    if st.button("Procesar y Generar Reportes", type="primary"):
+        with st.spinner("Procesando el lote... Esto puede tardar varios minutos."):
+            # Un lote ocupa un solo turno de proceso pesado del servidor (ver `segmentador.memoria`).
+            with gobernador_global().turno_pesado():
+                zip_file, log_data = procesar_lote(archivos, compresion, paralelo)
+        if zip_file:
+            st.success("¡Proceso completado!")
+            st.subheader("Log de Validación del Proceso")
+            st.text_area("Resultado de la validación:", "\n".join(log_data), height=300)
+            st.subheader("Descargar Resultados")
+            st.download_button(label=f"Descargar todos los reportes ({extension_salida(compresion)})", data=datos_descarga('lote', zip_file),
+                               file_name=f"Reportes_Lote_Segmentados_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension_salida(compresion)}",
+                               mime=mime_salida(compresion))
+        else:
+            st.error("Ningún archivo del lote se pudo procesar. Por favor, revisa los detalles a continuación.")
+            st.subheader("Log de Errores")
+            st.text_area("Detalles del error:", "\n".join(log_data), height=300)
+
+mostrar_memoria()
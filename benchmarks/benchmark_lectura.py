@@ -0,0 +1,65 @@
+# benchmarks/benchmark_lectura.py
+"""
+Compara los motores de lectura de Excel (openpyxl vs calamine) sobre los
+libros sintéticos de Lima de `datos_sinteticos.py` (hoja 'BASE' ancha),
+leyendo todas las columnas y solo las columnas hasta 'RECIBO1_PAGADO' (como
+hace la página de Lima).
+
+Uso:
+    python benchmarks/benchmark_lectura.py                 # 10k, 100k y 500k filas
+    python benchmarks/benchmark_lectura.py --filas 10000 --repeticiones 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datos_sinteticos import COLUMNA_FINAL, ruta_consolidado  # noqa: E402
+from segmentador.carga import calamine_disponible, cargar_libro  # noqa: E402
+
+def medir(ruta, motor, opciones_base, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cargar_libro(ruta, {'BASE': opciones_base}, motor=motor)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    parser.add_argument('--agencias', type=int, default=400)
+    parser.add_argument('--repeticiones', type=int, default=1)
+    parser.add_argument('--directorio', default=tempfile.gettempdir(),
+                        help='Dónde guardar (y reutilizar) los libros sintéticos.')
+    args = parser.parse_args()
+
+    motores = ['openpyxl'] + (['calamine'] if calamine_disponible() else [])
+    if len(motores) == 1:
+        print("AVISO: python-calamine no está instalado; solo se mide openpyxl.")
+    variantes = {
+        'todas las columnas': {},
+        f'hasta {COLUMNA_FINAL}': {'columnas_hasta': COLUMNA_FINAL, 'columnas_extra': ['ASESOR']},
+    }
+
+    rutas = {}
+    for filas in args.filas:
+        inicio = time.perf_counter()
+        rutas[filas] = ruta_consolidado(args.directorio, 'lima', args.agencias, filas)
+        print(f"Libro sintético de {filas} filas listo en {time.perf_counter() - inicio:.1f} s: {rutas[filas]}")
+
+    print(f"{'filas':>8} | {'motor':<9} | {'lectura':<26} | {'segundos':>8} | {'filas/s':>10}")
+    print("-" * 74)
+    for filas, ruta in rutas.items():
+        for motor in motores:
+            for nombre_variante, opciones in variantes.items():
+                segundos = medir(ruta, motor, opciones, args.repeticiones)
+                print(f"{filas:>8} | {motor:<9} | {nombre_variante:<26} | {segundos:>8.2f} | {filas / segundos:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
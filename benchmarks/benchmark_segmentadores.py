@@ -0,0 +1,196 @@
+# benchmarks/benchmark_segmentadores.py
+"""
+Mide las cuatro páginas de segmentación sobre libros sintéticos
+(`datos_sinteticos.py`) y compara contra una línea base guardada.
+
+Cada medición corre en un proceso nuevo: así el cache de libros no se
+reutiliza entre repeticiones y el pico de memoria (RSS máximo) es el de esa
+página. Se informa filas de BASE por segundo, libros por segundo y pico de
+memoria; una medición es REGRESIÓN si el rendimiento cae o la memoria sube
+más que `--tolerancia` respecto de la línea base.
+
+Uso:
+    python benchmarks/benchmark_segmentadores.py --guardar-linea-base
+    python benchmarks/benchmark_segmentadores.py              # compara; sale con código 1 si hay regresión
+    python benchmarks/benchmark_segmentadores.py --paginas lima provincia --agencias 400 --filas 200000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from datos_sinteticos import ruta_consolidado  # noqa: E402
+
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'linea_base.json')
+
+# página -> tipo de libro sintético que usa
+PAGINAS = {
+    'lima': 'lima',
+    'provincia': 'provincia',
+    'provincia_todas_las_zonas': 'provincia',
+    'lima_corte_2': 'lima_corte_2',
+    'provincia_corte_2': 'provincia_corte_2',
+}
+
+
+def _procesar(pagina, archivo, trabajadores, perfil):
+    # Las importaciones van aquí: se ejecutan en el proceso de la medición.
+    if pagina == 'lima':
+        from segmentador.lima import procesar_archivos_excel
+        return procesar_archivos_excel(archivo, trabajadores, perfil)
+    if pagina == 'provincia':
+        from segmentador.provincia import cargar_libro_provincia, procesar_reportes_provincia
+        # La zona con más filas, que es la que más pesa en la práctica.
+        zonas = cargar_libro_provincia(archivo).hoja('BASE')['ZONA'].value_counts()
+        archivo.seek(0)
+        return procesar_reportes_provincia(archivo, zonas.index[0], trabajadores=trabajadores, perfil=perfil)
+    if pagina == 'provincia_todas_las_zonas':
+        from segmentador.provincia import procesar_todas_las_zonas
+        return procesar_todas_las_zonas(archivo, trabajadores=trabajadores, perfil=perfil)
+    if pagina == 'lima_corte_2':
+        from segmentador.lima_corte_2 import procesar_reporte_corte_2
+        return procesar_reporte_corte_2(archivo, trabajadores, perfil)
+    from segmentador.provincia_corte_2 import procesar_provincia_corte_2
+    return procesar_provincia_corte_2(archivo, trabajadores, perfil)
+
+
+def medir_una_vez(pagina, ruta, trabajadores):
+    """Se ejecuta en un proceso nuevo. Devuelve segundos, libros, filas y pico de memoria."""
+    from segmentador.perfil import PerfilEjecucion, memoria_pico_mb
+    perfil = PerfilEjecucion(pagina)
+    with open(ruta, 'rb') as archivo:
+        inicio = time.perf_counter()
+        zip_file, log_output = _procesar(pagina, archivo, trabajadores, perfil)
+        segundos = time.perf_counter() - inicio
+    if zip_file is None:
+        raise RuntimeError(f"{pagina}: el proceso no generó resultados:\n" + "\n".join(log_output[-5:]))
+    with zipfile.ZipFile(zip_file) as zf:
+        libros = len(zf.namelist())
+    filas_base = next((r['filas'] for r in perfil.etapas if r['etapa'].startswith('Particionado')), None)
+    return {
+        'segundos': segundos,
+        'libros': libros,
+        'filas_base': filas_base,
+        'pico_mb': memoria_pico_mb(),
+        'etapas': {r['etapa']: round(r['segundos'], 4) for r in perfil.etapas},
+    }
+
+
+def medir(pagina, ruta, trabajadores, repeticiones):
+    """Mejor tiempo y mayor pico de memoria de `repeticiones` corridas, cada una en un proceso nuevo."""
+    contexto = multiprocessing.get_context('spawn')
+    corridas = []
+    for _ in range(repeticiones):
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+            corridas.append(pool.submit(medir_una_vez, pagina, ruta, trabajadores).result())
+    mejor = min(corridas, key=lambda c: c['segundos'])
+    picos = [c['pico_mb'] for c in corridas if c['pico_mb'] is not None]
+    return {
+        'segundos': round(mejor['segundos'], 4),
+        'libros': mejor['libros'],
+        'filas_base': mejor['filas_base'],
+        'filas_por_segundo': round((mejor['filas_base'] or 0) / mejor['segundos'], 1),
+        'libros_por_segundo': round(mejor['libros'] / mejor['segundos'], 2),
+        'pico_mb': round(max(picos), 1) if picos else None,
+        'etapas': mejor['etapas'],
+    }
+
+
+def comparar(actual, base, tolerancia):
+    """Lista de textos con las regresiones de `actual` respecto de `base`."""
+    problemas = []
+    for metrica in ('filas_por_segundo', 'libros_por_segundo'):
+        if base.get(metrica) and actual[metrica] < base[metrica] * (1 - tolerancia):
+            problemas.append(f"{metrica} {actual[metrica]} < {base[metrica]} (-{1 - actual[metrica] / base[metrica]:.0%})")
+    if base.get('pico_mb') and actual['pico_mb'] and actual['pico_mb'] > base['pico_mb'] * (1 + tolerancia):
+        problemas.append(f"pico_mb {actual['pico_mb']} > {base['pico_mb']} (+{actual['pico_mb'] / base['pico_mb'] - 1:.0%})")
+    return problemas
+
+
+def maquina():
+    """Datos del equipo y de las librerías con que se midió."""
+    import pandas
+    return {
+        'sistema': platform.platform(),
+        'procesador': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version(),
+        'pandas': pandas.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paginas', nargs='+', choices=list(PAGINAS), default=list(PAGINAS))
+    parser.add_argument('--agencias', type=int, default=100)
+    parser.add_argument('--filas', type=int, nargs='+', default=[20_000, 100_000])
+    parser.add_argument('--repeticiones', type=int, default=2)
+    parser.add_argument('--trabajadores', type=int, default=1)
+    parser.add_argument('--directorio', default=tempfile.gettempdir(),
+                        help='Dónde guardar (y reutilizar) los libros sintéticos.')
+    parser.add_argument('--linea-base', default=LINEA_BASE, help='Archivo JSON de la línea base.')
+    parser.add_argument('--guardar-linea-base', action='store_true',
+                        help='Guardar los resultados como nueva línea base en vez de comparar.')
+    parser.add_argument('--tolerancia', type=float, default=0.20,
+                        help='Caída de rendimiento o aumento de memoria tolerado (0.20 = 20%%).')
+    args = parser.parse_args()
+
+    linea_base = {}
+    if os.path.exists(args.linea_base) and not args.guardar_linea_base:
+        with open(args.linea_base, encoding='utf-8') as f:
+            guardado = json.load(f)
+        linea_base = guardado.get('resultados', {})
+        if guardado.get('maquina') and guardado['maquina'] != maquina():
+            print(f"Aviso: la línea base se midió en otro equipo: {guardado['maquina']}")
+
+    resultados, regresiones = {}, []
+    print(f"{'página':<26} | {'agencias':>8} | {'filas':>8} | {'segundos':>8} | {'filas/s':>10} | {'libros/s':>8} | {'pico MB':>8} | estado")
+    print("-" * 110)
+    for filas in args.filas:
+        for pagina in args.paginas:
+            ruta = ruta_consolidado(args.directorio, PAGINAS[pagina], args.agencias, filas)
+            clave = f"{pagina}|{args.agencias}ag|{filas}f|{args.trabajadores}t"
+            actual = medir(pagina, ruta, args.trabajadores, args.repeticiones)
+            resultados[clave] = actual
+            estado = "-"
+            if clave in linea_base:
+                problemas = comparar(actual, linea_base[clave], args.tolerancia)
+                estado = "OK" if not problemas else "REGRESIÓN: " + "; ".join(problemas)
+                if problemas:
+                    regresiones.append(clave)
+            pico = f"{actual['pico_mb']:>8.1f}" if actual['pico_mb'] is not None else f"{'-':>8}"
+            print(f"{pagina:<26} | {args.agencias:>8} | {filas:>8} | {actual['segundos']:>8.2f} | "
+                  f"{actual['filas_por_segundo']:>10.0f} | {actual['libros_por_segundo']:>8.1f} | {pico} | {estado}")
+
+    if args.guardar_linea_base:
+        guardado = {}
+        if os.path.exists(args.linea_base):
+            with open(args.linea_base, encoding='utf-8') as f:
+                guardado = json.load(f)
+        guardado.setdefault('resultados', {}).update(resultados)
+        guardado['maquina'] = maquina()
+        guardado['ajustes'] = {'repeticiones': args.repeticiones, 'trabajadores': args.trabajadores,
+                               'tolerancia': args.tolerancia}
+        guardado['fecha'] = time.strftime('%Y-%m-%d')
+        with open(args.linea_base, 'w', encoding='utf-8') as f:
+            json.dump(guardado, f, ensure_ascii=False, indent=2)
+        print(f"Línea base guardada en {args.linea_base}")
+        return 0
+    if not linea_base:
+        print(f"No hay línea base en {args.linea_base}; use --guardar-linea-base para crearla.")
+    if regresiones:
+        print(f"{len(regresiones)} regresión(es) respecto de la línea base.")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
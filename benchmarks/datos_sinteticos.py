@@ -0,0 +1,180 @@
+# benchmarks/datos_sinteticos.py
+"""
+Genera libros consolidados sintéticos con la misma forma que los reales, para
+las cuatro páginas:
+
+    lima               'Reporte CORTE 1' + 'BASE'
+    provincia          igual, con el departamento al final del nombre de la agencia
+    lima_corte_2       'Reporte CORTE 2' con cabecera de dos filas (PENALIDAD 1 / CLAWBACK 1)
+    provincia_corte_2  Corte 2 con departamento en el nombre de la agencia
+
+Las agencias tienen tamaños desiguales (unas pocas concentran muchas altas),
+cada una pertenece a un departamento y cada departamento a una zona, y parte
+de las filas de EXPORTEL llegan con el asesor alias 'EXPORTEL PROVINCIA'
+(salvo en Lima Corte 2, que no usa alias). Una fracción de agencias tiene las
+ALTAS del reporte descuadradas a propósito.
+
+Uso:
+    python benchmarks/datos_sinteticos.py lima --agencias 100 --filas 50000 -o LIMA.xlsx
+"""
+import argparse
+import os
+
+import numpy as np
+import xlsxwriter
+
+TIPOS = ['lima', 'provincia', 'lima_corte_2', 'provincia_corte_2']
+
+ZONAS = {
+    'NORTE': ['PIURA', 'LA LIBERTAD', 'LAMBAYEQUE', 'CAJAMARCA', 'TUMBES'],
+    'SUR': ['AREQUIPA', 'CUSCO', 'PUNO', 'TACNA', 'ICA', 'MOQUEGUA'],
+    'ORIENTE': ['SAN MARTIN', 'LORETO', 'UCAYALI', 'HUANUCO', 'MADRE DE DIOS'],
+    'CENTRO': ['JUNIN', 'HUANCAVELICA', 'AYACUCHO', 'PASCO'],
+}
+AGENCIA_ALIAS = 'EXPORTEL S.A.C.'
+ASESOR_ALIAS = 'EXPORTEL PROVINCIA'
+
+COLUMNAS_BASE = 42
+COLUMNA_FINAL = 'RECIBO1_PAGADO'
+POSICION_COLUMNA_FINAL = 14
+
+
+def cabeceras_base():
+    fijas = ['COD_PEDIDO', 'DNI_CLIENTE', 'ASESOR', 'ZONA', 'DEPARTAMENTO', 'FECHA_ALTA', 'PLAN', 'PRECIO']
+    cabeceras = fijas + [f'CAMPO_{i:02d}' for i in range(len(fijas), COLUMNAS_BASE)]
+    cabeceras[POSICION_COLUMNA_FINAL] = COLUMNA_FINAL
+    return cabeceras
+
+
+def _agencias(rng, n_agencias):
+    """Nombres, departamento y zona de cada agencia (la última es EXPORTEL)."""
+    nombres = [f'AGENCIA {i:03d} S.A.C.' for i in range(n_agencias - 1)] + [AGENCIA_ALIAS]
+    departamentos = [d for deptos in ZONAS.values() for d in deptos]
+    zona_de = {d: zona for zona, deptos in ZONAS.items() for d in deptos}
+    depto_agencia = [departamentos[i] for i in rng.integers(0, len(departamentos), n_agencias)]
+    return nombres, depto_agencia, [zona_de[d] for d in depto_agencia]
+
+
+def generar_datos(tipo, n_agencias=50, filas=20_000, descuadres=0.02, semilla=7):
+    """
+    Devuelve (reporte, base) como listas de filas. `reporte` es una lista de
+    dicts (RUC, AGENCIA, ALTAS, TOTAL) y `base` un dict de columnas.
+    """
+    rng = np.random.default_rng(semilla)
+    nombres, depto_agencia, zona_agencia = _agencias(rng, max(n_agencias, 2))
+    # Tamaños desiguales: pesos log-normales.
+    pesos = rng.lognormal(0, 1, len(nombres))
+    indice = rng.choice(len(nombres), size=filas, p=pesos / pesos.sum())
+
+    asesores = np.array(nombres, dtype=object)[indice]
+    if tipo != 'lima_corte_2':
+        es_exportel = indice == len(nombres) - 1
+        asesores[es_exportel & (rng.random(filas) < 0.3)] = ASESOR_ALIAS
+    base = {
+        'COD_PEDIDO': np.arange(1_000_000, 1_000_000 + filas),
+        'DNI_CLIENTE': [str(v) for v in rng.integers(10_000_000, 99_999_999, filas)],
+        'ASESOR': asesores.tolist(),
+        'ZONA': np.array(zona_agencia, dtype=object)[indice].tolist(),
+        'DEPARTAMENTO': np.array(depto_agencia, dtype=object)[indice].tolist(),
+        'FECHA_ALTA': 45_000 + rng.integers(0, 60, filas),
+        'PLAN': np.array(['FIBRA 200', 'FIBRA 400', 'FIBRA 1000'], dtype=object)[rng.integers(0, 3, filas)].tolist(),
+        'PRECIO': rng.choice([69.9, 89.9, 119.9], filas),
+    }
+    numeros = rng.integers(0, 10_000, (filas, COLUMNAS_BASE))
+    for posicion, columna in enumerate(cabeceras_base()):
+        if columna in base:
+            continue
+        if columna == COLUMNA_FINAL:
+            base[columna] = np.array(['SI', 'NO'], dtype=object)[numeros[:, posicion] % 2].tolist()
+        elif posicion % 3 == 0:
+            base[columna] = [f'VALOR {v}' for v in numeros[:, posicion]]
+        else:
+            base[columna] = numeros[:, posicion]
+
+    altas = np.bincount(indice, minlength=len(nombres))
+    descuadradas = rng.random(len(nombres)) < descuadres
+    con_departamento = tipo in ('provincia', 'provincia_corte_2')
+    reporte = []
+    for i, nombre in enumerate(nombres):
+        if altas[i] == 0:
+            continue
+        reporte.append({
+            'RUC': f'20{rng.integers(100_000_000, 999_999_999)}',
+            'AGENCIA': f'{nombre} {depto_agencia[i]}' if con_departamento else nombre,
+            'ALTAS': int(altas[i] + (1 if descuadradas[i] else 0)),
+            'TOTAL': round(float(altas[i]) * 35.5, 2),
+        })
+    return reporte, base
+
+
+def _escribir_base(libro, base):
+    hoja = libro.add_worksheet('BASE')
+    formato_fecha = libro.add_format({'num_format': 'yyyy-mm-dd'})
+    cabeceras = cabeceras_base()
+    hoja.write_row(0, 0, cabeceras)
+    columnas = [base[c] for c in cabeceras]
+    posicion_fecha = cabeceras.index('FECHA_ALTA')
+    for fila, valores in enumerate(zip(*columnas), start=1):
+        hoja.write_row(fila, 0, valores)
+        hoja.write_number(fila, posicion_fecha, valores[posicion_fecha], formato_fecha)
+
+
+def _escribir_reporte_corte_1(libro, reporte):
+    hoja = libro.add_worksheet('Reporte CORTE 1')
+    hoja.write_row(0, 0, ['RUC', 'AGENCIA', 'ALTAS', 'CUMPLIMIENTO ALTAS %', 'TOTAL A PAGAR'])
+    for fila, r in enumerate(reporte, start=1):
+        hoja.write_row(fila, 0, [r['RUC'], r['AGENCIA'], r['ALTAS'], 0.95, r['TOTAL']])
+
+
+def _escribir_reporte_corte_2(libro, reporte):
+    """Cabecera de dos filas: PENALIDAD 1 y CLAWBACK 1 combinadas sobre sus columnas."""
+    hoja = libro.add_worksheet('Reporte CORTE 2')
+    centrado = libro.add_format({'bold': True, 'align': 'center'})
+    hoja.merge_range(0, 3, 0, 4, 'PENALIDAD 1', centrado)
+    hoja.merge_range(0, 5, 0, 6, 'CLAWBACK 1', centrado)
+    hoja.write_row(1, 0, ['RUC', 'AGENCIA', 'ALTAS', 'Cumplimiento Altas %', 'Monto',
+                          'Cumplimiento Corte 2 %', 'Monto', 'TOTAL A PAGAR CORTE 2'])
+    for fila, r in enumerate(reporte, start=2):
+        hoja.write_row(fila, 0, [r['RUC'], r['AGENCIA'], r['ALTAS'], 0.95, -12.5, 0.9, -8.0, r['TOTAL']])
+
+
+def crear_consolidado(ruta, tipo, n_agencias=50, filas=20_000, descuadres=0.02, semilla=7):
+    """Escribe el libro consolidado sintético de `tipo` en `ruta` (xlsxwriter en modo constant_memory)."""
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo desconocido '{tipo}'. Opciones: {', '.join(TIPOS)}")
+    reporte, base = generar_datos(tipo, n_agencias, filas, descuadres, semilla)
+    libro = xlsxwriter.Workbook(ruta, {'constant_memory': True})
+    if tipo in ('lima', 'provincia'):
+        _escribir_reporte_corte_1(libro, reporte)
+    else:
+        _escribir_reporte_corte_2(libro, reporte)
+    _escribir_base(libro, base)
+    libro.close()
+    return ruta
+
+
+def ruta_consolidado(directorio, tipo, n_agencias, filas, semilla=7):
+    """Crea el libro si no existe en `directorio` y devuelve su ruta (se reutiliza entre corridas)."""
+    ruta = os.path.join(directorio, f'segmentador_{tipo}_{n_agencias}ag_{filas}f_s{semilla}.xlsx')
+    if not os.path.exists(ruta):
+        os.makedirs(directorio, exist_ok=True)
+        crear_consolidado(ruta + '.tmp', tipo, n_agencias, filas, semilla=semilla)
+        os.replace(ruta + '.tmp', ruta)
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('tipo', choices=TIPOS)
+    parser.add_argument('--agencias', type=int, default=50)
+    parser.add_argument('--filas', type=int, default=20_000)
+    parser.add_argument('--descuadres', type=float, default=0.02, help='Fracción de agencias con ALTAS descuadradas.')
+    parser.add_argument('--semilla', type=int, default=7)
+    parser.add_argument('-o', '--salida', required=True, help='Ruta del .xlsx a crear.')
+    args = parser.parse_args()
+    crear_consolidado(args.salida, args.tipo, args.agencias, args.filas, args.descuadres, args.semilla)
+    print(f"Libro '{args.tipo}' con {args.agencias} agencias y {args.filas} filas: {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+# segmentador/__init__.py
+"""
+Lógica compartida por las páginas de segmentación de reportes.
+"""
+from segmentador.carga import LibroCargado, cargar_libro, motor_excel
+from segmentador.cabeceras import leer_cabeceras, revisar_cabeceras
+from segmentador.columnar import AlmacenColumnar, almacen_global
+from segmentador.cache import (CacheResultados, cache_global, cargar_libro_con_cache,
+                               huella_contenido, procesar_con_cache)
+from segmentador.particion import Particion, aplicar_alias, particionar
+from segmentador.conciliacion import Conciliacion, conciliar
+from segmentador.corte_2 import PlanCorte2
+from segmentador.registro import RegistroAgencias, cargar_registro, registro_global
+from segmentador.normalizacion import (agencias_base, agencias_base_comparando_normalizado,
+                                       normalizar_nombre, normalizar_nombres)
+from segmentador.escritor import LibroXlsx
+from segmentador.libros import libro_corte_2, libro_lima, libro_provincia
+from segmentador.memoria import GobernadorMemoria, gobernador_global
+from segmentador.incremental import AlmacenLibros, SegmentacionIncremental, huella_agencia
+from segmentador.paralelo import generar_libros
+from segmentador.perfil import PerfilEjecucion
+from segmentador.salida import COMPRESIONES, SalidaTar, SalidaZip, abrir_salida, escribir_libros
+from segmentador.trabajos import ColaTrabajos, cola_global
+from segmentador.volcado import BaseVolcada, volcar_base
+from segmentador.lote import huella_hoja, identificar_corte, procesar_lote
+
+__all__ = ["LibroCargado", "cargar_libro", "motor_excel", "leer_cabeceras", "revisar_cabeceras", "AlmacenColumnar", "almacen_global", "CacheResultados", "cache_global",
+           "cargar_libro_con_cache", "huella_contenido", "procesar_con_cache",
+           "Particion", "aplicar_alias", "particionar", "Conciliacion", "conciliar", "PlanCorte2", "RegistroAgencias", "cargar_registro", "registro_global",
+           "agencias_base", "agencias_base_comparando_normalizado",
+           "normalizar_nombre", "normalizar_nombres", "LibroXlsx", "libro_corte_2", "libro_lima", "libro_provincia",
+           "GobernadorMemoria", "gobernador_global", "AlmacenLibros", "SegmentacionIncremental", "huella_agencia",
+           "generar_libros", "PerfilEjecucion", "COMPRESIONES", "SalidaTar", "SalidaZip",
+           "abrir_salida", "escribir_libros", "ColaTrabajos", "cola_global", "BaseVolcada", "volcar_base",
+           "huella_hoja", "identificar_corte", "procesar_lote"]
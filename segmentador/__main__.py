@@ -0,0 +1,7 @@
+# segmentador/__main__.py
+"""Permite ejecutar la CLI como `python -m segmentador ...`."""
+import sys
+
+from segmentador.cli import main
+
+sys.exit(main())
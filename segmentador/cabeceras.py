@@ -0,0 +1,168 @@
+# segmentador/cabeceras.py
+"""
+Lectura rápida de las cabeceras de un xlsx, sin abrir el libro con pandas.
+
+Un xlsx es un ZIP de XML. Para las primeras filas de una hoja basta con
+recorrer el XML de esa hoja como flujo (`iterparse`) y cortar al pasar la
+última fila pedida; de la tabla de textos compartidos solo se resuelven los
+índices que esas filas usan, y se deja de leer al llegar al mayor. Así
+revisar las cabeceras de un archivo de cientos de MB toma milisegundos, y las
+páginas pueden rechazar un archivo mal armado antes de leerlo entero.
+
+Los requisitos de cada tipo de libro están en `segmentador.esquemas`
+(`CABECERAS_LIMA`, etc.): {hoja: [cabeceras de la fila 1, de la fila 2, ...]}.
+"""
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+_COLUMNA = re.compile(r'[A-Z]+')
+
+
+def _local(etiqueta):
+    # Sin el espacio de nombres (el de Office Open XML "strict" es distinto del habitual).
+    return etiqueta.rsplit('}', 1)[-1]
+
+
+def partes_del_libro(zf):
+    """{'hojas': {nombre: ruta}, 'cadenas': ruta o None, 'estilos': ruta o None} dentro del xlsx."""
+    relaciones = {}
+    for relacion in ET.fromstring(zf.read('xl/_rels/workbook.xml.rels')):
+        if _local(relacion.tag) != 'Relationship': continue
+        destino = relacion.get('Target')
+        relaciones[relacion.get('Id')] = (relacion.get('Type', '').rsplit('/', 1)[-1],
+                                          destino.lstrip('/') if destino.startswith('/') else 'xl/' + destino)
+    hojas = {}
+    for elemento in ET.fromstring(zf.read('xl/workbook.xml')).iter():
+        if _local(elemento.tag) == 'sheet':
+            id_relacion = next((valor for clave, valor in elemento.attrib.items() if _local(clave) == 'id'), None)
+            hojas[elemento.get('name')] = relaciones.get(id_relacion, (None, None))[1]
+    por_tipo = {tipo: ruta for tipo, ruta in relaciones.values()}
+    return {'hojas': hojas, 'cadenas': por_tipo.get('sharedStrings'), 'estilos': por_tipo.get('styles')}
+
+
+def _indice_columna(referencia):
+    letras = _COLUMNA.match(referencia or '')
+    if letras is None:
+        return None
+    indice = 0
+    for letra in letras.group():
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+def _texto(elemento):
+    # Texto de una celda con formato enriquecido (<r><t>...</t></r>), sin la fonética (<rPh>).
+    partes = []
+    for hijo in elemento:
+        nombre = _local(hijo.tag)
+        if nombre == 't':
+            partes.append(hijo.text or '')
+        elif nombre == 'r':
+            partes.extend(nieto.text or '' for nieto in hijo if _local(nieto.tag) == 't')
+    return ''.join(partes)
+
+
+def _primeras_filas(flujo, filas):
+    """Lista de `filas` filas (cada una {columna: (tipo, valor)}) del XML de una hoja."""
+    leidas = [{} for _ in range(filas)]
+    numero = 0
+    for _, elemento in ET.iterparse(flujo):
+        if _local(elemento.tag) != 'row': continue
+        numero = int(elemento.get('r', numero + 1))
+        if numero > filas:
+            break
+        siguiente_columna = 0
+        for celda in elemento:
+            if _local(celda.tag) != 'c': continue
+            columna = _indice_columna(celda.get('r'))
+            columna = siguiente_columna if columna is None else columna
+            siguiente_columna = columna + 1
+            tipo, valor = celda.get('t', 'n'), None
+            for hijo in celda:
+                nombre = _local(hijo.tag)
+                if nombre == 'v':
+                    valor = hijo.text
+                elif nombre == 'is':
+                    valor = _texto(hijo)
+            if valor is not None:
+                leidas[numero - 1][columna] = (tipo, valor)
+        elemento.clear()
+    return leidas
+
+
+def _cadenas_compartidas(flujo, indices):
+    """{indice: texto} de la tabla de textos compartidos, solo para `indices`."""
+    encontradas, ultimo, actual = {}, max(indices), 0
+    for _, elemento in ET.iterparse(flujo):
+        if _local(elemento.tag) != 'si': continue
+        if actual in indices:
+            encontradas[actual] = _texto(elemento)
+        elemento.clear()
+        actual += 1
+        if actual > ultimo:
+            break
+    return encontradas
+
+
+def leer_cabeceras(archivo_excel, nombre_hoja, filas=1):
+    """
+    Las primeras `filas` filas de la hoja como listas de textos (celdas vacías
+    como ''), en mayúsculas y sin espacios extremos como las deja
+    `LibroCargado.cabeceras`. None si la hoja no existe.
+    """
+    if hasattr(archivo_excel, 'seek'): archivo_excel.seek(0)
+    with zipfile.ZipFile(archivo_excel) as zf:
+        partes = partes_del_libro(zf)
+        ruta = partes['hojas'].get(nombre_hoja)
+        if ruta is None:
+            return None
+        with zf.open(ruta) as flujo:
+            leidas = _primeras_filas(flujo, filas)
+        indices = {int(valor) for fila in leidas for tipo, valor in fila.values() if tipo == 's'}
+        cadenas = {}
+        if indices and partes['cadenas']:
+            with zf.open(partes['cadenas']) as flujo:
+                cadenas = _cadenas_compartidas(flujo, indices)
+    resultado = []
+    for fila in leidas:
+        valores = [''] * (max(fila) + 1 if fila else 0)
+        for columna, (tipo, valor) in fila.items():
+            valores[columna] = cadenas.get(int(valor), '') if tipo == 's' else valor
+        resultado.append([valor.strip().upper() for valor in valores])
+    return resultado
+
+
+def revisar_cabeceras(archivo_excel, requisitos):
+    """
+    Comprueba que el archivo tenga las hojas de `requisitos` y, en cada fila
+    de cabecera, las columnas esperadas. Devuelve la lista de problemas (vacía
+    si todo está bien). Si el XML no se puede interpretar aquí (un xlsx poco
+    común) no informa nada: la lectura completa dirá lo que falte.
+    """
+    problemas = []
+    try:
+        for nombre_hoja, esperadas_por_fila in requisitos.items():
+            filas = leer_cabeceras(archivo_excel, nombre_hoja, len(esperadas_por_fila))
+            if filas is None:
+                problemas.append(f"Falta la hoja '{nombre_hoja}'.")
+                continue
+            for numero, (esperadas, reales) in enumerate(zip(esperadas_por_fila, filas), start=1):
+                faltantes = [cabecera for cabecera in esperadas if cabecera.upper() not in reales]
+                if faltantes:
+                    problemas.append(f"En la fila {numero} de la hoja '{nombre_hoja}' no están las cabeceras: {', '.join(faltantes)}.")
+    except zipfile.BadZipFile:
+        return ["El archivo no es un libro Excel (.xlsx) válido."]
+    except (KeyError, ValueError, ET.ParseError):
+        return []
+    finally:
+        if hasattr(archivo_excel, 'seek'): archivo_excel.seek(0)
+    return problemas
+
+
+def cabeceras_validas(archivo_excel, requisitos, log_output):
+    """`revisar_cabeceras` para los procesos: deja cada problema en el log y devuelve False si hubo alguno."""
+    problemas = revisar_cabeceras(archivo_excel, requisitos)
+    for problema in problemas:
+        log_output.append(f"ALERTA DE ARCHIVO: {problema}")
+    return not problemas
@@ -0,0 +1,239 @@
+# segmentador/cache.py
+"""
+Cache de resultados por contenido.
+
+Las claves se construyen a partir del SHA-256 de los bytes subidos más la
+página, la zona y los ajustes del proceso, de modo que un rerun de Streamlit
+(cambiar de zona, volver a pulsar el botón o volver a descargar) sobre el
+mismo archivo no vuelve a leer ni a generar nada.
+
+El cache guarda libros ya leídos (`LibroCargado`) y los ZIP terminados. La
+memoria está acotada por tamaño con desalojo LRU; opcionalmente, lo desalojado
+se guarda en un directorio en disco (segundo nivel) también acotado por tamaño.
+Los libros además se guardan como Parquet (ver `segmentador.columnar`), que
+sobrevive a reinicios y se lee mucho más rápido que el xlsx.
+
+Configuración por variables de entorno:
+    SEGMENTADOR_CACHE_MB        límite en memoria (por defecto 512 MB)
+    SEGMENTADOR_CACHE_DIR       directorio del nivel en disco (desactivado si no se define)
+    SEGMENTADOR_CACHE_DISCO_MB  límite del nivel en disco (por defecto 4096 MB)
+"""
+import hashlib
+import io
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from segmentador.carga import LibroCargado, cargar_libro
+from segmentador.columnar import almacen_global
+from segmentador.memoria import gobernador_global
+from segmentador.registro import registro_global
+from segmentador.salida import leer_bytes, tamano_resultado
+
+MB = 1024 * 1024
+
+
+def huella_contenido(archivo):
+    """SHA-256 de los bytes de un archivo subido (o de un objeto `bytes`)."""
+    if isinstance(archivo, (bytes, bytearray)):
+        return hashlib.sha256(archivo).hexdigest()
+    posicion = archivo.tell() if hasattr(archivo, 'tell') else 0
+    archivo.seek(0)
+    sha = hashlib.sha256()
+    for bloque in iter(lambda: archivo.read(MB), b''):
+        sha.update(bloque)
+    archivo.seek(posicion)
+    return sha.hexdigest()
+
+
+def tamano_aproximado(valor):
+    """Bytes aproximados que ocupa un valor cacheado (para el límite LRU)."""
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, LibroCargado):
+        return sum(tamano_aproximado(df) for df in valor.hojas.values())
+    if isinstance(valor, (tuple, list)):
+        return sum(tamano_aproximado(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+class CacheResultados:
+    """Cache LRU acotado por bytes con un nivel opcional en disco."""
+
+    def __init__(self, max_bytes, directorio=None, max_bytes_disco=0):
+        self.max_bytes = max_bytes
+        self.directorio = directorio
+        self.max_bytes_disco = max_bytes_disco
+        self._entradas = OrderedDict()
+        self._tamanos = {}
+        self._bytes_en_uso = 0
+        self._lock = threading.Lock()
+        if self.directorio:
+            os.makedirs(self.directorio, exist_ok=True)
+
+    @staticmethod
+    def clave(*partes):
+        """Normaliza las partes de una clave (huella, página, zona, ajustes...) a texto."""
+        return "|".join(repr(p) for p in partes)
+
+    def _ruta_disco(self, clave):
+        nombre = hashlib.sha256(clave.encode('utf-8')).hexdigest()
+        return os.path.join(self.directorio, f"{nombre}.pkl")
+
+    def obtener(self, clave):
+        """Devuelve el valor cacheado o None. Un acierto en disco se promueve a memoria."""
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                return self._entradas[clave]
+        if not self.directorio:
+            return None
+        ruta = self._ruta_disco(clave)
+        try:
+            with open(ruta, 'rb') as f:
+                valor = pickle.load(f)
+            os.utime(ruta)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        self.guardar(clave, valor)
+        return valor
+
+    def guardar(self, clave, valor):
+        tamano = tamano_aproximado(valor)
+        desalojados = []
+        with self._lock:
+            if clave in self._entradas:
+                self._bytes_en_uso -= self._tamanos.pop(clave)
+                del self._entradas[clave]
+            self._entradas[clave] = valor
+            self._tamanos[clave] = tamano
+            self._bytes_en_uso += tamano
+            # Desalojo LRU: se conserva siempre la entrada recién guardada.
+            while self._bytes_en_uso > self.max_bytes and len(self._entradas) > 1:
+                clave_vieja, valor_viejo = self._entradas.popitem(last=False)
+                self._bytes_en_uso -= self._tamanos.pop(clave_vieja)
+                desalojados.append((clave_vieja, valor_viejo))
+        for clave_vieja, valor_viejo in desalojados:
+            self._guardar_en_disco(clave_vieja, valor_viejo)
+
+    def _guardar_en_disco(self, clave, valor):
+        if not self.directorio:
+            return
+        ruta = self._ruta_disco(clave)
+        try:
+            with open(ruta + '.tmp', 'wb') as f:
+                pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(ruta + '.tmp', ruta)
+        except OSError:
+            return
+        self._recortar_disco()
+
+    def _recortar_disco(self):
+        """Elimina los archivos menos usados hasta respetar el límite en disco."""
+        archivos = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith('.pkl'): continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            archivos.append((estado.st_mtime, estado.st_size, ruta))
+        total = sum(tamano for _, tamano, _ in archivos)
+        for _, tamano, ruta in sorted(archivos):
+            if total <= self.max_bytes_disco: break
+            try:
+                os.remove(ruta)
+                total -= tamano
+            except OSError:
+                pass
+
+    def obtener_o_calcular(self, clave, calcular):
+        valor = self.obtener(clave)
+        if valor is None:
+            valor = calcular()
+            if valor is not None:
+                self.guardar(clave, valor)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._tamanos.clear()
+            self._bytes_en_uso = 0
+
+    @property
+    def bytes_en_uso(self):
+        return self._bytes_en_uso
+
+
+_cache_global = None
+
+
+def cache_global():
+    """Cache compartido por todas las sesiones del proceso de Streamlit."""
+    global _cache_global
+    if _cache_global is None:
+        _cache_global = CacheResultados(
+            max_bytes=int(os.environ.get('SEGMENTADOR_CACHE_MB', 512)) * MB,
+            directorio=os.environ.get('SEGMENTADOR_CACHE_DIR') or None,
+            max_bytes_disco=int(os.environ.get('SEGMENTADOR_CACHE_DISCO_MB', 4096)) * MB,
+        )
+    return _cache_global
+
+
+def cargar_libro_con_cache(archivo_excel, hojas, cache=None, almacen=None):
+    """
+    `cargar_libro` memoizado por el contenido del archivo y las opciones de lectura.
+    Orden de búsqueda: cache en memoria, copia columnar en disco y, si no hay
+    ninguna, lectura del xlsx (cuya copia columnar se escribe en segundo plano).
+    """
+    cache = cache or cache_global()
+    almacen = almacen or almacen_global()
+    inicio = time.perf_counter()
+    clave = cache.clave('libro', huella_contenido(archivo_excel), sorted(hojas.items()))
+    libro = cache.obtener(clave)
+    if libro is None:
+        libro = almacen.cargar(clave) if almacen else None
+        if libro is None:
+            libro = cargar_libro(archivo_excel, hojas)
+            if almacen:
+                almacen.guardar_en_segundo_plano(clave, libro)
+        cache.guardar(clave, libro)
+        return libro
+    # Mismas hojas, pero con el tiempo real de esta ejecución en el log.
+    return LibroCargado(libro.hojas, {'Libro recuperado del cache': time.perf_counter() - inicio}, {},
+                        libro.cabeceras_originales, libro.motor, libro.memoria)
+
+
+def procesar_con_cache(archivo_excel, pagina, procesar, *ajustes, cache=None):
+    """
+    Ejecuta `procesar()` (que devuelve `(zip_file, log_output)`) o reutiliza
+    el ZIP ya generado para el mismo contenido, página y ajustes, y el mismo
+    registro de agencias (los alias cambian los libros).
+    Solo se cachean los procesos exitosos y los ZIP que caben en el límite
+    del cache; los más grandes se devuelven tal cual (archivo en disco).
+    `procesar()` espera su turno entre los procesos pesados del servidor.
+    """
+    cache = cache or cache_global()
+    clave = cache.clave('zip', huella_contenido(archivo_excel), pagina, registro_global().huella, *ajustes)
+    guardado = cache.obtener(clave)
+    if guardado is not None:
+        zip_bytes, log_output = guardado
+        log_output = log_output + ["CACHE    | Resultado recuperado del cache: el archivo no cambió, no se volvió a procesar."]
+        return io.BytesIO(zip_bytes), log_output
+    # Solo lo que de verdad se procesa ocupa un turno de proceso pesado (ver `segmentador.memoria`).
+    with gobernador_global().turno_pesado():
+        zip_file, log_output = procesar()
+    if zip_file is None or tamano_resultado(zip_file) > cache.max_bytes:
+        return zip_file, log_output
+    zip_bytes = leer_bytes(zip_file)
+    cache.guardar(clave, (zip_bytes, list(log_output)))
+    return io.BytesIO(zip_bytes), log_output
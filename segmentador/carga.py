@@ -0,0 +1,221 @@
+# segmentador/carga.py
+"""
+Cargador de libros Excel de una sola pasada.
+
+El archivo subido se abre una única vez y cada hoja se lee completa una sola
+vez. A partir de esa lectura se sirven la validación de cabeceras, la
+detección de zonas y los DataFrames completos que usan las páginas.
+
+La lectura usa el motor `calamine` (en Rust, mucho más rápido que openpyxl)
+cuando `python-calamine` está instalado y pandas lo soporta; si no, o si
+calamine no puede abrir el archivo, se usa openpyxl.
+
+Variable de entorno:
+    SEGMENTADOR_MOTOR_EXCEL  fuerza el motor ('calamine' u 'openpyxl')
+"""
+import os
+import time
+import pandas as pd
+
+MOTOR_RESPALDO = 'openpyxl'
+
+
+def calamine_disponible():
+    """True si pandas (>= 2.2) puede leer con el motor calamine."""
+    try:
+        import python_calamine  # noqa: F401
+    except ImportError:
+        return False
+    version = tuple(int(parte) for parte in pd.__version__.split('.')[:2])
+    return version >= (2, 2)
+
+
+def motor_excel():
+    """Motor de lectura a usar: el forzado por entorno, calamine si existe, u openpyxl."""
+    forzado = os.environ.get('SEGMENTADOR_MOTOR_EXCEL')
+    if forzado:
+        return forzado
+    return 'calamine' if calamine_disponible() else MOTOR_RESPALDO
+
+
+def _normalizar(cabecera):
+    return str(cabecera).strip().upper()
+
+
+class _SelectorColumnas:
+    """
+    `usecols` para `ExcelFile.parse`: acepta todas las columnas hasta
+    `columnas_hasta` (inclusive) más las `columnas_extra`, y de paso guarda la
+    cabecera completa. pandas lo evalúa columna por columna en orden, así que
+    no hace falta una lectura previa de la cabecera. Si `columnas_hasta` no
+    existe se leen todas, para que la página reporte la columna faltante.
+    """
+
+    def __init__(self, columnas_hasta, columnas_extra):
+        self.columnas_hasta = columnas_hasta.upper()
+        self.columnas_extra = {c.upper() for c in columnas_extra}
+        self.cabeceras = []
+        self._final_visto = False
+
+    def __call__(self, cabecera):
+        self.cabeceras.append(cabecera)
+        normalizada = _normalizar(cabecera)
+        if not self._final_visto:
+            self._final_visto = normalizada == self.columnas_hasta
+            return True
+        return normalizada in self.columnas_extra
+
+
+def seleccionar_columnas(df, columnas_hasta, columnas_extra=()):
+    """
+    Lo que `cargar_libro` habría cargado con `columnas_hasta`/`columnas_extra`,
+    a partir de una lectura de la hoja completa con las mismas opciones.
+    Devuelve (DataFrame, cabecera completa).
+    """
+    selector = _SelectorColumnas(columnas_hasta, columnas_extra)
+    columnas = [col for col in df.columns if selector(col)]
+    return df[columnas], selector.cabeceras
+
+
+def _compactar(df, categorias):
+    """
+    Convierte a `category` las columnas indicadas (buscadas sin importar
+    mayúsculas ni espacios). Devuelve (columnas convertidas, bytes antes, bytes después).
+    """
+    buscadas = {c.upper() for c in categorias}
+    convertidas, antes, despues = [], 0, 0
+    for col in df.columns:
+        if _normalizar(col) not in buscadas or isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        antes += int(df[col].memory_usage(deep=True, index=False))
+        df[col] = df[col].astype('category')
+        despues += int(df[col].memory_usage(deep=True, index=False))
+        convertidas.append(str(col))
+    return convertidas, antes, despues
+
+
+class LibroCargado:
+    """Hojas ya leídas de un libro Excel junto con los tiempos de lectura."""
+
+    def __init__(self, hojas, tiempos, filas, cabeceras_originales=None, motor=None, memoria=None):
+        self.hojas = hojas
+        self.tiempos = tiempos
+        self.filas = filas
+        # Cabecera completa de cada hoja leída con columnas recortadas: la
+        # validación se hace contra el archivo, no contra lo que se cargó.
+        self.cabeceras_originales = cabeceras_originales or {}
+        self.motor = motor
+        # {hoja: {'columnas': [...], 'bytes_antes': n, 'bytes_despues': m}} de las columnas compactadas.
+        self.memoria = memoria or {}
+
+    def tiene_hoja(self, nombre_hoja):
+        return nombre_hoja in self.hojas
+
+    def hoja(self, nombre_hoja):
+        """
+        Devuelve el DataFrame de la hoja tal como se leyó del archivo.
+        Es una copia superficial: renombrar o añadir columnas no altera el
+        libro, que puede estar compartido en el cache entre varias ejecuciones.
+        """
+        return self.hojas[nombre_hoja].copy(deep=False)
+
+    def cabeceras(self, nombre_hoja, nivel=None):
+        """
+        Cabeceras de la hoja en mayúsculas y sin espacios extremos.
+        Para hojas con cabecera de dos filas se indica el `nivel` (0 o 1).
+        """
+        if nivel is None and nombre_hoja in self.cabeceras_originales:
+            return [_normalizar(col) for col in self.cabeceras_originales[nombre_hoja]]
+        columnas = self.hojas[nombre_hoja].columns
+        if nivel is not None:
+            columnas = columnas.get_level_values(nivel)
+        return [_normalizar(col) for col in columnas]
+
+    def validar_cabeceras(self, nombre_hoja, cabeceras_esperadas, nivel=None):
+        if not self.tiene_hoja(nombre_hoja): return False
+        cabeceras_reales = self.cabeceras(nombre_hoja, nivel)
+        return all(cabecera.upper() in cabeceras_reales for cabecera in cabeceras_esperadas)
+
+    def valores_unicos(self, nombre_hoja, columna, nivel=None):
+        """
+        Valores únicos (sin nulos) de una columna, buscada sin importar mayúsculas ni espacios.
+        En hojas con cabecera de dos filas se busca en el `nivel` indicado.
+        """
+        df = self.hojas[nombre_hoja]
+        for col in df.columns:
+            if _normalizar(col if nivel is None else col[nivel]) == columna.upper():
+                return pd.Series(df[col]).dropna().unique().tolist()
+        raise KeyError(columna)
+
+    def resumen_tiempos(self):
+        """Líneas de log con el desglose de tiempos de la lectura."""
+        lineas = [f"TIEMPO   | Motor de lectura: {self.motor}"] if self.motor else []
+        for etapa, segundos in self.tiempos.items():
+            if etapa in self.filas:
+                lineas.append(f"TIEMPO   | Lectura hoja '{etapa}': {segundos:.2f} s ({self.filas[etapa]} filas)")
+            else:
+                lineas.append(f"TIEMPO   | {etapa}: {segundos:.2f} s")
+        return lineas + self.resumen_memoria()
+
+    def resumen_memoria(self):
+        """Líneas de log con la memoria ahorrada al cargar columnas clave como categorías."""
+        lineas = []
+        for nombre_hoja, datos in self.memoria.items():
+            antes, despues = datos['bytes_antes'], datos['bytes_despues']
+            ahorro = 1 - despues / antes if antes else 0
+            lineas.append(f"MEMORIA  | Hoja '{nombre_hoja}': {', '.join(datos['columnas'])} como categoría: "
+                          f"{antes / 1024 / 1024:.1f} MB -> {despues / 1024 / 1024:.1f} MB (ahorro {ahorro:.0%})")
+        return lineas
+
+
+def _leer_hojas(archivo_excel, hojas, motor):
+    inicio = time.perf_counter()
+    if hasattr(archivo_excel, 'seek'): archivo_excel.seek(0)
+    tiempos, filas, leidas, cabeceras_originales, memoria = {}, {}, {}, {}, {}
+    with pd.ExcelFile(archivo_excel, engine=motor) as libro:
+        tiempos['Apertura del libro'] = time.perf_counter() - inicio
+        for nombre_hoja, opciones in hojas.items():
+            if nombre_hoja not in libro.sheet_names: continue
+            inicio_hoja = time.perf_counter()
+            opciones = dict(opciones)
+            columnas_hasta = opciones.pop('columnas_hasta', None)
+            columnas_extra = opciones.pop('columnas_extra', ())
+            categorias = opciones.pop('categorias', ())
+            selector = _SelectorColumnas(columnas_hasta, columnas_extra) if columnas_hasta else None
+            if selector:
+                opciones['usecols'] = selector
+            leidas[nombre_hoja] = libro.parse(nombre_hoja, **opciones)
+            if selector:
+                cabeceras_originales[nombre_hoja] = selector.cabeceras
+            if categorias:
+                convertidas, antes, despues = _compactar(leidas[nombre_hoja], categorias)
+                if convertidas:
+                    memoria[nombre_hoja] = {'columnas': convertidas, 'bytes_antes': antes, 'bytes_despues': despues}
+            tiempos[nombre_hoja] = time.perf_counter() - inicio_hoja
+            filas[nombre_hoja] = len(leidas[nombre_hoja])
+    tiempos['Lectura total'] = time.perf_counter() - inicio
+    return LibroCargado(leidas, tiempos, filas, cabeceras_originales, motor, memoria)
+
+
+def cargar_libro(archivo_excel, hojas, motor=None):
+    """
+    Abre `archivo_excel` una sola vez y lee cada hoja pedida.
+
+    `hojas` es un diccionario {nombre_hoja: opciones} donde las opciones se
+    pasan tal cual a `ExcelFile.parse` (por ejemplo `header=[0, 1]` o
+    `dtype=str`). Las hojas que no existen en el archivo simplemente no se
+    incluyen, para que la validación de cabeceras de cada página lo reporte.
+
+    Para hojas con cabecera de una fila se puede limitar lo que se carga con
+    `columnas_hasta` (nombre de la última columna a leer) y `columnas_extra`
+    (columnas posteriores que también se necesitan, p. ej. 'ZONA').
+    `categorias` lista columnas de pocos valores distintos que se cargan como
+    `category` (ver `segmentador.esquemas`).
+    """
+    motor = motor or motor_excel()
+    try:
+        return _leer_hojas(archivo_excel, hojas, motor)
+    except Exception:
+        if motor == MOTOR_RESPALDO:
+            raise
+        return _leer_hojas(archivo_excel, hojas, MOTOR_RESPALDO)
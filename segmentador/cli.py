@@ -0,0 +1,206 @@
+# segmentador/cli.py
+"""
+CLI `segmentar`: ejecuta los segmentadores sin Streamlit, por ejemplo para
+procesar de noche todos los consolidados de un cierre de mes.
+
+Ejemplos:
+    segmentar lima consolidados/*.xlsx -o salida/
+    segmentar provincia PROVINCIA.xlsx --zona "NORTE" -o salida/
+    segmentar all-zones PROVINCIA.xlsx -o salida/ --carpetas
+    segmentar lima-corte2 LIMA_C2.xlsx -o salida/ --paralelo 4
+    segmentar lima LIMA.xlsx -o salida/ --compresion rapido
+    segmentar lima LIMA.xlsx -o salida/ --incremental
+    segmentar lima-corte2 LIMA_C2.xlsx -o salida/ --solo-validar
+    segmentar provincia-corte2 PROVINCIA_C2.xlsx -o salida/ --por-partes
+    segmentar lima LIMA.xlsx -o salida/ --progreso
+
+Cada archivo de entrada genera un ZIP (un .tar con `--compresion tar`, o una
+carpeta con los libros sueltos con `--carpetas`) y un
+.log con el mismo log que muestran las páginas (con `--perfil`, también un
+.perfil.json con los tiempos por etapa y agencia). Varios archivos se
+procesan a la vez en procesos separados (`--paralelo`). Con `--incremental`
+solo se regeneran los libros de las agencias que cambiaron desde la última
+ejecución del mismo modo (ver `incremental.py`). Con `--solo-validar` no se
+generan libros: se escribe la conciliación de ALTAS contra la BASE en un
+.conciliacion.csv y un .conciliacion.xlsx, junto al .log. Con `--por-partes`
+la BASE no se carga entera: se lee por bloques y se reparte por agencia en
+disco (ver `volcado.py`); solo en lima, lima-corte2 y provincia-corte2.
+Con `--progreso` se imprime en stderr una línea por agencia terminada (estado
+de la conciliación, filas, tiempo y ETA), a medida que se generan.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from segmentador.lima import procesar_archivos_excel
+from segmentador.lima_corte_2 import procesar_reporte_corte_2
+from segmentador.perfil import PerfilEjecucion, linea_avance
+from segmentador.provincia import procesar_reportes_provincia, procesar_todas_las_zonas
+from segmentador.provincia_corte_2 import procesar_provincia_corte_2
+from segmentador.salida import COMPRESION_POR_DEFECTO, COMPRESIONES, extension_salida
+
+MODOS = ['lima', 'provincia', 'lima-corte2', 'provincia-corte2', 'all-zones']
+
+
+def _nombre_seguro(texto):
+    return "".join(c if c.isalnum() or c in ('-', '_') else '_' for c in str(texto).strip())
+
+
+def guardar_resultado(zip_file, ruta_sin_extension, carpetas, compresion=None):
+    """Guarda el ZIP (o TAR) tal cual o, con `carpetas`, extraído en una carpeta. Devuelve la ruta creada."""
+    zip_file.seek(0)
+    if carpetas:
+        if extension_salida(compresion) == '.tar':
+            with tarfile.open(fileobj=zip_file, mode='r') as tar:
+                # Solo archivos regulares dentro de la carpeta (filtro 'data', si esta versión de Python lo tiene).
+                tar.extractall(ruta_sin_extension, **({'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}))
+        else:
+            with zipfile.ZipFile(zip_file) as zf:
+                zf.extractall(ruta_sin_extension)
+        return ruta_sin_extension
+    ruta_zip = ruta_sin_extension + extension_salida(compresion)
+    with open(ruta_zip, 'wb') as destino:
+        shutil.copyfileobj(zip_file, destino)
+    return ruta_zip
+
+
+def procesar_modo(modo, archivo, zona, trabajadores, perfil, compresion, incremental, solo_validar=False, por_partes=False):
+    """
+    Devuelve una lista de (sufijo_salida, zip_file, log_output); con `solo_validar`, una Conciliacion en vez del ZIP.
+    Provincia Corte 1 siempre carga la BASE entera (`por_partes` no aplica).
+    """
+    if modo == 'lima':
+        return [('lima',) + tuple(procesar_archivos_excel(archivo, trabajadores, perfil, compresion, incremental, solo_validar,
+                                                          por_partes))]
+    if modo == 'lima-corte2':
+        return [('lima_corte_2',) + tuple(procesar_reporte_corte_2(archivo, trabajadores, perfil, compresion, incremental, solo_validar,
+                                                                   por_partes))]
+    if modo == 'provincia-corte2':
+        return [('provincia_corte_2',) + tuple(procesar_provincia_corte_2(archivo, trabajadores, perfil, compresion, incremental,
+                                                                          solo_validar, por_partes))]
+    if modo == 'provincia':
+        return [(f"provincia_{_nombre_seguro(zona)}",) + tuple(procesar_reportes_provincia(archivo, zona, trabajadores=trabajadores,
+                                                                                             perfil=perfil, compresion=compresion,
+                                                                                             incremental=incremental, solo_validar=solo_validar))]
+    return [('provincia_todas_las_zonas',) + tuple(procesar_todas_las_zonas(archivo, trabajadores=trabajadores, perfil=perfil,
+                                                                            compresion=compresion, incremental=incremental,
+                                                                            solo_validar=solo_validar))]
+
+
+def _imprimir_avance(nombre, evento):
+    print(f"{nombre} | {linea_avance(evento)}", file=sys.stderr, flush=True)
+
+
+def ejecutar_trabajo(modo, ruta_entrada, directorio_salida, zona=None, carpetas=False, trabajadores=1, guardar_perfil=False,
+                     compresion=None, incremental=False, solo_validar=False, por_partes=False, progreso=False):
+    """
+    Procesa un archivo de entrada y escribe sus resultados. Es una función de
+    módulo para poder ejecutarse en otro proceso. Devuelve líneas de resumen
+    y si todo terminó bien.
+    """
+    nombre = os.path.splitext(os.path.basename(ruta_entrada))[0]
+    resumen, exito = [], True
+    perfil = PerfilEjecucion(modo)
+    if progreso:
+        perfil.escuchar(lambda evento: _imprimir_avance(nombre, evento))
+    try:
+        with open(ruta_entrada, 'rb') as archivo:
+            resultados = procesar_modo(modo, archivo, zona, trabajadores, perfil, compresion, incremental, solo_validar, por_partes)
+    except Exception as e:
+        return [f"ERROR    | {ruta_entrada}: {e}"], False
+    for sufijo, zip_file, log_output in resultados:
+        base_salida = os.path.join(directorio_salida, f"{nombre}_{sufijo}")
+        with open(base_salida + '.log', 'w', encoding='utf-8') as f:
+            f.write("\n".join(log_output) + "\n")
+        if guardar_perfil:
+            perfil.datos['archivo'] = ruta_entrada
+            with open(base_salida + '.perfil.json', 'w', encoding='utf-8') as f:
+                f.write(perfil.a_json())
+        if zip_file is None:
+            exito = False
+            resumen.append(f"ERROR    | {ruta_entrada} ({sufijo}): ver {base_salida}.log")
+            continue
+        if solo_validar:
+            # En este modo `zip_file` es la Conciliacion.
+            destino = base_salida + '.conciliacion.csv'
+            with open(destino, 'wb') as f:
+                f.write(zip_file.a_csv())
+            with open(base_salida + '.conciliacion.xlsx', 'wb') as f:
+                f.write(zip_file.a_xlsx())
+        else:
+            destino = guardar_resultado(zip_file, base_salida, carpetas, compresion)
+        exitos = sum(1 for linea in log_output if linea.startswith('ÉXITO'))
+        descuadres = sum(1 for linea in log_output if linea.startswith('DESCUADRE'))
+        resumen.append(f"OK       | {ruta_entrada} -> {destino} | ÉXITO: {exitos} | DESCUADRE: {descuadres}")
+    return resumen, exito
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog='segmentar', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='modo', required=True)
+    ayudas = {
+        'lima': 'Lima Corte 1 (hojas "Reporte CORTE 1" y "BASE").',
+        'provincia': 'Provincia Corte 1 para una zona (--zona).',
+        'lima-corte2': 'Lima Corte 2 (hojas "Reporte CORTE 2" y "BASE").',
+        'provincia-corte2': 'Provincia Corte 2.',
+        'all-zones': 'Provincia Corte 1 para todas las zonas de la BASE, en una sola pasada (una carpeta por zona).',
+    }
+    for modo in MODOS:
+        sub = subparsers.add_parser(modo, help=ayudas[modo], description=ayudas[modo])
+        sub.add_argument('archivos', nargs='+', help='Archivos .xlsx consolidados.')
+        sub.add_argument('-o', '--salida', default='.', help='Directorio de salida (se crea si no existe).')
+        sub.add_argument('--carpetas', action='store_true', help='Escribir carpetas con los .xlsx en vez de ZIPs.')
+        sub.add_argument('--compresion', choices=list(COMPRESIONES), default=COMPRESION_POR_DEFECTO,
+                         help='Formato de salida: ' + '; '.join(f"{n}: {d}" for n, (_, _, d) in COMPRESIONES.items()) + '.')
+        sub.add_argument('--paralelo', type=int, default=1, help='Archivos a procesar a la vez (procesos).')
+        sub.add_argument('--trabajadores', type=int, default=1,
+                         help='Procesos para generar los libros de cada archivo.')
+        sub.add_argument('--perfil', action='store_true',
+                         help='Guardar el perfil de la ejecución (tiempos y memoria por etapa y agencia) en un .perfil.json.')
+        sub.add_argument('--incremental', action='store_true',
+                         help='Regenerar solo los libros de las agencias que cambiaron desde la última ejecución.')
+        sub.add_argument('--solo-validar', action='store_true',
+                         help='No generar libros: solo conciliar ALTAS contra la BASE (.conciliacion.csv y .xlsx).')
+        sub.add_argument('--progreso', action='store_true',
+                         help='Imprimir en stderr una línea por agencia terminada (estado, filas, tiempo y ETA).')
+        if modo in ('lima', 'lima-corte2', 'provincia-corte2'):
+            sub.add_argument('--por-partes', action='store_true',
+                             help='Leer la BASE por bloques y repartirla por agencia en disco, sin cargarla entera (archivos muy grandes).')
+        if modo == 'provincia':
+            sub.add_argument('--zona', required=True, help='Zona a procesar (columna ZONA de la BASE).')
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    os.makedirs(args.salida, exist_ok=True)
+    zona = getattr(args, 'zona', None)
+    trabajos = [(args.modo, ruta, args.salida, zona, args.carpetas, args.trabajadores, args.perfil, args.compresion,
+                 args.incremental, args.solo_validar, getattr(args, 'por_partes', False), args.progreso)
+                for ruta in args.archivos]
+
+    exito_total = True
+    if args.paralelo <= 1 or len(trabajos) == 1:
+        resultados = (ejecutar_trabajo(*trabajo) for trabajo in trabajos)
+        for resumen, exito in resultados:
+            print("\n".join(resumen), flush=True)
+            exito_total &= exito
+    else:
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=args.paralelo, mp_context=contexto) as pool:
+            futuros = [pool.submit(ejecutar_trabajo, *trabajo) for trabajo in trabajos]
+            for futuro in futuros:
+                resumen, exito = futuro.result()
+                print("\n".join(resumen), flush=True)
+                exito_total &= exito
+    return 0 if exito_total else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
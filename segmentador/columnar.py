@@ -0,0 +1,179 @@
+# segmentador/columnar.py
+"""
+Copia columnar (Parquet) de los libros ya leídos.
+
+Parsear el xlsx es lo más lento de cada ejecución. La primera vez que se lee
+un archivo, sus hojas se guardan como Parquet bajo la huella del contenido
+(más las opciones de lectura); las páginas, reruns o reinicios del servidor
+que vuelvan a recibir el mismo archivo durante el mes leen esa copia, que es
+mucho más rápida de cargar que el xlsx.
+
+La copia se escribe en un hilo aparte para no demorar la primera ejecución,
+y se publica de forma atómica (directorio temporal + `os.replace`). Las
+entradas se eliminan por antigüedad y, si el total supera el límite, de la
+menos usada a la más usada.
+
+Requiere `pyarrow`; sin él, o si una hoja no se puede convertir (columnas con
+tipos mezclados), simplemente se lee el xlsx como siempre.
+
+Configuración por variables de entorno:
+    SEGMENTADOR_COLUMNAR_DIR   directorio de las copias (por defecto <tmp>/segmentador_columnar; '0' lo desactiva)
+    SEGMENTADOR_COLUMNAR_MB    límite total en disco (por defecto 4096 MB)
+    SEGMENTADOR_COLUMNAR_DIAS  antigüedad máxima de una copia sin usar (por defecto 35 días)
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from segmentador.carga import LibroCargado
+
+MB = 1024 * 1024
+DIA = 24 * 60 * 60
+
+
+def pyarrow_disponible():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _tamano_directorio(ruta):
+    total = 0
+    for nombre in os.listdir(ruta):
+        try:
+            total += os.path.getsize(os.path.join(ruta, nombre))
+        except OSError:
+            pass
+    return total
+
+
+class AlmacenColumnar:
+    """Libros guardados como un directorio por clave, con un .parquet por hoja y un meta.json."""
+
+    def __init__(self, directorio, max_bytes, max_dias):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.max_segundos = max_dias * DIA
+        self._lock = threading.Lock()
+        self._escribiendo = set()
+        os.makedirs(self.directorio, exist_ok=True)
+        self.recortar()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, hashlib.sha256(clave.encode('utf-8')).hexdigest())
+
+    def cargar(self, clave):
+        """Devuelve el `LibroCargado` guardado bajo `clave`, o None."""
+        ruta = self._ruta(clave)
+        inicio = time.perf_counter()
+        try:
+            with open(os.path.join(ruta, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            hojas = {nombre: pd.read_parquet(os.path.join(ruta, archivo), memory_map=True)
+                     for nombre, archivo in meta['archivos'].items()}
+            os.utime(ruta)
+        except (OSError, ValueError, KeyError):
+            return None
+        tiempos = {'Libro recuperado de la copia columnar (Parquet)': time.perf_counter() - inicio}
+        filas = {nombre: len(df) for nombre, df in hojas.items()}
+        return LibroCargado(hojas, tiempos, filas, meta.get('cabeceras_originales') or {}, meta.get('motor'), meta.get('memoria'))
+
+    def guardar(self, clave, libro):
+        """Escribe la copia de `libro`. Devuelve False si alguna hoja no se pudo convertir."""
+        ruta = self._ruta(clave)
+        if os.path.isdir(ruta):
+            return True
+        temporal = tempfile.mkdtemp(prefix='.tmp-', dir=self.directorio)
+        try:
+            archivos = {}
+            for i, (nombre, df) in enumerate(libro.hojas.items()):
+                archivos[nombre] = f'hoja_{i}.parquet'
+                df.to_parquet(os.path.join(temporal, archivos[nombre]))
+            meta = {'archivos': archivos, 'motor': libro.motor, 'cabeceras_originales': libro.cabeceras_originales,
+                    'memoria': libro.memoria}
+            with open(os.path.join(temporal, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, default=str)
+            os.replace(temporal, ruta)
+        except Exception:
+            # Tipos mezclados en una columna, nombres de columna no textuales, disco lleno...
+            shutil.rmtree(temporal, ignore_errors=True)
+            return False
+        self.recortar()
+        return True
+
+    def guardar_en_segundo_plano(self, clave, libro):
+        """Como `guardar`, en un hilo (no daemon: al salir la CLI se espera a que termine)."""
+        with self._lock:
+            if clave in self._escribiendo:
+                return
+            self._escribiendo.add(clave)
+
+        def escribir():
+            try:
+                self.guardar(clave, libro)
+            finally:
+                with self._lock:
+                    self._escribiendo.discard(clave)
+
+        threading.Thread(target=escribir, name='segmentador-columnar').start()
+
+    def recortar(self):
+        """Borra las copias más antiguas que `max_dias` y luego las menos usadas hasta respetar el límite."""
+        ahora = time.time()
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            if not os.path.isdir(ruta):
+                continue
+            try:
+                usado = os.stat(ruta).st_mtime
+            except OSError:
+                continue
+            if nombre.startswith('.tmp-'):
+                # Escritura interrumpida (o en curso, si es reciente).
+                if ahora - usado > DIA:
+                    shutil.rmtree(ruta, ignore_errors=True)
+                continue
+            if ahora - usado > self.max_segundos:
+                shutil.rmtree(ruta, ignore_errors=True)
+                continue
+            entradas.append((usado, _tamano_directorio(ruta), ruta))
+        total = sum(tamano for _, tamano, _ in entradas)
+        for _, tamano, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tamano
+
+    def bytes_en_uso(self):
+        return sum(_tamano_directorio(os.path.join(self.directorio, n)) for n in os.listdir(self.directorio)
+                   if os.path.isdir(os.path.join(self.directorio, n)))
+
+
+_almacen_global = None
+
+
+def almacen_global():
+    """Almacén columnar del proceso, o None si está desactivado o no hay pyarrow."""
+    global _almacen_global
+    if _almacen_global is None:
+        directorio = os.environ.get('SEGMENTADOR_COLUMNAR_DIR', os.path.join(tempfile.gettempdir(), 'segmentador_columnar'))
+        if directorio == '0' or not pyarrow_disponible():
+            return None
+        try:
+            _almacen_global = AlmacenColumnar(
+                directorio,
+                max_bytes=int(os.environ.get('SEGMENTADOR_COLUMNAR_MB', 4096)) * MB,
+                max_dias=float(os.environ.get('SEGMENTADOR_COLUMNAR_DIAS', 35)),
+            )
+        except OSError:
+            return None
+    return _almacen_global
@@ -0,0 +1,160 @@
+# segmentador/conciliacion.py
+"""
+Conciliación de ALTAS del reporte contra los registros de la BASE.
+
+Se calcula para todas las agencias de una vez, antes de generar los libros:
+las ALTAS salen de una sola agrupación del reporte por agencia y los
+registros de un solo conteo de la BASE por ASESOR (con el mapa de alias ya
+aplicado), cruzados por nombre. El resultado es una tabla con una fila por
+agencia del reporte y otra por cada ASESOR de la BASE que ninguna fila del
+reporte reclama.
+
+Las páginas la usan para el log (las líneas ÉXITO/DESCUADRE de siempre) y en
+el modo "solo validar", que no genera libros y ofrece la tabla en CSV o XLSX.
+"""
+import numpy as np
+import pandas as pd
+
+from segmentador.escritor import LibroXlsx
+from segmentador.particion import aplicar_alias
+
+OK = 'OK'
+DESCUADRE = 'DESCUADRE'
+SIN_ALTAS = 'SIN ALTAS'
+ERROR = 'ERROR'
+SIN_REPORTE = 'SIN REPORTE'
+
+COLUMNAS = ['AGENCIA', 'ALTAS', 'REGISTROS_BASE', 'DIFERENCIA', 'ESTADO', 'DETALLE']
+
+
+def _altas_por_agencia(agencias, altas, agregacion, entero):
+    """
+    (agencias, ALTAS, errores) en el orden en que aparecen las agencias.
+    'primera' toma las ALTAS de la primera fila de cada agencia como entero
+    (como hacía `int(reporte_agencia.iloc[0]['ALTAS'])`); 'suma' las suma.
+    """
+    claves = pd.Series(np.asarray(agencias, dtype=object))
+    validas = claves.notna().to_numpy()
+    if altas is None:
+        unicas = claves[validas].unique().tolist()
+        return unicas, [None] * len(unicas), [None] * len(unicas)
+    valores = pd.Series(np.asarray(altas))
+    if agregacion == 'suma':
+        sumas = valores[validas].groupby(claves[validas].to_numpy(), sort=False).sum()
+        if entero:
+            sumas = sumas.astype('int64')
+        return sumas.index.tolist(), sumas.tolist() if entero else list(sumas.to_numpy()), [None] * len(sumas)
+    primeras = (~claves.duplicated()).to_numpy() & validas
+    unicas = claves[primeras].tolist()
+    valores = valores[primeras]
+    if valores.dtype.kind in 'iub' or (valores.dtype.kind == 'f' and valores.notna().all()):
+        return unicas, valores.astype('int64').tolist(), [None] * len(unicas)
+    # Texto, nulos u otros tipos: valor por valor, con el mismo error que daría int().
+    enteros, errores = [], []
+    for valor in valores:
+        try:
+            enteros.append(int(valor))
+            errores.append(None)
+        except Exception as e:
+            enteros.append(None)
+            errores.append(str(e))
+    return unicas, enteros, errores
+
+
+def conteo_base(asesores, mapeo_alias=None):
+    """Registros de la BASE por nombre canónico (alias resueltos), sin nulos ni ceros."""
+    conteos = aplicar_alias(asesores, mapeo_alias).value_counts(sort=False, dropna=True)
+    conteos = conteos[conteos > 0]
+    conteos.index = conteos.index.astype(object)
+    return conteos
+
+
+def conciliar(agencias_reporte, altas, asesores_base, mapeo_alias=None, agregacion='primera', entero=True,
+              aviso_sin_altas="No se pudo validar conteo de ALTAS.", conteos=None):
+    """
+    `agencias_reporte` y `altas` son columnas alineadas del reporte (`altas`
+    puede ser None si el reporte no tiene la columna); `asesores_base` es la
+    columna de cruce de la BASE. Si los registros por agencia ya están
+    contados (BASE leída por partes) se pasan en `conteos` en su lugar.
+    Devuelve una `Conciliacion`.
+    """
+    agencias, valores, errores = _altas_por_agencia(agencias_reporte, altas, agregacion, entero)
+    if conteos is None:
+        conteos = conteo_base(asesores_base, mapeo_alias)
+    registros = conteos.reindex(agencias, fill_value=0).astype('int64')
+
+    filas = []
+    for agencia, valor, error, n in zip(agencias, valores, errores, registros.tolist()):
+        if altas is None:
+            filas.append((agencia, None, n, None, SIN_ALTAS, aviso_sin_altas))
+        elif error is not None:
+            filas.append((agencia, None, n, None, ERROR, error))
+        else:
+            filas.append((agencia, valor, n, n - valor, OK if valor == n else DESCUADRE, None))
+    reclamados = set(agencias)
+    for asesor, n in sorted((a, n) for a, n in conteos.items() if a not in reclamados):
+        filas.append((asesor, None, int(n), int(n), SIN_REPORTE, "ASESOR de la BASE sin filas en el reporte."))
+    # object: las ALTAS conservan su tipo (un None no las vuelve float en el log).
+    return Conciliacion(pd.DataFrame(filas, columns=COLUMNAS, dtype=object))
+
+
+def unir(conciliaciones_por_zona):
+    """Una sola `Conciliacion` (con columna ZONA) a partir de [(zona, Conciliacion)]."""
+    tablas = [c.tabla.assign(ZONA=zona) for zona, c in conciliaciones_por_zona]
+    tabla = pd.concat(tablas, ignore_index=True) if tablas else pd.DataFrame(columns=COLUMNAS + ['ZONA'])
+    return Conciliacion(tabla[['ZONA'] + COLUMNAS])
+
+
+class Conciliacion:
+    """Tabla de conciliación (`tabla`) con las líneas de log y las descargas."""
+
+    def __init__(self, tabla):
+        self.tabla = tabla
+        del_reporte = tabla['ESTADO'] != SIN_REPORTE
+        self._posiciones = {agencia: i for agencia, i in zip(tabla['AGENCIA'][del_reporte], np.flatnonzero(del_reporte))}
+
+    def fila(self, agencia):
+        posicion = self._posiciones.get(agencia)
+        return None if posicion is None else self.tabla.iloc[posicion]
+
+    def linea_log(self, agencia):
+        """La línea ÉXITO / DESCUADRE / INFO / Error de la agencia, como en el log de siempre."""
+        fila = self.fila(agencia)
+        if fila is None:
+            return None
+        if fila['ESTADO'] == SIN_ALTAS:
+            return f"INFO     | {agencia:<40} | {fila['DETALLE']}"
+        if fila['ESTADO'] == ERROR:
+            return f"Error validando la agencia '{agencia}': {fila['DETALLE']}"
+        altas, registros_base = fila['ALTAS'], fila['REGISTROS_BASE']
+        if fila['ESTADO'] == OK:
+            return f"ÉXITO    | {agencia:<40} | ALTAS: {altas:<5} | Registros BASE: {registros_base:<5} | OK"
+        return f"DESCUADRE | {agencia:<40} | ALTAS: {altas:<5} | Registros BASE: {registros_base:<5} | REVISAR"
+
+    def lineas_log(self):
+        return [self.linea_log(agencia) for agencia in self._posiciones]
+
+    def contar(self, estado):
+        return int((self.tabla['ESTADO'] == estado).sum())
+
+    def resumen_log(self):
+        """ASESOR sin reporte y totales de la conciliación."""
+        lineas = [f"SIN REPORTE | {fila.AGENCIA:<40} | Registros BASE: {fila.REGISTROS_BASE:<5} | REVISAR"
+                  for fila in self.tabla[self.tabla['ESTADO'] == SIN_REPORTE].itertuples()]
+        lineas.append(f"CONCILIACIÓN | Agencias: {len(self.tabla) - self.contar(SIN_REPORTE)} | OK: {self.contar(OK)} | "
+                      f"Con descuadre: {self.contar(DESCUADRE)} | Sin ALTAS válidas: {self.contar(SIN_ALTAS) + self.contar(ERROR)} | "
+                      f"ASESOR sin reporte: {self.contar(SIN_REPORTE)}")
+        return lineas
+
+    def descuadres(self):
+        """Filas que no cuadran (todo lo que no es OK)."""
+        return self.tabla[self.tabla['ESTADO'] != OK]
+
+    def a_csv(self):
+        # Con BOM para que Excel lo abra con las tildes bien.
+        return self.tabla.to_csv(index=False).encode('utf-8-sig')
+
+    def a_xlsx(self):
+        with LibroXlsx(filas=len(self.tabla)) as libro:
+            libro.escribir_hoja('Conciliación', self.tabla, columnas={'AGENCIA': (45, None), 'DETALLE': (45, None)})
+        return libro.resultado()
@@ -0,0 +1,49 @@
+# segmentador/corte_2.py
+"""
+Plan de columnas del 'Reporte CORTE 2' (cabecera de dos filas), resuelto una
+sola vez por ejecución.
+
+La cabecera se aplana a una fila ('PENALIDAD 1 - ...', 'CLAWBACK 1 - ...'),
+se ubican AGENCIA y ALTAS y se fijan las columnas que se exportan. El
+reporte completo se aplana una vez con `PlanCorte2.aplanar`; las porciones
+de cada agencia salen de ahí ya listas (solo las filas de la agencia, sin
+volver a recorrer ni copiar la cabecera por agencia).
+"""
+
+
+def nombre_aplanado(columna):
+    """Nombre de una columna (nivel 1, nivel 2) en la cabecera de una sola fila."""
+    level1 = str(columna[0]).strip()
+    level2 = str(columna[1]).strip().replace('\n', ' ')
+    # Si la cabecera superior es 'Unnamed' o es igual a la inferior, usar solo la inferior.
+    if 'unnamed' in level1.lower() or level1 == level2:
+        return level2
+    return f"{level1} - {level2}"
+
+
+class PlanCorte2:
+    """
+    Columnas del reporte tal como se leyó, con sus `nombres` aplanados. Las
+    columnas auxiliares que se añadan después al reporte no se exportan.
+    """
+
+    def __init__(self, columnas):
+        self.columnas = list(columnas)
+        self.nombres = [nombre_aplanado(col) for col in self.columnas]
+
+    def posicion(self, nombre, nivel=None, contiene=False):
+        """
+        Posición de la primera columna llamada `nombre` en el `nivel` indicado
+        (o en cualquiera), o que lo `contiene` en ese nivel. None si no hay.
+        """
+        for i, col in enumerate(self.columnas):
+            niveles = col if nivel is None else (col[nivel],)
+            if any(nombre in str(valor) if contiene else nombre == valor for valor in niveles):
+                return i
+        return None
+
+    def aplanar(self, df):
+        """El reporte con las columnas del plan y la cabecera ya aplanada."""
+        plano = df.iloc[:, :len(self.columnas)]
+        plano.columns = self.nombres
+        return plano
@@ -0,0 +1,158 @@
+# segmentador/escritor.py
+"""
+Escritor de libros .xlsx sin pasar por `DataFrame.to_excel`.
+
+`to_excel` crea un objeto de celda, serializa su estilo a JSON y despacha su
+tipo valor por valor; con BASEs grandes eso es la mayor parte del tiempo de
+cada libro. Aquí cada columna se convierte una sola vez a una lista de
+valores de Python (desde el arreglo de NumPy) y las filas se escriben con
+`write_row`. Los libros con muchas filas se escriben en modo
+`constant_memory` de xlsxwriter (fila por fila a un temporal, memoria
+constante); los pequeños, en memoria, que es más rápido.
+
+Los valores y formatos resultantes son los mismos que deja `to_excel`
+(pandas 3): cabecera sin estilo, celdas vacías para NaN/None, 'inf' como
+texto, fechas con 'YYYY-MM-DD HH:MM:SS' / 'YYYY-MM-DD'. Los formatos de
+`ESTILOS` se crean una sola vez por libro, al usarse por primera vez.
+"""
+import io
+import math
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# A partir de estas filas (sumando todas las hojas) el libro se escribe en modo constant_memory.
+FILAS_STREAMING = 50_000
+
+ESTILOS = {
+    'porcentaje': {'num_format': '0.00%'},
+    'monto': {'num_format': '#,##0.00'},
+    'fecha': {'num_format': 'YYYY-MM-DD'},
+    'fecha_hora': {'num_format': 'YYYY-MM-DD HH:MM:SS'},
+    'dias': {'num_format': '0'},
+    'cabecera_corte_2': {'bold': True, 'fg_color': '#FFC000', 'border': 1},
+    'cabecera_penalidad': {'bold': True, 'font_color': 'white', 'fg_color': '#0070C0', 'border': 1},
+    'cabecera_clawback': {'bold': True, 'font_color': 'white', 'fg_color': '#002060', 'border': 1},
+}
+
+
+def _celda(valor):
+    """(valor, estilo) de una celda con las mismas reglas que `to_excel`."""
+    if valor is None or (pd.api.types.is_scalar(valor) and pd.isna(valor)):
+        return None, None
+    if isinstance(valor, (bool, np.bool_)):
+        return bool(valor), None
+    if isinstance(valor, (int, np.integer)):
+        return int(valor), None
+    if isinstance(valor, (float, np.floating)):
+        if math.isinf(valor):
+            return ('inf' if valor > 0 else '-inf'), None
+        return float(valor), None
+    if isinstance(valor, Decimal):
+        return valor, None
+    if isinstance(valor, datetime):
+        return valor, 'fecha_hora'
+    if isinstance(valor, date):
+        return valor, 'fecha'
+    if isinstance(valor, timedelta):
+        return valor.total_seconds() / 86400, 'dias'
+    return str(valor), None
+
+
+def _columna(serie):
+    """
+    Valores de la columna como lista de Python (None = celda vacía) y su
+    estilo: None, el nombre de un estilo para toda la columna o una lista con
+    el estilo de cada celda.
+    """
+    tipo = serie.dtype
+    if isinstance(tipo, np.dtype):
+        if tipo.kind in 'iub':
+            return serie.to_numpy().tolist(), None
+        if tipo.kind == 'f':
+            valores = serie.to_numpy()
+            if np.isfinite(valores).all():
+                return valores.tolist(), None
+            return [_celda(v)[0] for v in valores.tolist()], None
+        if tipo.kind == 'M':
+            return serie.astype(object).where(serie.notna(), None).tolist(), 'fecha_hora'
+    if isinstance(tipo, pd.CategoricalDtype):
+        solo_texto = tipo.categories.inferred_type == 'string'
+    else:
+        solo_texto = isinstance(tipo, pd.StringDtype) or pd.api.types.infer_dtype(serie, skipna=True) == 'string'
+    if solo_texto:
+        return serie.astype(object).where(serie.notna(), None).tolist(), None
+    celdas = [_celda(v) for v in serie.tolist()]
+    estilos = [estilo for _, estilo in celdas]
+    return [valor for valor, _ in celdas], (estilos if any(estilos) else None)
+
+
+class LibroXlsx:
+    """
+    Uso:
+        with LibroXlsx(destino, filas=len(base)) as libro:
+            libro.escribir_hoja('Reporte Agencia', reporte, columnas={'TOTAL A PAGAR': (18, 'monto')})
+            libro.escribir_hoja('BASE', base)
+        contenido = libro.resultado()  # bytes, o None si se escribió en `destino`
+    """
+
+    def __init__(self, destino=None, filas=0):
+        self.destino = destino
+        self._buffer = destino if destino is not None else io.BytesIO()
+        opciones = {'constant_memory': True} if filas >= FILAS_STREAMING else {'in_memory': True}
+        self.workbook = xlsxwriter.Workbook(self._buffer, opciones)
+        self._formatos = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.workbook.close()
+        return False
+
+    def formato(self, estilo):
+        """Formato del libro para `estilo` (clave de ESTILOS), creado una sola vez."""
+        if estilo is None:
+            return None
+        if estilo not in self._formatos:
+            self._formatos[estilo] = self.workbook.add_format(ESTILOS[estilo])
+        return self._formatos[estilo]
+
+    def escribir_hoja(self, nombre_hoja, df, columnas=None, estilo_cabecera=None):
+        """
+        Escribe `df` (cabecera + filas, sin índice) en una hoja nueva.
+        `columnas`: {nombre: (ancho, estilo)} para las columnas con formato propio.
+        `estilo_cabecera`: función nombre_de_columna -> estilo de su celda de cabecera.
+        """
+        hoja = self.workbook.add_worksheet(nombre_hoja)
+        nombres = list(df.columns)
+        # En constant_memory el formato de columna tiene que existir antes de escribir filas.
+        for nombre, (ancho, estilo) in (columnas or {}).items():
+            if nombre in nombres:
+                posicion = nombres.index(nombre)
+                hoja.set_column(posicion, posicion, ancho, self.formato(estilo))
+
+        for posicion, nombre in enumerate(nombres):
+            valor, estilo = _celda(nombre)
+            if estilo_cabecera is not None:
+                estilo = estilo_cabecera(nombre)
+            hoja.write(0, posicion, valor, self.formato(estilo))
+
+        datos = [_columna(df.iloc[:, posicion]) for posicion in range(len(nombres))]
+        # Las columnas con estilo se escriben celda por celda; el resto, con write_row.
+        con_estilo = [(posicion, valores, estilo) for posicion, (valores, estilo) in enumerate(datos) if estilo is not None]
+        simples = [repeat(None) if estilo is not None else valores for valores, estilo in datos]
+        for i, *fila in zip(range(len(df)), *simples):
+            hoja.write_row(i + 1, 0, fila)
+            for posicion, valores, estilo in con_estilo:
+                valor = valores[i]
+                if valor is not None:
+                    hoja.write(i + 1, posicion, valor, self.formato(estilo if isinstance(estilo, str) else estilo[i]))
+        return hoja
+
+    def resultado(self):
+        return None if self.destino is not None else self._buffer.getvalue()
@@ -0,0 +1,52 @@
+# segmentador/esquemas.py
+"""
+Qué se carga de cada tipo de libro y con qué tipos.
+
+- De la BASE de Corte 1 solo se cargan las columnas que se exportan (hasta
+  'RECIBO1_PAGADO') y las de cruce; la de Corte 2 se exporta completa.
+- ASESOR, ZONA y DEPARTAMENTO tienen pocos valores distintos y se repiten en
+  cada fila: se cargan como `category`, que ocupa una fracción de la memoria
+  y hace mucho más rápidos los `==`, `isin` y agrupamientos sobre ellas.
+- Las columnas numéricas se dejan con el tipo que infiere pandas. Provincia
+  Corte 1 sigue leyendo el resto como texto (`dtype=str`), como siempre, para
+  que los libros generados no cambien.
+"""
+CATEGORIAS_BASE = ['ASESOR', 'ZONA', 'DEPARTAMENTO']
+
+HOJAS_LIMA = {
+    'Reporte CORTE 1': {},
+    'BASE': {'columnas_hasta': 'RECIBO1_PAGADO', 'columnas_extra': ['ASESOR'], 'categorias': CATEGORIAS_BASE},
+}
+
+HOJAS_PROVINCIA = {
+    'Reporte CORTE 1': {'dtype': str},
+    'BASE': {'dtype': str, 'columnas_hasta': 'RECIBO1_PAGADO', 'columnas_extra': ['ASESOR', 'ZONA', 'DEPARTAMENTO'],
+             'categorias': CATEGORIAS_BASE},
+}
+
+HOJAS_CORTE_2 = {
+    'Reporte CORTE 2': {'header': [0, 1]},
+    'BASE': {'categorias': CATEGORIAS_BASE},
+}
+
+# Cabeceras mínimas de cada tipo de libro, por hoja y por fila, para revisarlas
+# antes de la lectura completa (ver `segmentador.cabeceras`).
+CABECERAS_LIMA = {
+    'Reporte CORTE 1': [['AGENCIA', 'RUC', 'ALTAS', 'TOTAL A PAGAR']],
+    'BASE': [['COD_PEDIDO', 'DNI_CLIENTE', 'ASESOR']],
+}
+
+CABECERAS_PROVINCIA = {
+    'Reporte CORTE 1': [['AGENCIA', 'RUC', 'ALTAS']],
+    'BASE': [['COD_PEDIDO', 'ASESOR', 'ZONA', 'DEPARTAMENTO']],
+}
+
+CABECERAS_LIMA_CORTE_2 = {
+    'Reporte CORTE 2': [['PENALIDAD 1', 'CLAWBACK 1'], ['RUC', 'AGENCIA', 'ALTAS', 'TOTAL A PAGAR CORTE 2']],
+    'BASE': [['ASESOR', 'COD_PEDIDO']],
+}
+
+CABECERAS_PROVINCIA_CORTE_2 = {
+    'Reporte CORTE 2': [[], ['AGENCIA', 'RUC']],
+    'BASE': [['ASESOR', 'DEPARTAMENTO']],
+}
@@ -0,0 +1,200 @@
+# segmentador/incremental.py
+"""
+Re-segmentación incremental: solo se regeneran los libros de las agencias
+cuyos datos cambiaron.
+
+Cada agencia tiene una huella: el hash de sus porciones ya particionadas
+(filas del reporte y de la BASE, columnas y tipos), de la función que arma
+su libro y de `VERSION_LIBROS`. Los libros generados se guardan en disco
+bajo su huella; en la siguiente ejecución, una agencia con la misma huella
+reutiliza esos bytes en vez de volver a generarse.
+
+Por serie (página, y zona en Provincia) se guarda además el manifiesto de la
+última ejecución (archivo -> huella), para informar en el log qué agencias
+son nuevas, cuáles cambiaron y cuáles ya no están.
+
+Configuración por variables de entorno:
+    SEGMENTADOR_INCREMENTAL_DIR   directorio de libros y manifiestos (por defecto <tmp>/segmentador_incremental; '0' lo desactiva)
+    SEGMENTADOR_INCREMENTAL_MB    límite total de los libros guardados (por defecto 2048 MB)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from segmentador.libros import VERSION_LIBROS
+
+MB = 1024 * 1024
+
+
+def huella_agencia(construir_libro, argumentos):
+    """Hash de la función que arma el libro y de las porciones de la agencia."""
+    h = hashlib.sha256(f"{construir_libro.__module__}.{construir_libro.__name__}|{VERSION_LIBROS}".encode('utf-8'))
+    for argumento in argumentos:
+        if not isinstance(argumento, pd.DataFrame):
+            h.update(repr(argumento).encode('utf-8'))
+            continue
+        h.update(repr([(str(columna), str(tipo)) for columna, tipo in argumento.dtypes.items()]).encode('utf-8'))
+        h.update(pd.util.hash_pandas_object(argumento, index=False).to_numpy().tobytes())
+        # En columnas object el hash de pandas no distingue 1 de '1'; el tipo de cada valor sí.
+        for columna in argumento.columns[argumento.dtypes == object]:
+            tipos = argumento[columna].map(lambda valor: type(valor).__name__)
+            h.update(pd.util.hash_pandas_object(tipos, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class AlmacenLibros:
+    """Libros por huella (`libros/<huella>.xlsx`) y manifiestos por serie (`manifiestos/<hash>.json`)."""
+
+    def __init__(self, directorio, max_bytes):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self._libros = os.path.join(directorio, 'libros')
+        self._manifiestos = os.path.join(directorio, 'manifiestos')
+        os.makedirs(self._libros, exist_ok=True)
+        os.makedirs(self._manifiestos, exist_ok=True)
+
+    def _ruta_manifiesto(self, serie):
+        return os.path.join(self._manifiestos, hashlib.sha256(serie.encode('utf-8')).hexdigest() + '.json')
+
+    def cargar(self, huella):
+        ruta = os.path.join(self._libros, huella + '.xlsx')
+        try:
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            os.utime(ruta)
+        except OSError:
+            return None
+        return contenido
+
+    def guardar(self, huella, contenido):
+        ruta = os.path.join(self._libros, huella + '.xlsx')
+        if os.path.exists(ruta):
+            return
+        _escribir_atomico(ruta, contenido, self._libros)
+
+    def manifiesto(self, serie):
+        """{archivo: huella} de la última ejecución de `serie`, o None si no hubo."""
+        try:
+            with open(self._ruta_manifiesto(serie), encoding='utf-8') as f:
+                return json.load(f)['archivos']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def guardar_manifiesto(self, serie, archivos):
+        contenido = json.dumps({'serie': serie, 'fecha': time.strftime('%Y-%m-%d %H:%M:%S'), 'archivos': archivos},
+                               ensure_ascii=False, indent=1).encode('utf-8')
+        _escribir_atomico(self._ruta_manifiesto(serie), contenido, self._manifiestos)
+        self.recortar()
+
+    def recortar(self):
+        """Borra los libros menos usados hasta respetar el límite."""
+        libros = []
+        for nombre in os.listdir(self._libros):
+            ruta = os.path.join(self._libros, nombre)
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            libros.append((estado.st_mtime, estado.st_size, ruta))
+        total = sum(tamano for _, tamano, _ in libros)
+        for _, tamano, ruta in sorted(libros):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            total -= tamano
+
+
+def _escribir_atomico(ruta, contenido, directorio):
+    descriptor, temporal = tempfile.mkstemp(prefix='.tmp-', dir=directorio)
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta)
+    except OSError:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+
+
+_almacen_global = None
+
+
+def almacen_libros_global():
+    """Almacén de libros del proceso, o None si está desactivado o no se puede crear."""
+    global _almacen_global
+    if _almacen_global is None:
+        directorio = os.environ.get('SEGMENTADOR_INCREMENTAL_DIR', os.path.join(tempfile.gettempdir(), 'segmentador_incremental'))
+        if directorio == '0':
+            return None
+        try:
+            _almacen_global = AlmacenLibros(directorio, int(os.environ.get('SEGMENTADOR_INCREMENTAL_MB', 2048)) * MB)
+        except OSError:
+            return None
+    return _almacen_global
+
+
+class SegmentacionIncremental:
+    """
+    Uso (lo hace `escribir_libros` cuando se le pasa):
+        incremental = SegmentacionIncremental('lima')
+        huella, contenido = incremental.buscar(nombre_archivo, libro_lima, argumentos)
+        ...  # si contenido es None, generar el libro y llamar a incremental.guardar(huella, contenido)
+        incremental.registrar(nombre_archivo, huella, reutilizado)
+        log_output.extend(incremental.resumen_log())
+        incremental.guardar_manifiesto()
+    """
+
+    def __init__(self, serie, almacen=None):
+        self.serie = serie
+        self.almacen = almacen or almacen_libros_global()
+        self.previo = self.almacen.manifiesto(serie) if self.almacen else None
+        self.actual = {}
+        self.reutilizados = []
+
+    @property
+    def activo(self):
+        return self.almacen is not None
+
+    def buscar(self, nombre_archivo, construir_libro, argumentos):
+        """(huella, bytes guardados o None)."""
+        huella = huella_agencia(construir_libro, argumentos)
+        return huella, self.almacen.cargar(huella) if self.almacen else None
+
+    def guardar(self, huella, contenido):
+        if self.almacen:
+            self.almacen.guardar(huella, contenido)
+
+    def registrar(self, nombre_archivo, huella, reutilizado):
+        self.actual[nombre_archivo] = huella
+        if reutilizado:
+            self.reutilizados.append(nombre_archivo)
+
+    def resumen_log(self):
+        if not self.activo:
+            return ["INCREMENTAL | Desactivado (SEGMENTADOR_INCREMENTAL_DIR=0 o directorio no disponible): se generaron todos los libros."]
+        lineas = []
+        if self.previo is None:
+            lineas.append(f"INCREMENTAL | Sin ejecución previa de '{self.serie}': todas las agencias se consideran nuevas.")
+        else:
+            for nombre_archivo, huella in self.actual.items():
+                if nombre_archivo not in self.previo:
+                    lineas.append(f"CAMBIO   | {nombre_archivo:<40} | NUEVA")
+                elif self.previo[nombre_archivo] != huella:
+                    lineas.append(f"CAMBIO   | {nombre_archivo:<40} | MODIFICADA")
+            for nombre_archivo in self.previo:
+                if nombre_archivo not in self.actual:
+                    lineas.append(f"CAMBIO   | {nombre_archivo:<40} | YA NO ESTÁ")
+        lineas.append(f"INCREMENTAL | Libros reutilizados: {len(self.reutilizados)} | regenerados: {len(self.actual) - len(self.reutilizados)}")
+        return lineas
+
+    def guardar_manifiesto(self):
+        if self.almacen:
+            self.almacen.guardar_manifiesto(self.serie, self.actual)
@@ -0,0 +1,78 @@
+# segmentador/libros.py
+"""
+Construcción del libro Excel de cada agencia.
+
+Son funciones de módulo (no closures) para que puedan ejecutarse en un
+proceso trabajador: reciben solo las porciones de la agencia y devuelven los
+bytes del .xlsx terminado. Si se indica `destino` (un archivo abierto para
+escritura, por ejemplo una entrada del ZIP de salida), el libro se escribe
+directamente ahí y no se devuelve nada.
+
+Los libros se escriben con `LibroXlsx` (ver `escritor.py`) en vez de
+`to_excel`; los formatos salen de `escritor.ESTILOS`.
+"""
+from functools import lru_cache
+
+from segmentador.escritor import LibroXlsx
+
+# Forma parte de la huella de cada agencia en el modo incremental: subirla al
+# cambiar el contenido o el formato de los libros invalida los ya guardados.
+VERSION_LIBROS = 2
+
+COLUMNAS_LIMA = {'CUMPLIMIENTO ALTAS %': (18, 'porcentaje'), 'TOTAL A PAGAR': (18, 'monto')}
+COLUMNAS_CORTE_2 = {'Cumplimiento Altas %': (18, 'porcentaje'), 'CLAWBACK 1 - Cumplimiento Corte 2 %': (18, 'porcentaje')}
+
+
+def _filas(*hojas):
+    return sum(len(df) for df in hojas)
+
+
+# Se resuelve una vez por nombre de columna: las agencias comparten la misma cabecera.
+@lru_cache(maxsize=None)
+def _cabecera_corte_2(header_text):
+    if header_text.startswith('PENALIDAD 1 -'):
+        return 'cabecera_penalidad'
+    if header_text.startswith('CLAWBACK 1 -'):
+        return 'cabecera_clawback'
+    return 'cabecera_corte_2'
+
+
+def _columnas_lima(reporte_agencia):
+    # Como en la página original, las columnas se formatean en orden y al
+    # faltar una ya no se formatean las siguientes: sin 'CUMPLIMIENTO ALTAS %'
+    # el reporte queda sin formato.
+    columnas = {}
+    for nombre, formato in COLUMNAS_LIMA.items():
+        if nombre not in reporte_agencia.columns:
+            break
+        columnas[nombre] = formato
+    return columnas
+
+
+def libro_lima(reporte_agencia, base_agencia, destino=None):
+    """Libro de Lima Corte 1: 'Reporte Agencia' con formato de % y montos, más la 'BASE'."""
+    with LibroXlsx(destino, _filas(reporte_agencia, base_agencia)) as libro:
+        libro.escribir_hoja('Reporte Agencia', reporte_agencia, columnas=_columnas_lima(reporte_agencia))
+        libro.escribir_hoja('BASE', base_agencia)
+    return libro.resultado()
+
+
+def libro_provincia(reporte_agencia, base_agencia, destino=None):
+    """Libro de Provincia Corte 1: 'Reporte Agencia' y 'BASE' sin formato adicional."""
+    with LibroXlsx(destino, _filas(reporte_agencia, base_agencia)) as libro:
+        libro.escribir_hoja('Reporte Agencia', reporte_agencia)
+        libro.escribir_hoja('BASE', base_agencia)
+    return libro.resultado()
+
+
+def libro_corte_2(reporte_agencia, base_agencia, destino=None):
+    """
+    Libro de Corte 2 (Lima y Provincia). `reporte_agencia` llega con la
+    cabecera ya aplanada a una sola fila ('PENALIDAD 1 - ...', 'CLAWBACK 1 - ...'),
+    que se escribe con el color de su grupo; las columnas de cumplimiento van en %.
+    """
+    with LibroXlsx(destino, _filas(reporte_agencia, base_agencia)) as libro:
+        libro.escribir_hoja('Reporte CORTE 2', reporte_agencia, columnas=COLUMNAS_CORTE_2,
+                            estilo_cabecera=_cabecera_corte_2)
+        libro.escribir_hoja('BASE', base_agencia)
+    return libro.resultado()
@@ -0,0 +1,134 @@
+# segmentador/lima.py
+"""
+Segmentación de Lima Corte 1: un libro por agencia con su reporte y su BASE.
+"""
+from segmentador.cabeceras import cabeceras_validas
+from segmentador.cache import cargar_libro_con_cache
+from segmentador.conciliacion import conciliar
+from segmentador.esquemas import CABECERAS_LIMA, HOJAS_LIMA
+from segmentador.incremental import SegmentacionIncremental
+from segmentador.particion import particionar
+from segmentador.registro import agencias_del_reporte, registro_global
+from segmentador.libros import libro_lima
+from segmentador.perfil import PerfilEjecucion
+from segmentador.salida import abrir_salida, escribir_libros
+from segmentador.volcado import volcar_base
+
+
+def procesar_archivos_excel(archivo_excel_cargado, trabajadores=None, perfil=None, compresion=None, incremental=False, solo_validar=False,
+                            por_partes=False, libro=None):
+    """
+    Con `solo_validar` no se generan libros: devuelve `(Conciliacion, log_output)`.
+    Con `por_partes` la BASE no se carga entera: se lee por bloques y se reparte
+    por agencia en disco (ver `segmentador.volcado`). `libro` es el libro ya
+    leído con `HOJAS_LIMA` (por ejemplo en un lote, ver `segmentador.lote`).
+    """
+    perfil = PerfilEjecucion('lima') if perfil is None else perfil
+    log_output = []
+    log_output.append("--- INICIO DEL PROCESO DE SEGMENTACIÓN Y VALIDACIÓN ---")
+    if libro is None and not cabeceras_validas(archivo_excel_cargado, CABECERAS_LIMA, log_output):
+        log_output.append("Por favor, asegúrese de que los encabezados estén en la Fila 1 de cada hoja y vuelva a intentarlo.")
+        return None, log_output
+    log_output.append("Leyendo datos completos del archivo...")
+    perfil.iniciar_etapa('Lectura del libro')
+    base_volcada = None
+    try:
+        if por_partes:
+            # Solo el reporte en memoria; la BASE va por bloques a un volcado por agencia (alias ya resueltos).
+            libro = cargar_libro_con_cache(archivo_excel_cargado, {'Reporte CORTE 1': HOJAS_LIMA['Reporte CORTE 1']})
+        elif libro is None:
+            # De la BASE solo se cargan las columnas hasta 'RECIBO1_PAGADO' (las demás no se exportan) y 'ASESOR'.
+            libro = cargar_libro_con_cache(archivo_excel_cargado, HOJAS_LIMA)
+        # Alias del registro de agencias; el ASESOR se cruza sin normalizar, con el canónico escrito como en el reporte.
+        mapeo_agencias_alias = registro_global().alias(agencias_del_reporte(libro, 'Reporte CORTE 1'), normalizadas=False)
+        if por_partes:
+            base_volcada = volcar_base(archivo_excel_cargado, 'ASESOR', mapeo_alias=mapeo_agencias_alias, columnas_hasta='RECIBO1_PAGADO')
+    except Exception as e:
+        log_output.append(f"ERROR: No se pudo leer el archivo Excel. Error: {e}")
+        return None, log_output
+    try:
+        perfil.cerrar_etapa(filas=sum(libro.filas.values()) + (base_volcada.filas_leidas if base_volcada is not None else 0))
+        perfil.iniciar_etapa('Validación y preparación')
+        cabeceras_esenciales_reporte = ['AGENCIA', 'RUC', 'ALTAS', 'TOTAL A PAGAR']
+        if not libro.validar_cabeceras('Reporte CORTE 1', cabeceras_esenciales_reporte):
+            log_output.append("ALERTA DE ARCHIVO: Las cabeceras esperadas (como 'AGENCIA', 'RUC', etc.) no se encontraron en la primera fila de la hoja 'Reporte CORTE 1'.")
+            log_output.append("Por favor, asegúrese de que los encabezados de su reporte estén en la Fila 1 del archivo Excel y vuelva a intentarlo.")
+            return None, log_output
+        cabeceras_esenciales_base = ['COD_PEDIDO', 'DNI_CLIENTE', 'ASESOR']
+        base_valida = base_volcada.validar_cabeceras(cabeceras_esenciales_base) if base_volcada is not None else \
+            not por_partes and libro.validar_cabeceras('BASE', cabeceras_esenciales_base)
+        if not base_valida:
+            log_output.append("ALERTA DE ARCHIVO: Las cabeceras esperadas (como 'COD_PEDIDO', 'ASESOR', etc.) no se encontraron en la primera fila de la hoja 'BASE'.")
+            log_output.append("Por favor, asegúrese de que los encabezados de su base estén en la Fila 1 del archivo Excel y vuelva a intentarlo.")
+            return None, log_output
+        log_output.append("Validación de cabeceras exitosa. Los encabezados se encontraron en la primera fila.")
+        log_output.extend(libro.resumen_tiempos())
+        df_reporte_total = libro.hoja('Reporte CORTE 1')
+        df_reporte_total.columns = df_reporte_total.columns.str.strip().str.upper()
+        if base_volcada is not None:
+            log_output.extend(base_volcada.resumen_log())
+            df_base_total = None
+            filas_base = base_volcada.filas_leidas
+        else:
+            df_base_total = libro.hoja('BASE')
+            df_base_total.columns = df_base_total.columns.str.strip().str.upper()
+            filas_base = len(df_base_total)
+        log_output.append("Nombres de columnas estandarizados (sin espacios y en mayúsculas).")
+        # ALTAS contra registros de la BASE, para todas las agencias de una vez.
+        perfil.iniciar_etapa('Conciliación', filas=filas_base)
+        if base_volcada is not None:
+            conciliacion = conciliar(df_reporte_total['AGENCIA'], df_reporte_total['ALTAS'], None, conteos=base_volcada.conteos())
+        else:
+            conciliacion = conciliar(df_reporte_total['AGENCIA'], df_reporte_total['ALTAS'], df_base_total['ASESOR'], mapeo_agencias_alias)
+        if solo_validar:
+            log_output.extend(conciliacion.lineas_log())
+            log_output.extend(conciliacion.resumen_log())
+            perfil.cerrar_etapa()
+            log_output.append("--- FIN DE LA VALIDACIÓN ---")
+            return conciliacion, log_output
+        segmentacion = SegmentacionIncremental('lima') if incremental else None
+        with abrir_salida(compresion) as salida:
+            agencias_a_procesar = df_reporte_total['AGENCIA'].dropna().unique().tolist()
+            log_output.append(f"Se encontraron {len(agencias_a_procesar)} agencias únicas para procesar.")
+            try:
+                columnas_base_deseadas = base_volcada.cabeceras if base_volcada is not None else df_base_total.columns.tolist()
+                indice_final = columnas_base_deseadas.index('RECIBO1_PAGADO')
+                columnas_a_mantener_en_base = columnas_base_deseadas[:indice_final + 1]
+            except ValueError:
+                log_output.append("ERROR: La columna 'RECIBO1_PAGADO' no se encontró en la hoja 'BASE'.")
+                return None, log_output
+            # Una sola pasada de agrupación por hoja; los alias se resuelven al agrupar la BASE.
+            perfil.iniciar_etapa('Particionado', filas=filas_base)
+            reporte_por_agencia = particionar(df_reporte_total, 'AGENCIA')
+            if base_volcada is not None:
+                # Ya repartida al leer: cada agencia se lee de su volcado cuando le toca.
+                base_por_agencia = base_volcada
+            else:
+                base_por_agencia = particionar(df_base_total[columnas_a_mantener_en_base], df_base_total['ASESOR'], mapeo_agencias_alias)
+            # Cada tarea anota la conciliación de la agencia (en el log, en orden, y para su evento de avance)
+            # y entrega solo sus porciones para generar el libro, en serie o en paralelo según `trabajadores`.
+            def tareas_por_agencia():
+                for agencia in agencias_a_procesar:
+                    reporte_agencia = reporte_por_agencia.obtener(agencia)
+                    if reporte_agencia.empty: continue
+                    base_agencia_final = base_por_agencia.obtener(agencia)
+                    nombre_archivo_limpio = "".join(c for c in agencia if c.isalnum() or c in (' ', '_')).rstrip()
+                    nombre_archivo = f"Reporte {nombre_archivo_limpio}.xlsx"
+                    log_output.append(perfil.anotar_agencia(nombre_archivo, agencia, conciliacion))
+                    yield nombre_archivo, (reporte_agencia, base_agencia_final)
+            perfil.anunciar_agencias(len(agencias_a_procesar))
+            perfil.iniciar_etapa('Libros y ZIP')
+            escribir_libros(salida, tareas_por_agencia(), libro_lima, trabajadores, perfil, segmentacion)
+        perfil.cerrar_etapa()
+    finally:
+        if base_volcada is not None:
+            base_volcada.cerrar()
+    perfil.datos.update(agencias=len(perfil.agencias), trabajadores=trabajadores, motor=libro.motor, zip_bytes=salida.tamano(), compresion=salida.compresion)
+    log_output.extend(conciliacion.resumen_log())
+    log_output.append(salida.resumen())
+    if segmentacion is not None:
+        log_output.extend(segmentacion.resumen_log())
+        segmentacion.guardar_manifiesto()
+    log_output.extend(perfil.resumen_log())
+    log_output.append("--- FIN DEL PROCESO ---")
+    return salida.para_descarga(), log_output
@@ -0,0 +1,165 @@
+# segmentador/lima_corte_2.py
+"""
+Segmentación de Lima Corte 2 (reporte con cabecera de dos filas).
+"""
+from segmentador.cabeceras import cabeceras_validas
+from segmentador.cache import cargar_libro_con_cache
+from segmentador.conciliacion import conciliar
+from segmentador.corte_2 import PlanCorte2
+from segmentador.esquemas import CABECERAS_LIMA_CORTE_2, HOJAS_CORTE_2
+from segmentador.incremental import SegmentacionIncremental
+from segmentador.particion import particionar
+from segmentador.registro import agencias_del_reporte, registro_global
+from segmentador.libros import libro_corte_2
+from segmentador.perfil import PerfilEjecucion
+from segmentador.salida import abrir_salida, escribir_libros
+from segmentador.volcado import volcar_base
+
+
+def procesar_reporte_corte_2(archivo_excel_cargado, trabajadores=None, perfil=None, compresion=None, incremental=False, solo_validar=False,
+                             por_partes=False, libro=None):
+    """
+    Procesa un archivo Excel con la estructura de "Corte 2", que contiene
+    cabeceras de múltiples niveles, y lo segmenta por agencia. Con
+    `solo_validar` no se generan libros: devuelve `(Conciliacion, log_output)`.
+    Con `por_partes` la BASE se lee por bloques y se reparte por agencia en
+    disco en lugar de cargarse entera (ver `segmentador.volcado`). `libro` es
+    el libro ya leído con `HOJAS_CORTE_2`, si lo hay.
+    """
+    perfil = PerfilEjecucion('lima_corte_2') if perfil is None else perfil
+    log_output = []
+    log_output.append("--- INICIO DEL PROCESO DE SEGMENTACIÓN (CORTE 2) ---")
+
+    if libro is None and not cabeceras_validas(archivo_excel_cargado, CABECERAS_LIMA_CORTE_2, log_output):
+        log_output.append("Asegúrese de que 'PENALIDAD 1', 'CLAWBACK 1' (fila 1) y 'RUC', 'AGENCIA', etc. (fila 2) estén presentes.")
+        return None, log_output
+
+    # --- 1. Lectura única del libro ---
+    # Cada hoja se lee una sola vez; la validación usa las cabeceras ya leídas.
+    perfil.iniciar_etapa('Lectura del libro')
+    base_volcada = None
+    try:
+        log_output.append("Leyendo datos completos del archivo...")
+        if por_partes:
+            # Solo el reporte en memoria; la BASE va por bloques a un volcado por 'ASESOR'.
+            libro = cargar_libro_con_cache(archivo_excel_cargado, {'Reporte CORTE 2': HOJAS_CORTE_2['Reporte CORTE 2']})
+        elif libro is None:
+            libro = cargar_libro_con_cache(archivo_excel_cargado, HOJAS_CORTE_2)
+        # Alias del registro de agencias (como en Lima: 'ASESOR' sin normalizar, canónico escrito como en el reporte).
+        mapeo_asesor_alias = registro_global().alias(agencias_del_reporte(libro, 'Reporte CORTE 2', nivel=1), normalizadas=False)
+        if por_partes:
+            base_volcada = volcar_base(archivo_excel_cargado, 'ASESOR', mapeo_alias=mapeo_asesor_alias)
+    except Exception as e:
+        log_output.append(f"ERROR: No se pudo leer el archivo Excel. Error: {e}")
+        return None, log_output
+
+    try:
+        # --- 2. Validación de Cabeceras ---
+        perfil.cerrar_etapa(filas=sum(libro.filas.values()) + (base_volcada.filas_leidas if base_volcada is not None else 0))
+        perfil.iniciar_etapa('Validación y preparación')
+        tiene_base = base_volcada is not None if por_partes else libro.tiene_hoja('BASE')
+        if not libro.tiene_hoja('Reporte CORTE 2') or not tiene_base:
+            log_output.append("ERROR al validar cabeceras: Asegúrese de que las hojas 'Reporte CORTE 2' y 'BASE' existan.")
+            return None, log_output
+
+        # Validación para 'Reporte CORTE 2' con cabeceras en dos filas
+        cabeceras_fila1_esperadas = ['PENALIDAD 1', 'CLAWBACK 1']
+        cabeceras_fila2_esperadas = ['RUC', 'AGENCIA', 'ALTAS', 'TOTAL A PAGAR CORTE 2']
+
+        if not libro.validar_cabeceras('Reporte CORTE 2', cabeceras_fila1_esperadas, nivel=0) or not libro.validar_cabeceras('Reporte CORTE 2', cabeceras_fila2_esperadas, nivel=1):
+            log_output.append("ALERTA DE ARCHIVO: No se encontraron las cabeceras esperadas en las dos primeras filas de la hoja 'Reporte CORTE 2'.")
+            log_output.append("Asegúrese de que 'PENALIDAD 1', 'CLAWBACK 1' (fila 1) y 'RUC', 'AGENCIA', etc. (fila 2) estén presentes.")
+            return None, log_output
+
+        # Validación para 'BASE' (cabecera simple)
+        base_valida = base_volcada.validar_cabeceras(['ASESOR', 'COD_PEDIDO']) if base_volcada is not None else \
+            libro.validar_cabeceras('BASE', ['ASESOR', 'COD_PEDIDO'])
+        if not base_valida:
+            log_output.append("ALERTA DE ARCHIVO: Las cabeceras 'ASESOR' y 'COD_PEDIDO' no se encontraron en la hoja 'BASE'.")
+            return None, log_output
+
+        log_output.append("Validación de cabeceras exitosa.")
+        log_output.extend(libro.resumen_tiempos())
+
+        df_reporte_total = libro.hoja('Reporte CORTE 2')
+        if base_volcada is not None:
+            # Cabeceras ya estandarizadas al volcarla.
+            log_output.extend(base_volcada.resumen_log())
+            df_base_total = None
+            filas_base = base_volcada.filas_leidas
+        else:
+            df_base_total = libro.hoja('BASE')
+
+            # Estandarizar cabeceras de la hoja BASE
+            df_base_total.columns = df_base_total.columns.str.strip().str.upper()
+            filas_base = len(df_base_total)
+        log_output.append("Datos cargados y cabeceras de la BASE estandarizadas.")
+
+        # Cabecera de dos filas: las columnas se resuelven y se aplanan una sola vez para todas las agencias.
+        plan = PlanCorte2(df_reporte_total.columns)
+        posicion_agencia, posicion_altas = plan.posicion('AGENCIA'), plan.posicion('ALTAS')
+        if posicion_agencia is None:
+             log_output.append(f"ERROR: No se pudo encontrar la columna 'AGENCIA' en la hoja 'Reporte CORTE 2'.")
+             return None, log_output
+        columna_agencia = plan.columnas[posicion_agencia]
+        columna_altas = plan.columnas[posicion_altas] if posicion_altas is not None else None
+
+        # --- 3. Conciliación de ALTAS contra la BASE (todas las agencias de una vez) ---
+        perfil.iniciar_etapa('Conciliación', filas=filas_base)
+        conciliacion = conciliar(df_reporte_total[columna_agencia], df_reporte_total[columna_altas] if columna_altas else None,
+                                 df_base_total['ASESOR'] if base_volcada is None else None, mapeo_asesor_alias,
+                                 conteos=base_volcada.conteos() if base_volcada is not None else None)
+        if solo_validar:
+            log_output.extend(conciliacion.lineas_log())
+            log_output.extend(conciliacion.resumen_log())
+            perfil.cerrar_etapa()
+            log_output.append("--- FIN DE LA VALIDACIÓN ---")
+            return conciliacion, log_output
+
+        # --- 4. Proceso de Segmentación ---
+        segmentacion = SegmentacionIncremental('lima_corte_2') if incremental else None
+        with abrir_salida(compresion) as salida:
+            agencias_a_procesar = df_reporte_total[columna_agencia].dropna().unique().tolist()
+            log_output.append(f"Se encontraron {len(agencias_a_procesar)} agencias únicas para procesar.")
+
+            # Agrupar una sola vez: el reporte por 'AGENCIA' y la BASE por 'ASESOR' (con los alias resueltos).
+            perfil.iniciar_etapa('Particionado', filas=filas_base)
+            reporte_por_agencia = particionar(plan.aplanar(df_reporte_total), df_reporte_total[columna_agencia])
+            # Leída por partes, la BASE ya está repartida: cada agencia se lee de su volcado cuando le toca.
+            base_por_agencia = base_volcada if base_volcada is not None else particionar(df_base_total, 'ASESOR', mapeo_asesor_alias)
+
+            # Cada tarea anota la conciliación en este proceso (el log conserva el orden) y entrega
+            # solo sus porciones, con la cabecera ya aplanada, para generar el libro en serie o en paralelo.
+            def tareas_por_agencia():
+                for agencia in agencias_a_procesar:
+                    reporte_agencia = reporte_por_agencia.obtener(agencia)
+                    if reporte_agencia.empty:
+                        continue
+
+                    # La lógica de cruce con la BASE sigue siendo por 'ASESOR'
+                    base_agencia = base_por_agencia.obtener(agencia)
+
+                    nombre_archivo_limpio = "".join(c for c in agencia if c.isalnum() or c in (' ', '_')).rstrip()
+                    nombre_archivo = f"Reporte Corte 2 {nombre_archivo_limpio}.xlsx"
+
+                    # Validación de consistencia (ya calculada para todas las agencias), también para el evento de avance
+                    log_output.append(perfil.anotar_agencia(nombre_archivo, agencia, conciliacion))
+                    yield nombre_archivo, (reporte_agencia, base_agencia)
+
+            perfil.anunciar_agencias(len(agencias_a_procesar))
+            perfil.iniciar_etapa('Libros y ZIP')
+            escribir_libros(salida, tareas_por_agencia(), libro_corte_2, trabajadores, perfil, segmentacion)
+        perfil.cerrar_etapa()
+    finally:
+        if base_volcada is not None:
+            base_volcada.cerrar()
+    perfil.datos.update(agencias=len(perfil.agencias), trabajadores=trabajadores, motor=libro.motor, zip_bytes=salida.tamano(), compresion=salida.compresion)
+    log_output.extend(conciliacion.resumen_log())
+    log_output.append(salida.resumen())
+    if segmentacion is not None:
+        log_output.extend(segmentacion.resumen_log())
+        segmentacion.guardar_manifiesto()
+    log_output.extend(perfil.resumen_log())
+
+    log_output.append("--- FIN DEL PROCESO ---")
+    return salida.para_descarga(), log_output
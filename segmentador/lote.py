@@ -0,0 +1,295 @@
+# segmentador/lote.py
+"""
+Procesamiento por lote: varios consolidados (Lima o Provincia, Corte 1 o
+Corte 2) de una vez, con un único archivo de resultados.
+
+- El corte de cada libro se reconoce por sus hojas ('Reporte CORTE 1' o
+  'Reporte CORTE 2'). Si es de Lima o de Provincia lo indica quien lo sube:
+  la BASE tiene las mismas columnas en ambos (`region_sugerida` propone una
+  a partir del nombre del archivo). Provincia Corte 1 se procesa para todas
+  las zonas.
+- Los libros cuya hoja BASE tiene el mismo contenido (misma `huella_hoja`,
+  que se calcula sobre el XML del xlsx sin leerlo con pandas) forman un
+  grupo, y la BASE del grupo se lee una sola vez por tipo de lectura (como
+  texto para Provincia Corte 1, con tipos inferidos para el resto).
+- Los grupos se procesan a la vez en procesos separados; el resultado es un
+  ZIP (o TAR) con una carpeta por libro.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+from segmentador.cabeceras import partes_del_libro, revisar_cabeceras
+from segmentador.carga import LibroCargado, cargar_libro, seleccionar_columnas
+from segmentador.esquemas import (CABECERAS_LIMA, CABECERAS_LIMA_CORTE_2, CABECERAS_PROVINCIA, CABECERAS_PROVINCIA_CORTE_2,
+                                  HOJAS_CORTE_2, HOJAS_LIMA, HOJAS_PROVINCIA)
+from segmentador.lima import procesar_archivos_excel
+from segmentador.lima_corte_2 import procesar_reporte_corte_2
+from segmentador.paralelo import trabajadores_disponibles
+from segmentador.provincia import procesar_todas_las_zonas
+from segmentador.provincia_corte_2 import procesar_provincia_corte_2
+from segmentador.salida import abrir_salida, extension_salida
+
+HOJAS_DE_CORTE = {'Reporte CORTE 1': 1, 'Reporte CORTE 2': 2}
+REGIONES = ['lima', 'provincia']
+MODO_POR_REGION_Y_CORTE = {('lima', 1): 'lima', ('lima', 2): 'lima-corte2',
+                           ('provincia', 1): 'all-zones', ('provincia', 2): 'provincia-corte2'}
+PROCESADORES = {'lima': (procesar_archivos_excel, HOJAS_LIMA),
+                'lima-corte2': (procesar_reporte_corte_2, HOJAS_CORTE_2),
+                'provincia-corte2': (procesar_provincia_corte_2, HOJAS_CORTE_2),
+                'all-zones': (procesar_todas_las_zonas, HOJAS_PROVINCIA)}
+CABECERAS_POR_MODO = {'lima': CABECERAS_LIMA, 'lima-corte2': CABECERAS_LIMA_CORTE_2,
+                      'provincia-corte2': CABECERAS_PROVINCIA_CORTE_2, 'all-zones': CABECERAS_PROVINCIA}
+
+_NS_PRINCIPAL = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_CELDA_COMPARTIDA = re.compile(rb'(t="s"[^>]*>)<v>(\d+)</v>')
+_INDICE_COMPARTIDO = re.compile(rb't="s"[^>]*><v>(\d+)</v>')
+_ESTILO = re.compile(rb' s="(\d+)"')
+_CADENA = re.compile(rb'<si>(.*?)</si>', re.S)
+_TEXTO = re.compile(rb'<t[^>]*>(.*?)</t>', re.S)
+_FONETICA = re.compile(rb'<rPh\b.*?</rPh>', re.S)
+
+
+def hojas_del_libro(archivo):
+    """Nombres de las hojas del xlsx, sin leer su contenido."""
+    if hasattr(archivo, 'seek'): archivo.seek(0)
+    with zipfile.ZipFile(archivo) as zf:
+        return list(partes_del_libro(zf)['hojas'])
+
+
+def identificar_corte(archivo):
+    """1 o 2 según la hoja de reporte del libro, o None si no tiene ninguna."""
+    for nombre in hojas_del_libro(archivo):
+        if nombre in HOJAS_DE_CORTE:
+            return HOJAS_DE_CORTE[nombre]
+    return None
+
+
+def region_sugerida(nombre_archivo):
+    return 'provincia' if 'PROV' in nombre_archivo.upper() else 'lima'
+
+
+def _formatos_de_estilos(xml_estilos, usados):
+    """Formato numérico de cada estilo usado por la hoja (lo que decide si un número se lee como fecha)."""
+    raiz = ET.fromstring(xml_estilos)
+    personalizados = {f.get('numFmtId'): f.get('formatCode') for f in raiz.iter(_NS_PRINCIPAL + 'numFmt')}
+    celdas = raiz.find(_NS_PRINCIPAL + 'cellXfs')
+    xfs = [] if celdas is None else [xf.get('numFmtId', '0') for xf in celdas.iter(_NS_PRINCIPAL + 'xf')]
+    formatos = []
+    for indice in sorted(usados):
+        id_formato = xfs[indice] if indice < len(xfs) else '0'
+        formatos.append(f"{indice}:{personalizados.get(id_formato, id_formato)}")
+    return "\n".join(formatos).encode('utf-8')
+
+
+def huella_hoja(archivo, nombre_hoja='BASE'):
+    """
+    SHA-256 del contenido de una hoja, comparable entre libros distintos:
+    las referencias a la tabla de textos compartidos del libro se reemplazan
+    por los textos, y los estilos usados por su formato numérico. Dos hojas
+    con la misma huella se leen igual. None si la hoja no existe.
+    """
+    if hasattr(archivo, 'seek'): archivo.seek(0)
+    with zipfile.ZipFile(archivo) as zf:
+        partes = partes_del_libro(zf)
+        ruta = partes['hojas'].get(nombre_hoja)
+        if ruta is None:
+            return None
+        xml = zf.read(ruta)
+        inicio, fin = xml.find(b'<sheetData'), xml.rfind(b'</sheetData>')
+        datos = xml[inicio:fin] if 0 <= inicio < fin else xml
+        sha = hashlib.sha256(_CELDA_COMPARTIDA.sub(rb'\1<v></v>', datos))
+        indices = _INDICE_COMPARTIDO.findall(datos)
+        if indices and partes['cadenas']:
+            cadenas = [b''.join(_TEXTO.findall(_FONETICA.sub(b'', si))) for si in _CADENA.findall(zf.read(partes['cadenas']))]
+            sha.update(b'\0'.join(cadenas[int(indice)] for indice in indices))
+        if partes['estilos']:
+            sha.update(_formatos_de_estilos(zf.read(partes['estilos']), {int(s) for s in set(_ESTILO.findall(datos))}))
+    return sha.hexdigest()
+
+
+class LecturasCompartidas:
+    """BASE leídas una sola vez por (huella, tipo de lectura) para todos los libros de un grupo."""
+
+    def __init__(self):
+        self._leidas = {}
+
+    def libro(self, archivo, hojas, huella_base):
+        """El `LibroCargado` de `archivo` con `hojas`, reutilizando la BASE si ya se leyó."""
+        opciones_base = dict(hojas['BASE'])
+        columnas_hasta = opciones_base.pop('columnas_hasta', None)
+        columnas_extra = opciones_base.pop('columnas_extra', ())
+        clave = (huella_base, repr(sorted(opciones_base.items())))
+        libro = cargar_libro(archivo, {nombre: opciones for nombre, opciones in hojas.items() if nombre != 'BASE'})
+        completa, compartida = self._leidas.get(clave), True
+        if completa is None or huella_base is None:
+            completa, compartida = cargar_libro(archivo, {'BASE': opciones_base}), False
+            self._leidas[clave] = completa
+        if 'BASE' not in completa.hojas:
+            return libro, compartida
+        base, cabeceras = completa.hojas['BASE'], {}
+        if columnas_hasta:
+            base, cabeceras['BASE'] = seleccionar_columnas(base, columnas_hasta, columnas_extra)
+        tiempos, filas = dict(libro.tiempos), dict(libro.filas, BASE=len(base))
+        if compartida:
+            tiempos['BASE ya leída en el lote'] = 0.0
+        else:
+            tiempos['BASE'] = completa.tiempos['BASE']
+        return LibroCargado(dict(libro.hojas, BASE=base), tiempos, filas, cabeceras, libro.motor,
+                            dict(libro.memoria, **completa.memoria)), compartida
+
+
+def _procesar_grupo(entradas, compresion, trabajadores, directorio):
+    """
+    Proceso de un grupo de libros con la misma BASE. Es una función de módulo
+    para poder ejecutarse en otro proceso. Deja cada resultado en `directorio`
+    y devuelve [(indice, ruta_resultado o None, log_output)]. Un libro que
+    falla queda con su error en el log y el grupo sigue con los demás.
+    """
+    lecturas = LecturasCompartidas()
+    resultados = []
+    for entrada in entradas:
+        procesar, hojas = PROCESADORES[entrada['modo']]
+        log_output = []
+        with open(entrada['ruta'], 'rb') as archivo:
+            try:
+                libro, compartida = lecturas.libro(archivo, hojas, entrada['huella_base'])
+            except Exception as e:
+                resultados.append((entrada['indice'], None, [f"ERROR: No se pudo leer el archivo Excel. Error: {e}"]))
+                continue
+            if compartida:
+                log_output.append("LOTE     | BASE idéntica a la de otro libro del lote: no se volvió a leer.")
+            try:
+                resultado, log_proceso = procesar(archivo, libro=libro, trabajadores=trabajadores, compresion=compresion)
+            except Exception as e:
+                log_output.append(f"ERROR: No se pudieron generar los reportes de este libro. Error: {e}")
+                resultados.append((entrada['indice'], None, log_output))
+                continue
+        log_output.extend(log_proceso)
+        ruta_resultado = None
+        if resultado is not None:
+            ruta_resultado = os.path.join(directorio, f"resultado_{entrada['indice']}{extension_salida(compresion)}")
+            resultado.seek(0)
+            with open(ruta_resultado, 'wb') as f:
+                shutil.copyfileobj(resultado, f)
+        resultados.append((entrada['indice'], ruta_resultado, log_output))
+    return resultados
+
+
+def _entradas_del_archivo(ruta, compresion):
+    """(nombre, bytes) de cada libro dentro de un resultado ZIP o TAR."""
+    if extension_salida(compresion) == '.tar':
+        with tarfile.open(ruta) as tar:
+            for miembro in tar.getmembers():
+                if miembro.isfile():
+                    yield miembro.name, tar.extractfile(miembro).read()
+        return
+    with zipfile.ZipFile(ruta) as zf:
+        for nombre in zf.namelist():
+            yield nombre, zf.read(nombre)
+
+
+def _carpeta(nombre_archivo, usadas):
+    carpeta = "".join(c for c in os.path.splitext(nombre_archivo)[0] if c.isalnum() or c in (' ', '_', '-')).strip() or 'libro'
+    base, n = carpeta, 2
+    while carpeta in usadas:
+        carpeta, n = f"{base} ({n})", n + 1
+    usadas.add(carpeta)
+    return carpeta
+
+
+def procesar_lote(archivos, compresion=None, paralelo=None, trabajadores=1):
+    """
+    `archivos` es una lista de (nombre_archivo, contenido, region) con
+    `contenido` en bytes y `region` 'lima' o 'provincia'. Devuelve
+    `(archivo_resultado, log_output)`; el resultado tiene una carpeta por
+    libro procesado con éxito (None si no hubo ninguno).
+    """
+    inicio = time.perf_counter()
+    log_output = ["--- INICIO DEL PROCESO POR LOTE ---"]
+    directorio = tempfile.mkdtemp(prefix='segmentador_lote_')
+    try:
+        # --- 1. Identificación y huella de la BASE de cada libro ---
+        entradas, grupos, nombres = [], {}, {}
+        for indice, (nombre_archivo, contenido, region) in enumerate(archivos):
+            nombres[indice] = nombre_archivo
+            try:
+                corte = identificar_corte(io.BytesIO(contenido))
+                huella_base = huella_hoja(io.BytesIO(contenido), 'BASE')
+            except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+                log_output.append(f"ERROR    | {nombre_archivo}: no es un libro xlsx válido ({e}).")
+                continue
+            if corte is None:
+                log_output.append(f"ERROR    | {nombre_archivo}: no tiene hoja 'Reporte CORTE 1' ni 'Reporte CORTE 2'.")
+                continue
+            modo = MODO_POR_REGION_Y_CORTE[(region, corte)]
+            # Un libro mal armado se descarta aquí, sin ocupar un proceso en leerlo entero.
+            problemas = revisar_cabeceras(io.BytesIO(contenido), CABECERAS_POR_MODO[modo])
+            if problemas:
+                log_output.extend(f"ERROR    | {nombre_archivo}: {problema}" for problema in problemas)
+                continue
+            ruta = os.path.join(directorio, f"entrada_{indice}.xlsx")
+            with open(ruta, 'wb') as f:
+                f.write(contenido)
+            entrada = {'indice': indice, 'ruta': ruta, 'modo': modo, 'huella_base': huella_base}
+            entradas.append(entrada)
+            # Sin BASE (o sin huella) cada libro va solo; su página reportará lo que falte.
+            grupos.setdefault(huella_base or f"sin_base_{indice}", []).append(entrada)
+            log_output.append(f"LOTE     | {nombre_archivo}: {region.capitalize()} Corte {corte} (modo '{modo}')")
+        for grupo in grupos.values():
+            if len(grupo) > 1:
+                log_output.append(f"LOTE     | BASE idéntica en {', '.join(nombres[e['indice']] for e in grupo)}: se lee una sola vez.")
+        log_output.append(f"LOTE     | {len(entradas)} libros en {len(grupos)} grupos por BASE "
+                          f"({time.perf_counter() - inicio:.2f} s de identificación)")
+
+        # --- 2. Un proceso por grupo (en serie si hay un solo grupo o un solo proceso) ---
+        paralelo = min(len(grupos), paralelo or trabajadores_disponibles())
+        resultados = {}
+        if paralelo <= 1:
+            for grupo in grupos.values():
+                for indice, ruta, log in _procesar_grupo(grupo, compresion, trabajadores, directorio):
+                    resultados[indice] = (ruta, log)
+        else:
+            contexto = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=paralelo, mp_context=contexto) as pool:
+                futuros = [(grupo, pool.submit(_procesar_grupo, grupo, compresion, trabajadores, directorio)) for grupo in grupos.values()]
+                for grupo, futuro in futuros:
+                    try:
+                        procesados = futuro.result()
+                    except Exception as e:
+                        # El proceso del grupo murió (p. ej. sin memoria): sus libros quedan con error, los demás siguen.
+                        procesados = [(entrada['indice'], None, [f"ERROR: El proceso de este libro terminó inesperadamente. Error: {e!r}"])
+                                      for entrada in grupo]
+                    for indice, ruta, log in procesados:
+                        resultados[indice] = (ruta, log)
+
+        # --- 3. Un solo archivo con una carpeta por libro, en el orden en que se subieron ---
+        exitos, usadas = 0, set()
+        with abrir_salida(compresion) as salida:
+            for indice in sorted(resultados):
+                ruta, log = resultados[indice]
+                log_output.append(f"=== {nombres[indice]} ===")
+                log_output.extend(log)
+                if ruta is None:
+                    log_output.append(f"ERROR    | {nombres[indice]}: no se generaron reportes (ver el log de arriba).")
+                    continue
+                carpeta = _carpeta(nombres[indice], usadas)
+                for nombre, contenido in _entradas_del_archivo(ruta, compresion):
+                    salida.agregar_bytes(f"{carpeta}/{nombre}", contenido)
+                exitos += 1
+        log_output.append(salida.resumen())
+        log_output.append(f"RESUMEN  | Lote: {exitos} de {len(archivos)} libros procesados en {time.perf_counter() - inicio:.2f} s "
+                          f"({paralelo} procesos)")
+        log_output.append("--- FIN DEL PROCESO POR LOTE ---")
+        return (salida.para_descarga() if exitos else None), log_output
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
@@ -0,0 +1,232 @@
+# segmentador/memoria.py
+"""
+Gobierno de la memoria del servidor de Streamlit, compartido por todos los
+usuarios.
+
+- Cada sesión del navegador cuenta los bytes de lo que mantiene vivo:
+  archivos subidos, tablas cargadas y resultados (ZIP/TAR) para descargar.
+  Si la sesión pasa su presupuesto, sus resultados se vuelcan a disco (los
+  más grandes primero) y la descarga los lee de ahí al hacer clic, en lugar
+  de quedar en memoria mientras la sesión siga abierta. Un resultado nuevo de
+  la misma página reemplaza (y libera) al anterior, y las sesiones inactivas
+  se olvidan con sus volcados.
+- Los procesos pesados (leer un libro, validarlo o generar sus reportes, en
+  la página o como trabajo en segundo plano) pasan por un semáforo global:
+  como mucho `procesos_pesados` a la vez, calculados a partir de la RAM
+  disponible al arrancar; el resto espera su turno.
+
+Variables de entorno:
+    SEGMENTADOR_SESION_MB          presupuesto de memoria por sesión (por defecto 1024)
+    SEGMENTADOR_SESION_DIR         directorio de los volcados (por defecto el temporal del sistema)
+    SEGMENTADOR_SESION_HORAS       horas sin actividad tras las que se olvida una sesión (por defecto 6)
+    SEGMENTADOR_MB_POR_PROCESO     RAM que se reserva por proceso pesado (por defecto 2048)
+    SEGMENTADOR_PROCESOS_PESADOS   procesos pesados a la vez (por defecto según la RAM disponible)
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from segmentador.salida import tamano_resultado
+
+MB = 1024 * 1024
+CATEGORIAS = {'subidas': 'Archivos subidos', 'tablas': 'Tablas cargadas', 'resultados': 'Resultados'}
+
+
+def ram_disponible():
+    """Bytes de RAM disponibles según el sistema (None si no se puede saber)."""
+    try:
+        with open('/proc/meminfo') as f:
+            for linea in f:
+                if linea.startswith('MemAvailable:'):
+                    return int(linea.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def procesos_pesados_por_defecto(mb_por_proceso=None):
+    """Cuántos procesos pesados caben en la RAM disponible (al menos 1)."""
+    mb_por_proceso = mb_por_proceso or float(os.environ.get('SEGMENTADOR_MB_POR_PROCESO', 2048))
+    disponible = ram_disponible()
+    if disponible is None:
+        return 1
+    return max(1, int(disponible // (mb_por_proceso * MB)))
+
+
+class _Entrada:
+
+    def __init__(self, categoria, tamano, valor=None, ruta=None):
+        self.categoria = categoria
+        self.tamano = tamano
+        self.valor = valor
+        self.ruta = ruta
+
+
+class GobernadorMemoria:
+    """Uso de memoria por sesión, volcado a disco y semáforo de procesos pesados."""
+
+    def __init__(self, presupuesto_sesion, directorio, procesos_pesados=1, horas_inactividad=6):
+        self.presupuesto_sesion = presupuesto_sesion
+        self.directorio = directorio
+        self.procesos_pesados = procesos_pesados
+        self.horas_inactividad = horas_inactividad
+        # {sesion: {nombre: _Entrada}} y última actividad de cada sesión.
+        self._sesiones = {}
+        self._actividad = {}
+        self._lock = threading.Lock()
+        self._semaforo = threading.BoundedSemaphore(procesos_pesados)
+        self.en_curso = 0
+        self.en_espera = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    def _tocar(self, sesion):
+        self._actividad[sesion] = time.time()
+        return self._sesiones.setdefault(sesion, {})
+
+    def _soltar(self, entrada):
+        if entrada.ruta:
+            try:
+                os.remove(entrada.ruta)
+            except OSError:
+                pass
+
+    def registrar(self, sesion, nombre, categoria, tamano):
+        """Cuenta `tamano` bytes de la sesión bajo `nombre` (reemplaza lo anterior con ese nombre)."""
+        with self._lock:
+            entradas = self._tocar(sesion)
+            if nombre in entradas:
+                self._soltar(entradas.pop(nombre))
+            entradas[nombre] = _Entrada(categoria, tamano)
+            self._ajustar(sesion)
+
+    def guardar_resultado(self, sesion, nombre, resultado):
+        """
+        Registra un resultado para descargar y devuelve lo que se pasa a
+        `st.download_button`: el resultado mismo si cabe en el presupuesto, o
+        una función que lo lee del volcado en disco al hacer clic.
+        """
+        with self._lock:
+            entradas = self._tocar(sesion)
+            if nombre in entradas:
+                self._soltar(entradas.pop(nombre))
+            entradas[nombre] = entrada = _Entrada('resultados', tamano_resultado(resultado), valor=resultado)
+            self._ajustar(sesion)
+        return self.datos_descarga(entrada)
+
+    @staticmethod
+    def datos_descarga(entrada):
+        if entrada.ruta is None:
+            return entrada.valor
+        ruta = entrada.ruta
+
+        def leer():
+            with open(ruta, 'rb') as f:
+                return f.read()
+        return leer
+
+    def _ajustar(self, sesion):
+        """Vuelca a disco los resultados de la sesión, de mayor a menor, hasta entrar en el presupuesto."""
+        entradas = self._sesiones[sesion]
+        en_memoria = sum(e.tamano for e in entradas.values() if e.ruta is None)
+        candidatos = sorted((e for e in entradas.values() if e.categoria == 'resultados' and e.ruta is None),
+                            key=lambda e: e.tamano, reverse=True)
+        for entrada in candidatos:
+            if en_memoria <= self.presupuesto_sesion:
+                break
+            ruta = os.path.join(self.directorio, f"{uuid.uuid4().hex}.bin")
+            entrada.valor.seek(0)
+            with open(ruta, 'wb') as f:
+                shutil.copyfileobj(entrada.valor, f)
+            entrada.ruta, entrada.valor = ruta, None
+            en_memoria -= entrada.tamano
+
+    def liberar(self, sesion, nombre=None):
+        """Olvida una entrada de la sesión (o todas, sin `nombre`) y borra sus volcados."""
+        with self._lock:
+            entradas = self._sesiones.get(sesion, {})
+            for clave in [nombre] if nombre is not None else list(entradas):
+                if clave in entradas:
+                    self._soltar(entradas.pop(clave))
+            if not entradas:
+                self._sesiones.pop(sesion, None)
+                self._actividad.pop(sesion, None)
+
+    def recortar(self):
+        """Olvida las sesiones sin actividad desde hace más de `horas_inactividad`."""
+        limite = time.time() - self.horas_inactividad * 3600
+        for sesion in [s for s, t in list(self._actividad.items()) if t < limite]:
+            self.liberar(sesion)
+
+    def uso(self, sesion):
+        """{categoria: bytes en memoria}, más 'disco' con los bytes volcados."""
+        with self._lock:
+            uso = dict.fromkeys([*CATEGORIAS, 'disco'], 0)
+            for entrada in self._sesiones.get(sesion, {}).values():
+                uso['disco' if entrada.ruta else entrada.categoria] += entrada.tamano
+            return uso
+
+    def uso_total(self):
+        """(sesiones activas, bytes en memoria de todas, bytes en disco de todas)."""
+        with self._lock:
+            entradas = [e for sesion in self._sesiones.values() for e in sesion.values()]
+            return (len(self._sesiones), sum(e.tamano for e in entradas if e.ruta is None),
+                    sum(e.tamano for e in entradas if e.ruta))
+
+    def tomar_turno(self, esperar=True):
+        """
+        Ocupa un lugar entre los `procesos_pesados` simultáneos. Sin `esperar`
+        devuelve False en vez de esperar si no hay lugar (la cola de trabajos).
+        """
+        if esperar:
+            with self._lock:
+                self.en_espera += 1
+            try:
+                self._semaforo.acquire()
+            finally:
+                with self._lock:
+                    self.en_espera -= 1
+        elif not self._semaforo.acquire(blocking=False):
+            return False
+        with self._lock:
+            self.en_curso += 1
+        return True
+
+    def soltar_turno(self):
+        with self._lock:
+            self.en_curso -= 1
+        self._semaforo.release()
+
+    @contextmanager
+    def turno_pesado(self):
+        """Espera un lugar entre los `procesos_pesados` simultáneos y lo ocupa mientras dura el bloque."""
+        self.tomar_turno()
+        try:
+            yield
+        finally:
+            self.soltar_turno()
+
+
+_gobernador_global = None
+_lock_global = threading.Lock()
+
+
+def gobernador_global():
+    """Gobernador compartido por todas las sesiones del proceso de Streamlit."""
+    global _gobernador_global
+    with _lock_global:
+        if _gobernador_global is None:
+            pesados = os.environ.get('SEGMENTADOR_PROCESOS_PESADOS')
+            _gobernador_global = GobernadorMemoria(
+                presupuesto_sesion=float(os.environ.get('SEGMENTADOR_SESION_MB', 1024)) * MB,
+                directorio=os.environ.get('SEGMENTADOR_SESION_DIR', os.path.join(tempfile.gettempdir(), 'segmentador_sesiones')),
+                procesos_pesados=int(pesados) if pesados else procesos_pesados_por_defecto(),
+                horas_inactividad=float(os.environ.get('SEGMENTADOR_SESION_HORAS', 6)),
+            )
+        return _gobernador_global
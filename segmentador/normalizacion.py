@@ -0,0 +1,154 @@
+# segmentador/normalizacion.py
+"""
+Normalización vectorizada de nombres de agencia y limpieza de departamentos.
+
+Los nombres de agencia se repiten muchísimo (miles de filas, cientos de
+nombres distintos), así que todo se calcula una sola vez por valor distinto
+y luego se reparte a la Serie completa con `map`. Las operaciones de texto
+usan los métodos `.str` de pandas en lugar de `.apply` fila por fila.
+
+Dos variantes de "quitar el departamento del final del nombre", que
+reproducen exactamente lo que hacían las páginas:
+
+- `agencias_base` (Provincia Corte 2): el departamento debe ir precedido de
+  espacios y se compara sin distinguir mayúsculas. Usa UNA expresión regular
+  precompilada con todos los departamentos en alternancia, del más largo al
+  más corto.
+- `agencias_base_comparando_normalizado` (Provincia Corte 1): compara el
+  nombre normalizado con cada departamento normalizado y recorta el nombre
+  original por la longitud del departamento. Usa un trie de sufijos.
+
+La expresión regular y el trie se compilan una vez por lista de
+departamentos y se reutilizan entre ejecuciones del mismo proceso.
+"""
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+_CARACTERES_A_QUITAR = re.compile(r'[.,\-]')
+_ESPACIOS = re.compile(r'\s+')
+
+
+def normalizar_nombre(nombre):
+    """Convierte un nombre a un formato estándar: mayúsculas, sin puntos/comas/guiones y con espacios simples."""
+    if not isinstance(nombre, str): return ""
+    nombre_limpio = _CARACTERES_A_QUITAR.sub('', nombre.upper())
+    return _ESPACIOS.sub(' ', nombre_limpio).strip()
+
+
+def _por_valor_distinto(serie, transformar_distintos):
+    """
+    Aplica `transformar_distintos` (Serie de valores distintos -> lista de
+    resultados) una vez por valor distinto y expande el resultado a `serie`.
+    """
+    serie = pd.Series(serie)
+    codigos, distintos = pd.factorize(serie, use_na_sentinel=False)
+    resultados = np.empty(len(distintos), dtype=object)
+    resultados[:] = transformar_distintos(pd.Series(distintos, dtype=object))
+    return pd.Series(resultados[codigos], index=serie.index, name=serie.name)
+
+
+def _normalizar_distintos(distintos):
+    es_texto = distintos.map(lambda valor: isinstance(valor, str)).to_numpy(dtype=bool)
+    texto = distintos[es_texto].astype(object).str.upper()
+    texto = texto.str.replace(_CARACTERES_A_QUITAR, '', regex=True)
+    texto = texto.str.replace(_ESPACIOS, ' ', regex=True).str.strip()
+    resultado = pd.Series("", index=distintos.index, dtype=object)
+    resultado[es_texto] = texto
+    return resultado.tolist()
+
+
+def normalizar_nombres(serie):
+    """Versión vectorizada de `normalizar_nombre` para una Serie completa (los no-texto quedan en "")."""
+    return _por_valor_distinto(serie, _normalizar_distintos)
+
+
+def patron_departamentos(lista_departamentos):
+    """
+    Expresión regular que reconoce cualquiera de los departamentos al final del
+    nombre, precedido de espacios, sin distinguir mayúsculas. Las alternativas
+    van de la más larga a la más corta.
+    """
+    return _patron_compilado(tuple(sorted({str(depto) for depto in lista_departamentos}, key=len, reverse=True)))
+
+
+@lru_cache(maxsize=64)
+def _patron_compilado(deptos):
+    if not deptos:
+        return None
+    return re.compile(r'\s+(?:' + '|'.join(re.escape(depto) for depto in deptos) + r')$', flags=re.IGNORECASE)
+
+
+def agencias_base(serie, lista_departamentos):
+    """
+    Separa el nombre base de la agencia del departamento de forma robusta.
+    Ej: 'MI AGENCIA PIURA' -> 'MI AGENCIA'. Los valores que no son texto quedan en "".
+    """
+    patron = patron_departamentos(lista_departamentos)
+
+    def transformar(distintos):
+        es_texto = distintos.map(lambda valor: isinstance(valor, str)).to_numpy(dtype=bool)
+        texto = distintos[es_texto].astype(object)
+        if patron is not None:
+            texto = texto.str.replace(patron, '', n=1, regex=True)
+        resultado = pd.Series("", index=distintos.index, dtype=object)
+        resultado[es_texto] = texto.str.strip()
+        return resultado.tolist()
+
+    return _por_valor_distinto(serie, transformar)
+
+
+class TrieSufijos:
+    """
+    Trie de los departamentos normalizados, guardados al revés, para hallar
+    en una sola pasada por el final del nombre todos los departamentos que
+    son sufijo. Ante varios, gana el primero de `lista_departamentos`.
+    """
+
+    _FIN = object()
+
+    def __init__(self, lista_departamentos):
+        self.raiz = {}
+        for prioridad, depto in enumerate(lista_departamentos):
+            nodo = self.raiz
+            for caracter in reversed(normalizar_nombre(depto)):
+                nodo = nodo.setdefault(caracter, {})
+            nodo.setdefault(self._FIN, (prioridad, depto))
+
+    def departamento_sufijo(self, nombre_normalizado):
+        """Departamento (original) de mayor prioridad cuyo nombre normalizado es sufijo, o None."""
+        nodo, mejor = self.raiz, self.raiz.get(self._FIN)
+        for caracter in reversed(nombre_normalizado):
+            nodo = nodo.get(caracter)
+            if nodo is None: break
+            encontrado = nodo.get(self._FIN)
+            if encontrado is not None and (mejor is None or encontrado[0] < mejor[0]):
+                mejor = encontrado
+        return None if mejor is None else mejor[1]
+
+
+@lru_cache(maxsize=64)
+def _trie_compilado(lista_departamentos):
+    return TrieSufijos(lista_departamentos)
+
+
+def agencias_base_comparando_normalizado(serie, lista_departamentos):
+    """
+    Quita el departamento del final comparando nombres normalizados; el nombre
+    original se recorta por la longitud del departamento encontrado.
+    `lista_departamentos` debe venir ordenada por prioridad (la más larga primero).
+    """
+    trie = _trie_compilado(tuple(lista_departamentos))
+
+    def transformar(distintos):
+        resultados = []
+        for nombre_completo, nombre_norm in zip(distintos, _normalizar_distintos(distintos)):
+            if not isinstance(nombre_completo, str):
+                resultados.append("")
+                continue
+            depto = trie.departamento_sufijo(nombre_norm)
+            resultados.append(nombre_completo.strip() if depto is None else nombre_completo[:-len(depto)].strip())
+        return resultados
+
+    return _por_valor_distinto(serie, transformar)
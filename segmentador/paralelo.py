@@ -0,0 +1,59 @@
+# segmentador/paralelo.py
+"""
+Generación de los libros por agencia en serie o en un pool de procesos.
+
+Las tareas llegan como un iterable de `(nombre_archivo, argumentos)` y los
+resultados salen como `(nombre_archivo, bytes)` en el MISMO orden en que se
+generaron las tareas, sin importar qué trabajador termine primero. Así el ZIP
+y las líneas de ÉXITO/DESCUADRE del log (que se escriben al generar cada
+tarea) quedan idénticos a los de la ejecución en serie.
+
+Solo se envían a los trabajadores las porciones de cada agencia, y nunca hay
+más de `trabajadores * 2` tareas en vuelo, para que la memoria no crezca con
+el número de agencias.
+
+Los procesos (aquí, en `segmentador.lote` y en `segmentador.trabajos`) se
+crean con el contexto 'spawn': con fork heredarían los hilos del servidor de
+Streamlit.
+
+Variable de entorno:
+    SEGMENTADOR_TRABAJADORES  procesos por defecto (1 = en serie)
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+TRABAJADORES_POR_DEFECTO = int(os.environ.get('SEGMENTADOR_TRABAJADORES', 1))
+TAREAS_EN_VUELO_POR_TRABAJADOR = 2
+
+
+def trabajadores_disponibles():
+    return os.cpu_count() or 1
+
+
+def generar_libros(tareas, construir_libro, trabajadores=None):
+    """
+    Ejecuta `construir_libro(*argumentos)` por cada tarea y produce
+    `(nombre_archivo, bytes)` en orden. `construir_libro` debe ser una función
+    de módulo (por ejemplo las de `segmentador.libros`) para poder enviarse a
+    otro proceso.
+    """
+    trabajadores = TRABAJADORES_POR_DEFECTO if trabajadores is None else trabajadores
+    if trabajadores <= 1:
+        for nombre_archivo, argumentos in tareas:
+            yield nombre_archivo, construir_libro(*argumentos)
+        return
+
+    contexto = multiprocessing.get_context('spawn')
+    limite_en_vuelo = trabajadores * TAREAS_EN_VUELO_POR_TRABAJADOR
+    with ProcessPoolExecutor(max_workers=trabajadores, mp_context=contexto) as pool:
+        en_vuelo = deque()
+        for nombre_archivo, argumentos in tareas:
+            en_vuelo.append((nombre_archivo, pool.submit(construir_libro, *argumentos)))
+            if len(en_vuelo) >= limite_en_vuelo:
+                nombre_listo, futuro = en_vuelo.popleft()
+                yield nombre_listo, futuro.result()
+        while en_vuelo:
+            nombre_listo, futuro = en_vuelo.popleft()
+            yield nombre_listo, futuro.result()
@@ -0,0 +1,91 @@
+# segmentador/particion.py
+"""
+Particionado de una sola pasada por agencia.
+
+En lugar de filtrar todo el DataFrame con una máscara booleana por cada
+agencia (agencias × filas comparaciones), se agrupa una única vez por la
+columna clave y se guardan las posiciones de cada grupo. Obtener la porción
+de una agencia es entonces una búsqueda en un diccionario más un `take`.
+
+Los alias (varios nombres de ASESOR que pertenecen a una misma agencia) se
+resuelven remapeando las claves al nombre canónico ANTES de agrupar. Pueden
+venir como diccionario {canónico: [nombres]} o como la `ResolucionAlias` del
+registro de agencias (ver `registro.py`), que se consulta una vez por valor
+distinto.
+
+También se puede agrupar por varias claves a la vez (por ejemplo ZONA y
+agencia); las porciones se buscan entonces con una tupla.
+"""
+import numpy as np
+import pandas as pd
+
+
+def invertir_alias(mapeo_alias):
+    """{canónico: [nombres]} -> {nombre: canónico}."""
+    return {nombre: canonico for canonico, nombres in mapeo_alias.items() for nombre in nombres}
+
+
+def aplicar_alias(serie, mapeo_alias):
+    """`serie` con cada nombre alias reemplazado por su nombre canónico."""
+    if not mapeo_alias:
+        return serie
+    es_categoria = isinstance(serie.dtype, pd.CategoricalDtype)
+    if hasattr(mapeo_alias, 'alias_a_canonico'):
+        alias_a_canonico = mapeo_alias.alias_a_canonico(serie.cat.categories if es_categoria else serie.dropna().unique())
+    else:
+        alias_a_canonico = invertir_alias(mapeo_alias)
+    if es_categoria:
+        # Se remapean las categorías (pocas) y se expanden con los códigos.
+        nombres = [alias_a_canonico.get(c, c) for c in serie.cat.categories] + [None]
+        return pd.Series(np.array(nombres, dtype=object)[serie.cat.codes.to_numpy()], index=serie.index)
+    canonicos = serie.map(alias_a_canonico)
+    return canonicos.where(canonicos.notna(), serie)
+
+
+class Particion:
+    """Porciones de un DataFrame indexadas por clave, con búsqueda O(1)."""
+
+    def __init__(self, df, posiciones):
+        self._df = df
+        self._posiciones = posiciones
+
+    def __contains__(self, clave):
+        return clave in self._posiciones
+
+    def __len__(self):
+        return len(self._posiciones)
+
+    def claves(self):
+        """Claves en el orden en que aparecen por primera vez en los datos."""
+        return list(self._posiciones)
+
+    def filas(self, clave):
+        return len(self._posiciones.get(clave, ()))
+
+    def obtener(self, clave):
+        """
+        Filas de la clave, en su orden original. Si la clave no existe se
+        devuelve un DataFrame vacío con las mismas columnas.
+        """
+        posiciones = self._posiciones.get(clave)
+        if posiciones is None:
+            return self._df.iloc[0:0]
+        return self._df.take(posiciones)
+
+
+def particionar(df, claves, mapeo_alias=None):
+    """
+    Agrupa `df` en una sola pasada.
+
+    `claves` es el nombre de una columna de `df` o una Serie alineada con él
+    (por ejemplo los nombres ya normalizados), o una lista de ellas para
+    agrupar por varias claves. Las filas con alguna clave nula no pertenecen
+    a ninguna porción. `mapeo_alias` ({nombre_canónico: [nombres_alias]} o
+    una `ResolucionAlias`) se aplica a la última clave.
+    """
+    lista = list(claves) if isinstance(claves, (list, tuple)) else [claves]
+    series = [df[clave] if not isinstance(clave, pd.Series) else clave for clave in lista]
+    series[-1] = aplicar_alias(series[-1], mapeo_alias)
+    valores = [serie.to_numpy() for serie in series]
+    posiciones = series[0].groupby(valores if len(valores) > 1 else valores[0], sort=False).indices
+    return Particion(df, posiciones)
@@ -0,0 +1,241 @@
+# segmentador/perfil.py
+"""
+Perfil de una ejecución: tiempo, filas y memoria por etapa y por agencia.
+
+Los cuatro `procesar_*` registran sus etapas (lectura, preparación,
+particionado, libros y ZIP) en un `PerfilEjecucion`. Por agencia se mide por
+separado el tiempo de generar el libro (xlsxwriter) y el de escribirlo en el
+ZIP (compresión). Las páginas muestran la tabla de etapas y las agencias más
+lentas; la CLI y la página exportan el perfil como JSON para compararlo entre
+ejecuciones.
+
+Cada agencia terminada emite además un evento de avance (agencia, filas,
+estado de la conciliación, tiempos y ETA) a las funciones suscritas con
+`escuchar`: la barra de progreso de las páginas, la salida de la CLI con
+`--progreso` y el progreso de los trabajos en segundo plano. Los procesos
+anotan la conciliación de cada agencia con `anotar_agencia`, que devuelve la
+misma línea ÉXITO/DESCUADRE que va al log.
+
+La memoria es la del proceso principal: RSS al terminar cada etapa y pico
+de RSS durante la etapa, muestreado en un hilo cada `INTERVALO_MUESTREO`
+segundos (un pico más corto que el intervalo puede no verse). No se usa el
+pico de `getrusage`, que es el de toda la vida del proceso: en el servidor
+de Streamlit sería el de la ejecución más grande desde que arrancó. Con
+trabajadores en paralelo no incluye la de los procesos del pool.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MB = 1024 * 1024
+INTERVALO_MUESTREO = 0.05
+
+
+def memoria_actual_mb():
+    """RSS actual del proceso en MB, o None si no se puede medir en esta plataforma."""
+    try:
+        with open('/proc/self/statm') as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf('SC_PAGE_SIZE') / MB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def memoria_pico_mb():
+    """
+    Pico de RSS del proceso desde que arrancó, en MB (None si no se puede
+    medir). Para el pico de una etapa ver `_PicoDeEtapa`.
+    """
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo informa en KB y macOS en bytes.
+    return pico / MB if sys.platform == 'darwin' else pico / 1024
+
+
+class _PicoDeEtapa:
+    """Muestrea el RSS en un hilo desde que se crea hasta `detener` y guarda el máximo."""
+
+    def __init__(self):
+        self.pico = memoria_actual_mb()
+        self._fin = threading.Event()
+        self._hilo = None
+        if self.pico is not None:
+            self._hilo = threading.Thread(target=self._muestrear, name='segmentador-memoria', daemon=True)
+            self._hilo.start()
+
+    def _muestrear(self):
+        while not self._fin.wait(INTERVALO_MUESTREO):
+            self._anotar(memoria_actual_mb())
+
+    def _anotar(self, valor):
+        if valor is not None and valor > self.pico:
+            self.pico = valor
+
+    def detener(self):
+        """Termina el muestreo y devuelve el pico en MB (None si no se puede medir)."""
+        self._fin.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._anotar(memoria_actual_mb())
+        return self.pico
+
+
+def linea_avance(evento):
+    """Una línea de texto por evento de avance (CLI)."""
+    total = '?' if evento['total'] is None else evento['total']
+    eta = '' if evento['eta'] is None else f" | ETA: {evento['eta']:.0f} s"
+    return (f"AVANCE   | {evento['indice']}/{total} | {evento['agencia']:<40} | {evento['estado'] or '-'} | "
+            f"filas: {evento['filas']} | {evento['segundos']:.2f} s{eta}")
+
+
+def _redondear(valor, decimales=2):
+    return None if valor is None else round(valor, decimales)
+
+
+class PerfilEjecucion:
+    """
+    Uso:
+        perfil = PerfilEjecucion('lima')
+        perfil.iniciar_etapa('Lectura del libro')
+        ...
+        perfil.iniciar_etapa('Particionado', filas=1234)  # cierra la etapa anterior
+        ...
+        perfil.cerrar_etapa()
+        perfil.registrar_agencia('Reporte X.xlsx', 0.12, 0.03, 56)
+
+    Avance por agencia:
+        perfil = PerfilEjecucion('lima', al_avanzar=print)
+        perfil.anunciar_agencias(120)
+        linea = perfil.anotar_agencia('Reporte X.xlsx', 'X', conciliacion)
+        perfil.registrar_agencia('Reporte X.xlsx', ...)  # llama a print(evento)
+    """
+
+    def __init__(self, pagina='', al_avanzar=None):
+        self.pagina = pagina
+        self.inicio = datetime.now()
+        self._t0 = time.perf_counter()
+        self.etapas = []
+        self.agencias = []
+        self.datos = {}
+        self._abierta = None
+        self.total_agencias = None
+        self.ultimo_evento = None
+        self._t_agencias = None
+        self._anotadas = {}
+        self._oyentes = [al_avanzar] if al_avanzar is not None else []
+
+    def escuchar(self, al_avanzar):
+        """Suscribe `al_avanzar(evento)` al avance por agencia (ver `registrar_agencia`)."""
+        self._oyentes.append(al_avanzar)
+
+    def anunciar_agencias(self, total):
+        """Suma `total` agencias por generar (para el avance y la ETA); el reloj de la ETA arranca en la primera llamada."""
+        if self._t_agencias is None:
+            self._t_agencias = time.perf_counter()
+        self.total_agencias = (self.total_agencias or 0) + total
+
+    def anotar_agencia(self, archivo, agencia, conciliacion):
+        """
+        Guarda la conciliación de `agencia` para el evento de su libro `archivo`
+        y devuelve su línea de log (ÉXITO / DESCUADRE / INFO / Error).
+        """
+        fila = conciliacion.fila(agencia)
+        linea = conciliacion.linea_log(agencia)
+        self._anotadas[archivo] = {'agencia': agencia, 'estado': None if fila is None else fila['ESTADO'],
+                                   'altas': None if fila is None else fila['ALTAS'],
+                                   'registros_base': None if fila is None else fila['REGISTROS_BASE'], 'linea': linea}
+        return linea
+
+    def iniciar_etapa(self, nombre, filas=None):
+        """Cierra la etapa en curso (si hay) y empieza `nombre`."""
+        self.cerrar_etapa()
+        self._abierta = ({'etapa': nombre, 'segundos': None, 'filas': filas,
+                          'memoria_mb': None, 'pico_mb': None}, time.perf_counter(), _PicoDeEtapa())
+
+    def cerrar_etapa(self, filas=None):
+        if self._abierta is None:
+            return
+        registro, t0, pico = self._abierta
+        self._abierta = None
+        registro['segundos'] = time.perf_counter() - t0
+        if filas is not None:
+            registro['filas'] = filas
+        registro['pico_mb'] = pico.detener()
+        registro['memoria_mb'] = memoria_actual_mb()
+        self.etapas.append(registro)
+
+    def registrar_agencia(self, archivo, segundos_libro, segundos_zip, filas=None):
+        """Registra el libro terminado y emite su evento de avance a los suscritos."""
+        self.agencias.append({'archivo': archivo, 'segundos_libro': segundos_libro,
+                              'segundos_zip': segundos_zip, 'filas': filas})
+        hechas = len(self.agencias)
+        transcurrido = time.perf_counter() - (self._t0 if self._t_agencias is None else self._t_agencias)
+        total = None if self.total_agencias is None else max(self.total_agencias, hechas)
+        anotada = self._anotadas.pop(archivo, None) or {'agencia': archivo, 'estado': None, 'altas': None,
+                                                         'registros_base': None, 'linea': None}
+        self.ultimo_evento = {'indice': hechas, 'total': total, 'archivo': archivo, **anotada, 'filas': filas,
+                              'segundos': segundos_libro + segundos_zip, 'transcurrido': transcurrido,
+                              'eta': None if total is None else transcurrido / hechas * (total - hechas)}
+        for al_avanzar in self._oyentes:
+            al_avanzar(self.ultimo_evento)
+
+    def fraccion_avance(self):
+        """Fracción de agencias terminadas (0 a 1), o None si no se anunció el total."""
+        if not self.total_agencias:
+            return None
+        return min(len(self.agencias) / self.total_agencias, 1.0)
+
+    def total_segundos(self):
+        return time.perf_counter() - self._t0
+
+    def tabla_etapas(self):
+        """Etapas en orden, con el desglose libros/compresión de la generación."""
+        self.cerrar_etapa()
+        filas = [dict(r) for r in self.etapas]
+        if self.agencias:
+            filas.append({'etapa': '  · libros (xlsxwriter)', 'segundos': sum(a['segundos_libro'] for a in self.agencias),
+                          'filas': sum(a['filas'] or 0 for a in self.agencias), 'memoria_mb': None, 'pico_mb': None})
+            filas.append({'etapa': '  · escritura en el ZIP', 'segundos': sum(a['segundos_zip'] for a in self.agencias),
+                          'filas': None, 'memoria_mb': None, 'pico_mb': None})
+        tabla = pd.DataFrame(filas, columns=['etapa', 'segundos', 'filas', 'memoria_mb', 'pico_mb'])
+        return tabla.round({'segundos': 3, 'memoria_mb': 1, 'pico_mb': 1})
+
+    def agencias_mas_lentas(self, n=10):
+        tabla = pd.DataFrame(self.agencias, columns=['archivo', 'segundos_libro', 'segundos_zip', 'filas'])
+        tabla['segundos_total'] = tabla['segundos_libro'] + tabla['segundos_zip']
+        return tabla.nlargest(n, 'segundos_total').round(3).reset_index(drop=True)
+
+    def resumen_log(self, n=5):
+        """Líneas de log con las etapas y las agencias más lentas."""
+        lineas = [f"TIEMPO   | {r['etapa']}: {r['segundos']:.2f} s" for r in self.tabla_etapas().to_dict('records')]
+        for r in self.agencias_mas_lentas(n).to_dict('records'):
+            lineas.append(f"LENTA    | {r['archivo']:<40} | {r['segundos_total']:.2f} s | filas: {r['filas']}")
+        lineas.append(f"TIEMPO   | Total: {self.total_segundos():.2f} s")
+        return lineas
+
+    def a_dict(self):
+        self.cerrar_etapa()
+        return {
+            'pagina': self.pagina,
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'total_segundos': _redondear(self.total_segundos(), 3),
+            'datos': self.datos,
+            'etapas': [{**r, 'segundos': _redondear(r['segundos'], 4), 'memoria_mb': _redondear(r['memoria_mb'], 1),
+                        'pico_mb': _redondear(r['pico_mb'], 1)} for r in self.etapas],
+            'agencias': [{**a, 'segundos_libro': _redondear(a['segundos_libro'], 4), 'segundos_zip': _redondear(a['segundos_zip'], 4)}
+                         for a in self.agencias],
+        }
+
+    def a_json(self):
+        return json.dumps(self.a_dict(), ensure_ascii=False, indent=2, default=str)
@@ -0,0 +1,322 @@
+# segmentador/provincia.py
+"""
+Segmentación de Provincia Corte 1: un libro por agencia base (nombre sin el
+departamento), para una zona o para todas las zonas del archivo en una sola
+pasada (un ZIP con una carpeta por zona).
+"""
+import pandas as pd
+from segmentador.cabeceras import cabeceras_validas
+from segmentador.cache import cargar_libro_con_cache
+from segmentador.conciliacion import DESCUADRE, OK, conciliar, unir
+from segmentador.esquemas import CABECERAS_PROVINCIA, HOJAS_PROVINCIA
+from segmentador.incremental import SegmentacionIncremental
+from segmentador.particion import particionar
+from segmentador.registro import registro_global
+from segmentador.normalizacion import agencias_base_comparando_normalizado, normalizar_nombres
+from segmentador.libros import libro_provincia
+from segmentador.perfil import PerfilEjecucion
+from segmentador.salida import abrir_salida, escribir_libros
+
+
+def cargar_libro_provincia(archivo_excel_cargado):
+    """
+    Lee una sola vez las dos hojas que usa la página (como texto, con las
+    columnas de cruce como categorías). El resultado queda en el cache por
+    contenido, así los reruns no releen el archivo.
+    """
+    return cargar_libro_con_cache(archivo_excel_cargado, HOJAS_PROVINCIA)
+
+
+# Qué nombres de asesor en la BASE corresponden a una misma agencia se define en
+# el registro de agencias (`registro_agencias.json`, ver `registro.py`), compartido
+# con las demás páginas. Aquí se aplica sobre los nombres ya normalizados.
+
+
+def _validar_libro(libro, log_output):
+    cabeceras_reporte = ['AGENCIA', 'RUC', 'ALTAS']
+    if not libro.validar_cabeceras('Reporte CORTE 1', cabeceras_reporte):
+        log_output.append("ALERTA: Cabeceras esperadas no encontradas en la hoja 'Reporte CORTE 1'.")
+        return False
+    cabeceras_base = ['COD_PEDIDO', 'ASESOR', 'ZONA', 'DEPARTAMENTO']
+    if not libro.validar_cabeceras('BASE', cabeceras_base):
+        log_output.append("ALERTA: Cabeceras esperadas no encontradas en la hoja 'BASE'.")
+        return False
+    log_output.append("Validación de cabeceras exitosa.")
+    log_output.extend(libro.resumen_tiempos())
+    return True
+
+
+def _hojas_normalizadas(libro):
+    df_reporte_total = libro.hoja('Reporte CORTE 1')
+    df_base_total = libro.hoja('BASE')
+    df_reporte_total.columns = df_reporte_total.columns.str.strip().str.upper()
+    df_base_total.columns = df_base_total.columns.str.strip().str.upper()
+    return df_reporte_total, df_base_total
+
+
+def _columnas_base(columnas_base_original):
+    """Columnas de la BASE que se exportan: hasta 'RECIBO1_PAGADO', más 'ZONA'."""
+    indice_final = columnas_base_original.index('RECIBO1_PAGADO')
+    columnas_a_mantener_en_base = columnas_base_original[:indice_final + 1]
+    if 'ZONA' not in columnas_a_mantener_en_base: columnas_a_mantener_en_base.append('ZONA')
+    return columnas_a_mantener_en_base
+
+
+def _reporte_de_zona(df_reporte_total, departamentos, agencias_de_la_zona):
+    """
+    Filas del reporte cuyas agencias (sin el departamento y normalizadas)
+    tienen registros en la BASE de la zona.
+    """
+    lista_departamentos = registro_global().con_departamentos([d for d in departamentos if pd.notna(d)])
+    lista_departamentos.sort(key=len, reverse=True)
+    df_reporte = df_reporte_total.copy()
+    # Normalización vectorizada: se calcula una vez por nombre distinto, no por fila.
+    df_reporte['AGENCIA_BASE'] = agencias_base_comparando_normalizado(df_reporte['AGENCIA'], lista_departamentos)
+    df_reporte['AGENCIA_BASE_NORMALIZADA'] = normalizar_nombres(df_reporte['AGENCIA_BASE'])
+    return df_reporte[df_reporte['AGENCIA_BASE_NORMALIZADA'].isin(agencias_de_la_zona)].copy()
+
+
+def _conciliar_zona(reporte_zona, asesores_de_la_zona):
+    """ALTAS (sumadas por agencia base) contra los registros de la BASE de la zona."""
+    return conciliar(reporte_zona['AGENCIA_BASE_NORMALIZADA'], reporte_zona['ALTAS'], asesores_de_la_zona,
+                     registro_global().alias(), agregacion='suma', entero=False)
+
+
+def _tareas_por_agencia(agencias_base_a_procesar, reporte_por_agencia, obtener_base, conciliacion, log_output, perfil, resumen=None,
+                        carpeta=''):
+    """
+    Cada tarea anota la conciliación de la agencia en el log (que conserva el
+    orden) y en el `perfil` para su evento de avance, y entrega solo sus
+    porciones para generar el libro, en serie o en paralelo. Si se pasa
+    `resumen`, acumula ahí los totales de la validación.
+    """
+    perfil.anunciar_agencias(len(agencias_base_a_procesar))
+    for agencia_base_norm in agencias_base_a_procesar:
+        reporte_agencia = reporte_por_agencia.obtener(agencia_base_norm)
+        base_agencia_final = obtener_base(agencia_base_norm)
+
+        nombre_original_agencia = pd.Series(reporte_agencia['AGENCIA_BASE']).iloc[0]
+        nombre_archivo = f"{carpeta}Reporte {nombre_original_agencia.strip()}.xlsx"
+        log_output.append(perfil.anotar_agencia(nombre_archivo, agencia_base_norm, conciliacion))
+        fila = conciliacion.fila(agencia_base_norm)
+        if resumen is not None and fila['ESTADO'] in (OK, DESCUADRE):
+            resumen['agencias'] += 1
+            resumen['exitos' if fila['ESTADO'] == OK else 'descuadres'] += 1
+            resumen['altas'] += fila['ALTAS']
+            resumen['registros_base'] += fila['REGISTROS_BASE']
+
+        # Corrección final: guardar el resultado de drop en una variable intermedia
+        reporte_agencia_final = pd.DataFrame(reporte_agencia).drop(columns=['AGENCIA_BASE', 'AGENCIA_BASE_NORMALIZADA'], errors='ignore')
+        yield nombre_archivo, (reporte_agencia_final, base_agencia_final)
+
+
+def procesar_reportes_provincia(archivo_excel_cargado, zona_seleccionada, libro=None, trabajadores=None, perfil=None, compresion=None, incremental=False,
+                                solo_validar=False):
+    """Con `solo_validar` no se generan libros: devuelve `(Conciliacion, log_output)`."""
+    perfil = PerfilEjecucion('provincia') if perfil is None else perfil
+    log_output = []
+    log_output.append(f"--- INICIO DEL PROCESO PARA ZONA: {zona_seleccionada} ---")
+
+    # El libro puede venir ya cargado desde la UI (se usó para detectar las zonas).
+    perfil.iniciar_etapa('Lectura del libro')
+    if libro is None:
+        if not cabeceras_validas(archivo_excel_cargado, CABECERAS_PROVINCIA, log_output):
+            return None, log_output
+        try:
+            libro = cargar_libro_provincia(archivo_excel_cargado)
+        except Exception as e:
+            log_output.append(f"ERROR: No se pudo leer o filtrar el archivo Excel. Error: {e}")
+            return None, log_output
+
+    perfil.cerrar_etapa(filas=sum(libro.filas.values()))
+    perfil.iniciar_etapa('Validación, filtro por zona y normalización')
+    if not _validar_libro(libro, log_output):
+        return None, log_output
+
+    try:
+        df_reporte_total, df_base_total = _hojas_normalizadas(libro)
+        base_filtrada_por_zona = df_base_total[df_base_total['ZONA'].str.strip().str.upper() == zona_seleccionada.upper()]
+        if base_filtrada_por_zona.empty:
+            log_output.append(f"ALERTA: No se encontraron registros en la hoja 'BASE' para la zona '{zona_seleccionada}'.")
+            return None, log_output
+        
+        asesores_normalizados = normalizar_nombres(base_filtrada_por_zona['ASESOR'])
+        agencias_de_la_zona = asesores_normalizados.dropna().unique().tolist()
+        departamentos = pd.Series(base_filtrada_por_zona['DEPARTAMENTO']).dropna().unique().tolist()
+        reporte_filtrado_por_zona = _reporte_de_zona(df_reporte_total, departamentos, agencias_de_la_zona)
+        if reporte_filtrado_por_zona.empty:
+            log_output.append(f"ALERTA: No se encontraron datos en la hoja 'Reporte CORTE 1' para las agencias de la zona '{zona_seleccionada}'.")
+            return None, log_output
+    except Exception as e:
+        log_output.append(f"ERROR: No se pudo leer o filtrar el archivo Excel. Error: {e}")
+        return None, log_output
+
+    reporte_filtrado_por_zona['ALTAS'] = pd.to_numeric(reporte_filtrado_por_zona['ALTAS'])
+
+    # ALTAS contra la BASE de la zona, para todas las agencias de una vez.
+    perfil.iniciar_etapa('Conciliación', filas=len(base_filtrada_por_zona))
+    conciliacion = _conciliar_zona(reporte_filtrado_por_zona, asesores_normalizados)
+    if solo_validar:
+        log_output.extend(conciliacion.lineas_log())
+        log_output.extend(conciliacion.resumen_log())
+        perfil.cerrar_etapa()
+        log_output.append("--- FIN DE LA VALIDACIÓN ---")
+        return conciliacion, log_output
+
+    try:
+        columnas_a_mantener_en_base = _columnas_base(list(base_filtrada_por_zona.columns))
+    except ValueError as e:
+        log_output.append(f"ERROR: No se encontró una columna esencial como 'RECIBO1_PAGADO'. Error: {e}")
+        return None, log_output
+        
+    agencias_base_a_procesar = pd.Series(reporte_filtrado_por_zona['AGENCIA_BASE_NORMALIZADA']).dropna().unique().tolist()
+    log_output.append(f"Se van a generar reportes para {len(agencias_base_a_procesar)} agencias base (normalizadas).")
+
+    # ==============================================================================
+    # === PARTICIONADO: una sola agrupación por hoja en vez de un filtro por agencia ===
+    # El mapa de alias se aplica al agrupar la BASE: los nombres alias quedan
+    # en la porción de su agencia canónica.
+    # ==============================================================================
+    perfil.iniciar_etapa('Particionado', filas=len(base_filtrada_por_zona))
+    reporte_por_agencia = particionar(reporte_filtrado_por_zona, 'AGENCIA_BASE_NORMALIZADA')
+    base_por_agencia = particionar(base_filtrada_por_zona[columnas_a_mantener_en_base],
+                                   asesores_normalizados, registro_global().alias())
+
+    segmentacion = SegmentacionIncremental(f"provincia|{zona_seleccionada}") if incremental else None
+
+    with abrir_salida(compresion) as salida:
+        perfil.iniciar_etapa('Libros y ZIP')
+        tareas = _tareas_por_agencia(agencias_base_a_procesar, reporte_por_agencia, base_por_agencia.obtener, conciliacion, log_output, perfil)
+        escribir_libros(salida, tareas, libro_provincia, trabajadores, perfil, segmentacion)
+    perfil.cerrar_etapa()
+    perfil.datos.update(zona=zona_seleccionada, agencias=len(perfil.agencias), trabajadores=trabajadores, motor=libro.motor, zip_bytes=salida.tamano(), compresion=salida.compresion)
+    log_output.extend(conciliacion.resumen_log())
+    log_output.append(salida.resumen())
+    if segmentacion is not None:
+        log_output.extend(segmentacion.resumen_log())
+        segmentacion.guardar_manifiesto()
+    log_output.extend(perfil.resumen_log())
+            
+    log_output.append("--- FIN DEL PROCESO ---")
+    return salida.para_descarga(), log_output
+
+
+def procesar_todas_las_zonas(archivo_excel_cargado, libro=None, trabajadores=None, perfil=None, compresion=None, incremental=False,
+                             solo_validar=False):
+    """
+    Procesa todas las zonas de la BASE en una sola pasada: el libro se lee una
+    vez, los asesores se normalizan una vez y la BASE se agrupa una sola vez por
+    (ZONA, agencia). Devuelve un único ZIP con una carpeta por zona; el log
+    termina con un resumen por zona. Con `solo_validar` no se generan libros:
+    devuelve `(Conciliacion, log_output)`, con una columna ZONA.
+    """
+    perfil = PerfilEjecucion('provincia_todas_las_zonas') if perfil is None else perfil
+    log_output = []
+    log_output.append("--- INICIO DEL PROCESO PARA TODAS LAS ZONAS ---")
+
+    perfil.iniciar_etapa('Lectura del libro')
+    if libro is None:
+        if not cabeceras_validas(archivo_excel_cargado, CABECERAS_PROVINCIA, log_output):
+            return None, log_output
+        try:
+            libro = cargar_libro_provincia(archivo_excel_cargado)
+        except Exception as e:
+            log_output.append(f"ERROR: No se pudo leer o filtrar el archivo Excel. Error: {e}")
+            return None, log_output
+
+    perfil.cerrar_etapa(filas=sum(libro.filas.values()))
+    perfil.iniciar_etapa('Validación y normalización')
+    if not _validar_libro(libro, log_output):
+        return None, log_output
+
+    try:
+        df_reporte_total, df_base_total = _hojas_normalizadas(libro)
+        zona_de_fila = df_base_total['ZONA'].str.strip().str.upper()
+        # Una zona por valor normalizado ('Sur', 'SUR ' y 'SUR' son la misma), con su primera escritura en la BASE.
+        zonas = [zona for zona in df_base_total['ZONA'].str.strip().groupby(zona_de_fila.to_numpy(), sort=False).first() if zona]
+        asesores_normalizados = normalizar_nombres(df_base_total['ASESOR'])
+        columnas_a_mantener_en_base = _columnas_base(list(df_base_total.columns))
+    except ValueError as e:
+        log_output.append(f"ERROR: No se encontró una columna esencial como 'RECIBO1_PAGADO'. Error: {e}")
+        return None, log_output
+    except Exception as e:
+        log_output.append(f"ERROR: No se pudo leer o filtrar el archivo Excel. Error: {e}")
+        return None, log_output
+    log_output.append(f"Zonas detectadas: {', '.join(zonas)}")
+
+    perfil.iniciar_etapa('Particionado por zona y agencia', filas=len(df_base_total))
+    # Departamentos y asesores de cada zona, en el orden en que aparecen (igual que al procesar una zona).
+    por_zona = pd.DataFrame({'DEPARTAMENTO': df_base_total['DEPARTAMENTO'], 'ASESOR_NORMALIZADO': asesores_normalizados})
+    por_zona = por_zona.groupby(zona_de_fila.to_numpy(), sort=False)
+    departamentos_por_zona = por_zona['DEPARTAMENTO'].unique()
+    agencias_por_zona = por_zona['ASESOR_NORMALIZADO'].unique()
+
+    resumenes = []
+
+    def zonas_conciliadas():
+        """(zona, reporte de la zona, agencias base, conciliación) de cada zona con datos."""
+        for zona in zonas:
+            clave_zona = zona.upper()
+            log_output.append(f"--- ZONA: {zona} ---")
+            if clave_zona not in departamentos_por_zona.index:
+                log_output.append(f"ALERTA: No se encontraron registros en la hoja 'BASE' para la zona '{zona}'.")
+                continue
+            agencias_de_la_zona = [a for a in agencias_por_zona[clave_zona] if pd.notna(a)]
+            reporte_zona = _reporte_de_zona(df_reporte_total, list(departamentos_por_zona[clave_zona]), agencias_de_la_zona)
+            if reporte_zona.empty:
+                log_output.append(f"ALERTA: No se encontraron datos en la hoja 'Reporte CORTE 1' para las agencias de la zona '{zona}'.")
+                continue
+            reporte_zona['ALTAS'] = pd.to_numeric(reporte_zona['ALTAS'])
+            agencias_base_a_procesar = pd.Series(reporte_zona['AGENCIA_BASE_NORMALIZADA']).dropna().unique().tolist()
+            log_output.append(f"Se van a generar reportes para {len(agencias_base_a_procesar)} agencias base (normalizadas).")
+            conciliacion = _conciliar_zona(reporte_zona, asesores_normalizados[(zona_de_fila == clave_zona).to_numpy()])
+            yield zona, reporte_zona, agencias_base_a_procesar, conciliacion
+
+    if solo_validar:
+        perfil.iniciar_etapa('Conciliación', filas=len(df_base_total))
+        por_zona = []
+        for zona, _, _, conciliacion in zonas_conciliadas():
+            log_output.extend(conciliacion.lineas_log())
+            log_output.extend(conciliacion.resumen_log())
+            por_zona.append((zona, conciliacion))
+        perfil.cerrar_etapa()
+        log_output.append("--- FIN DE LA VALIDACIÓN ---")
+        return unir(por_zona), log_output
+
+    # Una sola agrupación de la BASE por (ZONA, agencia canónica).
+    base_por_zona_y_agencia = particionar(df_base_total[columnas_a_mantener_en_base],
+                                          [zona_de_fila, asesores_normalizados], registro_global().alias())
+
+    def tareas_por_zona():
+        for zona, reporte_zona, agencias_base_a_procesar, conciliacion in zonas_conciliadas():
+            clave_zona = zona.upper()
+            resumen = {'zona': zona, 'agencias': 0, 'exitos': 0, 'descuadres': 0, 'altas': 0, 'registros_base': 0}
+            yield from _tareas_por_agencia(agencias_base_a_procesar, particionar(reporte_zona, 'AGENCIA_BASE_NORMALIZADA'),
+                                           lambda agencia: base_por_zona_y_agencia.obtener((clave_zona, agencia)),
+                                           conciliacion, log_output, perfil, resumen, carpeta=f"{zona.strip()}/")
+            log_output.extend(conciliacion.resumen_log())
+            resumenes.append(resumen)
+
+    segmentacion = SegmentacionIncremental('provincia_todas_las_zonas') if incremental else None
+
+    with abrir_salida(compresion) as salida:
+        perfil.iniciar_etapa('Libros y ZIP')
+        escribir_libros(salida, tareas_por_zona(), libro_provincia, trabajadores, perfil, segmentacion)
+    perfil.cerrar_etapa()
+    perfil.datos.update(zonas=len(resumenes), agencias=len(perfil.agencias), trabajadores=trabajadores, motor=libro.motor, zip_bytes=salida.tamano(), compresion=salida.compresion)
+
+    if not resumenes:
+        log_output.append("ALERTA: No se generaron reportes para ninguna zona.")
+        return None, log_output
+    log_output.append("--- RESUMEN POR ZONA ---")
+    for r in resumenes:
+        estado = "OK" if r['descuadres'] == 0 else "REVISAR"
+        log_output.append(f"RESUMEN  | {r['zona']:<40} | Agencias: {r['agencias']:<5} | ÉXITO: {r['exitos']:<5} | DESCUADRE: {r['descuadres']:<5} | "
+                          f"ALTAS: {r['altas']:<7} | Registros BASE: {r['registros_base']:<7} | {estado}")
+    log_output.append(salida.resumen())
+    if segmentacion is not None:
+        log_output.extend(segmentacion.resumen_log())
+        segmentacion.guardar_manifiesto()
+    log_output.extend(perfil.resumen_log())
+    log_output.append("--- FIN DEL PROCESO ---")
+    return salida.para_descarga(), log_output
@@ -0,0 +1,176 @@
+# segmentador/provincia_corte_2.py
+"""
+Segmentación de Provincia Corte 2: cabecera de dos filas, nombres con
+departamento y mapa de alias de ASESOR.
+"""
+import pandas as pd
+from segmentador.cabeceras import cabeceras_validas
+from segmentador.cache import cargar_libro_con_cache
+from segmentador.conciliacion import conciliar
+from segmentador.corte_2 import PlanCorte2
+from segmentador.esquemas import CABECERAS_PROVINCIA_CORTE_2, HOJAS_CORTE_2
+from segmentador.incremental import SegmentacionIncremental
+from segmentador.particion import particionar
+from segmentador.normalizacion import agencias_base, normalizar_nombres
+from segmentador.registro import registro_global
+from segmentador.libros import libro_corte_2
+from segmentador.perfil import PerfilEjecucion
+from segmentador.salida import abrir_salida, escribir_libros
+from segmentador.volcado import volcar_base
+
+
+def procesar_provincia_corte_2(archivo_excel_cargado, trabajadores=None, perfil=None, compresion=None, incremental=False, solo_validar=False,
+                               por_partes=False, libro=None):
+    """
+    Con `solo_validar` no se generan libros: devuelve `(Conciliacion, log_output)`.
+    Con `por_partes` la BASE se lee por bloques y se reparte por ASESOR
+    normalizado en disco (ver `segmentador.volcado`). `libro` es el libro ya
+    leído con `HOJAS_CORTE_2`, si lo hay.
+    """
+    perfil = PerfilEjecucion('provincia_corte_2') if perfil is None else perfil
+    log_output = []
+    log_output.append("--- INICIO DEL PROCESO: PROVINCIA CORTE 2 ---")
+    
+    # Alias del registro de agencias, sobre los nombres de ASESOR ya normalizados
+    registro = registro_global()
+    mapeo_asesor_alias = registro.alias()
+    log_output.append(f"Usando mapa de alias para: {', '.join(mapeo_asesor_alias.nombres())}")
+
+    if libro is None and not cabeceras_validas(archivo_excel_cargado, CABECERAS_PROVINCIA_CORTE_2, log_output):
+        return None, log_output
+
+    # --- 1. Lectura única del libro ---
+    perfil.iniciar_etapa('Lectura del libro')
+    base_volcada = None
+    try:
+        log_output.append("Leyendo datos completos...")
+        if por_partes:
+            # Solo el reporte en memoria; la BASE va por bloques a un volcado por ASESOR normalizado (alias resueltos).
+            libro = cargar_libro_con_cache(archivo_excel_cargado, {'Reporte CORTE 2': HOJAS_CORTE_2['Reporte CORTE 2']})
+            base_volcada = volcar_base(archivo_excel_cargado, 'ASESOR', normalizar_nombres, mapeo_asesor_alias, unicos=['DEPARTAMENTO'])
+        elif libro is None:
+            libro = cargar_libro_con_cache(archivo_excel_cargado, HOJAS_CORTE_2)
+    except Exception as e:
+        log_output.append(f"ERROR al leer o preparar datos: {e}")
+        return None, log_output
+
+    try:
+        # --- 2. Validación de Cabeceras ---
+        perfil.cerrar_etapa(filas=sum(libro.filas.values()) + (base_volcada.filas_leidas if base_volcada is not None else 0))
+        perfil.iniciar_etapa('Validación y normalización de nombres')
+        if not libro.validar_cabeceras('Reporte CORTE 2', ['AGENCIA', 'RUC'], nivel=1):
+            log_output.append("ALERTA: Cabeceras 'AGENCIA' o 'RUC' no encontradas en 'Reporte CORTE 2'.")
+            return None, log_output
+        base_valida = base_volcada.validar_cabeceras(['ASESOR', 'DEPARTAMENTO']) if base_volcada is not None else \
+            not por_partes and libro.validar_cabeceras('BASE', ['ASESOR', 'DEPARTAMENTO'])
+        if not base_valida:
+            log_output.append("ALERTA: Cabeceras 'ASESOR' o 'DEPARTAMENTO' no encontradas en la hoja 'BASE'.")
+            return None, log_output
+        log_output.append("Validación de cabeceras exitosa.")
+        log_output.extend(libro.resumen_tiempos())
+
+        # --- 3. Preparación de Datos ---
+        try:
+            df_reporte_total = libro.hoja('Reporte CORTE 2')
+            if base_volcada is not None:
+                log_output.extend(base_volcada.resumen_log())
+                df_base_total = None
+                filas_base = base_volcada.filas_leidas
+                lista_departamentos = registro.con_departamentos(base_volcada.valores_unicos('DEPARTAMENTO'))
+            else:
+                df_base_total = libro.hoja('BASE')
+                df_base_total.columns = df_base_total.columns.str.strip().str.upper()
+                filas_base = len(df_base_total)
+                lista_departamentos = registro.con_departamentos(df_base_total['DEPARTAMENTO'].dropna().unique().tolist())
+            lista_departamentos.sort(key=len, reverse=True)
+            log_output.append(f"Detectados {len(lista_departamentos)} departamentos para limpieza de nombres.")
+
+            # Cabecera de dos filas: las columnas se resuelven y se aplanan una sola vez para todas las agencias
+            # (antes de añadir las auxiliares AGENCIA_BASE, que así no se exportan).
+            plan = PlanCorte2(df_reporte_total.columns)
+            posicion_agencia = plan.posicion('AGENCIA', nivel=1, contiene=True)
+            if posicion_agencia is None:
+                log_output.append("ERROR: No se encontró la columna 'AGENCIA' en 'Reporte CORTE 2'.")
+                return None, log_output
+        
+            col_agencia_reporte = plan.columnas[posicion_agencia]
+
+            # Limpieza vectorizada: una sola regex con todos los departamentos y un cálculo por nombre distinto.
+            df_reporte_total['AGENCIA_BASE'] = agencias_base(df_reporte_total[col_agencia_reporte], lista_departamentos)
+            df_reporte_total['AGENCIA_BASE_NORMALIZADA'] = normalizar_nombres(df_reporte_total['AGENCIA_BASE'])
+            if df_base_total is not None:
+                df_base_total['ASESOR_NORMALIZADO'] = normalizar_nombres(df_base_total['ASESOR'])
+
+        except Exception as e:
+            log_output.append(f"ERROR al leer o preparar datos: {e}")
+            return None, log_output
+
+        # --- 4. Conciliación de ALTAS contra la BASE (todas las agencias de una vez) ---
+        perfil.iniciar_etapa('Conciliación', filas=filas_base)
+        posicion_altas = plan.posicion('ALTAS', nivel=1, contiene=True)
+        col_altas = plan.columnas[posicion_altas] if posicion_altas is not None else None
+        altas = pd.to_numeric(df_reporte_total[col_altas], errors='coerce').fillna(0) if col_altas else None
+        conciliacion = conciliar(df_reporte_total['AGENCIA_BASE_NORMALIZADA'], altas,
+                                 df_base_total['ASESOR_NORMALIZADO'] if base_volcada is None else None,
+                                 mapeo_asesor_alias, agregacion='suma', entero=True,
+                                 aviso_sin_altas="No se pudo encontrar la columna ALTAS para validar.",
+                                 conteos=base_volcada.conteos() if base_volcada is not None else None)
+        if solo_validar:
+            log_output.extend(conciliacion.lineas_log())
+            log_output.extend(conciliacion.resumen_log())
+            perfil.cerrar_etapa()
+            log_output.append("--- FIN DE LA VALIDACIÓN ---")
+            return conciliacion, log_output
+
+        # --- 5. Proceso de Segmentación ---
+        segmentacion = SegmentacionIncremental('provincia_corte_2') if incremental else None
+        with abrir_salida(compresion) as salida:
+            agencias_a_procesar = df_reporte_total['AGENCIA_BASE_NORMALIZADA'].dropna().unique().tolist()
+            log_output.append(f"Se encontraron {len(agencias_a_procesar)} agencias únicas para procesar.")
+
+            # --- Particionado de una sola pasada (el mapa de alias se aplica al agrupar la BASE) ---
+            perfil.iniciar_etapa('Particionado', filas=filas_base)
+            reporte_por_agencia = particionar(plan.aplanar(df_reporte_total), df_reporte_total['AGENCIA_BASE_NORMALIZADA'])
+            # Nombre original (sin departamento) de cada agencia, para el nombre del archivo.
+            nombre_original = df_reporte_total[('AGENCIA_BASE', '')].groupby(df_reporte_total['AGENCIA_BASE_NORMALIZADA'].to_numpy(),
+                                                                              sort=False).first()
+            if base_volcada is not None:
+                # Ya repartida al leer: cada agencia se lee de su volcado cuando le toca.
+                base_por_agencia = base_volcada
+            else:
+                base_por_agencia = particionar(df_base_total.drop(columns=['ASESOR_NORMALIZADO']),
+                                               df_base_total['ASESOR_NORMALIZADO'], mapeo_asesor_alias)
+
+            # Cada tarea anota la conciliación en este proceso (el log conserva el orden) y entrega
+            # solo sus porciones, con la cabecera ya aplanada, para generar el libro en serie o en paralelo.
+            def tareas_por_agencia():
+                for agencia_norm in agencias_a_procesar:
+                    reporte_agencia = reporte_por_agencia.obtener(agencia_norm)
+                    base_agencia = base_por_agencia.obtener(agencia_norm)
+
+                    if reporte_agencia.empty: continue
+            
+                    nombre_archivo_limpio = "".join(c for c in nombre_original[agencia_norm] if c.isalnum() or c in (' ', '_')).rstrip()
+                    nombre_archivo = f"Reporte Provincia Corte 2 {nombre_archivo_limpio}.xlsx"
+
+                    # Validación de consistencia (ya calculada para todas las agencias), también para el evento de avance
+                    log_output.append(perfil.anotar_agencia(nombre_archivo, agencia_norm, conciliacion))
+                    yield nombre_archivo, (reporte_agencia, base_agencia)
+
+            perfil.anunciar_agencias(len(agencias_a_procesar))
+            perfil.iniciar_etapa('Libros y ZIP')
+            escribir_libros(salida, tareas_por_agencia(), libro_corte_2, trabajadores, perfil, segmentacion)
+        perfil.cerrar_etapa()
+    finally:
+        if base_volcada is not None:
+            base_volcada.cerrar()
+    perfil.datos.update(agencias=len(perfil.agencias), trabajadores=trabajadores, motor=libro.motor, zip_bytes=salida.tamano(), compresion=salida.compresion)
+    log_output.extend(conciliacion.resumen_log())
+    log_output.append(salida.resumen())
+    if segmentacion is not None:
+        log_output.extend(segmentacion.resumen_log())
+        segmentacion.guardar_manifiesto()
+    log_output.extend(perfil.resumen_log())
+
+    log_output.append("--- FIN DEL PROCESO ---")
+    return salida.para_descarga(), log_output
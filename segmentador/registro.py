@@ -0,0 +1,150 @@
+# segmentador/registro.py
+"""
+Registro de agencias: alias de ASESOR y departamentos, fuera del código.
+
+El registro es un archivo JSON (o YAML, si está instalado PyYAML) como
+`registro_agencias.json`:
+
+    {
+      "agencias": {"EXPORTEL S.A.C.": ["EXPORTEL PROVINCIA"]},
+      "departamentos": []
+    }
+
+`agencias` va de cada nombre canónico a los otros nombres con que aparece
+como ASESOR en la BASE; `departamentos` son departamentos que se quitan del
+final de los nombres de agencia además de los que trae la BASE. Los nombres
+se comparan normalizados (ver `normalizar_nombre`), así que da igual cómo se
+escriban puntos, mayúsculas o espacios.
+
+Se compila una sola vez por proceso (y otra vez si el archivo cambia) en un
+`RegistroAgencias`: un diccionario de nombre normalizado a agencia canónica,
+de modo que resolver un ASESOR es una búsqueda por cada nombre distinto.
+Todas las páginas usan el mismo registro.
+
+Variables de entorno:
+    SEGMENTADOR_REGISTRO   ruta del registro (por defecto `registro_agencias.json` junto a este módulo)
+"""
+import hashlib
+import json
+import os
+import threading
+
+from segmentador.normalizacion import normalizar_nombre
+
+RUTA_POR_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'registro_agencias.json')
+
+
+class ResolucionAlias:
+    """
+    Alias del registro tal como los usa una página; se pasa como `mapeo_alias`
+    a `particionar`, `conciliar` o `volcar_base`. Con `normalizadas` las claves
+    de la BASE ya vienen normalizadas y el canónico es el nombre normalizado;
+    si no, el canónico se escribe como en `agencias_reporte` (o como en el
+    registro, si el reporte no lo trae).
+    """
+
+    def __init__(self, registro, agencias_reporte=None, normalizadas=True):
+        self.registro = registro
+        self.normalizadas = normalizadas
+        self._escritura = {}
+        for agencia in agencias_reporte if agencias_reporte is not None else ():
+            if isinstance(agencia, str):
+                self._escritura.setdefault(normalizar_nombre(agencia), agencia)
+
+    def __len__(self):
+        return len(self.registro.canonico_de)
+
+    def nombre(self, canonico):
+        if self.normalizadas:
+            return canonico
+        return self._escritura.get(canonico, self.registro.nombres[canonico])
+
+    def nombres(self):
+        """Agencias canónicas del registro, escritas como en esta página."""
+        return [self.nombre(canonico) for canonico in self.registro.nombres]
+
+    def alias_a_canonico(self, distintos):
+        """{nombre: canónico} para los valores de `distintos` que hay que cambiar."""
+        resultado = {}
+        for valor in distintos:
+            if not isinstance(valor, str): continue
+            canonico = self.registro.canonico_de.get(valor if self.normalizadas else normalizar_nombre(valor))
+            if canonico is None: continue
+            nombre = self.nombre(canonico)
+            if nombre != valor:
+                resultado[valor] = nombre
+        return resultado
+
+
+class RegistroAgencias:
+    """Registro compilado: nombre normalizado -> agencia canónica (normalizada)."""
+
+    def __init__(self, agencias=None, departamentos=None, ruta=None):
+        self.ruta = ruta
+        # Canónico normalizado -> nombre como está escrito en el registro.
+        self.nombres = {}
+        self.canonico_de = {}
+        for canonico, alias in (agencias or {}).items():
+            normalizado = normalizar_nombre(canonico)
+            self.nombres.setdefault(normalizado, canonico)
+            for nombre in [canonico, *alias]:
+                self.canonico_de.setdefault(normalizar_nombre(nombre), normalizado)
+        self.departamentos = [str(depto) for depto in departamentos or []]
+        # Huella del contenido: los resultados cacheados dependen del registro con que se generaron.
+        contenido = json.dumps([agencias or {}, self.departamentos], sort_keys=True, ensure_ascii=False)
+        self.huella = hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+    def alias(self, agencias_reporte=None, normalizadas=True):
+        return ResolucionAlias(self, agencias_reporte, normalizadas)
+
+    def con_departamentos(self, lista_departamentos):
+        """`lista_departamentos` más los del registro que no estén ya."""
+        presentes = set(lista_departamentos)
+        return list(lista_departamentos) + [depto for depto in self.departamentos if depto not in presentes]
+
+
+def _leer_archivo(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        if ruta.lower().endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError(f"El registro '{ruta}' es YAML pero PyYAML no está instalado (use JSON o instale pyyaml).")
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def cargar_registro(ruta=None):
+    """Lee y compila el registro de `ruta` (o el de `SEGMENTADOR_REGISTRO` / el por defecto)."""
+    ruta = ruta or os.environ.get('SEGMENTADOR_REGISTRO') or RUTA_POR_DEFECTO
+    datos = _leer_archivo(ruta)
+    return RegistroAgencias(datos.get('agencias'), datos.get('departamentos'), ruta)
+
+
+_registro_global = None
+_firma_global = None
+_lock_global = threading.Lock()
+
+
+def registro_global():
+    """Registro compartido por el proceso; se vuelve a compilar solo si el archivo cambió."""
+    global _registro_global, _firma_global
+    ruta = os.environ.get('SEGMENTADOR_REGISTRO') or RUTA_POR_DEFECTO
+    try:
+        estado = os.stat(ruta)
+        firma = (ruta, estado.st_mtime_ns, estado.st_size)
+    except OSError:
+        firma = (ruta, None, None)
+    with _lock_global:
+        if _registro_global is None or firma != _firma_global:
+            _registro_global = cargar_registro(ruta)
+            _firma_global = firma
+        return _registro_global
+
+
+def agencias_del_reporte(libro, nombre_hoja, nivel=None):
+    """Nombres de la columna AGENCIA del reporte, o None si la hoja no la tiene."""
+    try:
+        return libro.valores_unicos(nombre_hoja, 'AGENCIA', nivel)
+    except KeyError:
+        return None
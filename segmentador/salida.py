@@ -0,0 +1,304 @@
+# segmentador/salida.py
+"""
+Archivo de resultados (ZIP o TAR) respaldado por un archivo temporal.
+
+Cada libro se escribe directamente en su entrada del ZIP (sin un BytesIO
+intermedio por agencia ni la copia de `.getvalue()`), y el ZIP vive en un
+`SpooledTemporaryFile`: se mantiene en memoria mientras es pequeño y pasa a
+disco al superar el umbral. Así la memoria del proceso no crece con el
+número de agencias.
+
+Compresión (`COMPRESIONES`): un .xlsx ya es un ZIP comprimido, así que
+volver a comprimirlo gana poco. Medido sobre libros sintéticos de 60 y 100
+agencias, deflate deja el ZIP en 91-94% del tamaño con cualquier nivel (1, 6
+o 9) y cuesta unos 45 ms por MB de libros; por eso el formato por defecto es
+'almacenado' (ZIP sin compresión). Con deflate cada entrada se comprime al
+agregarla, con la API pública de `zipfile`, en el único hilo que escribe el
+ZIP; con varios trabajadores, mientras tanto el pool sigue generando los
+libros siguientes. 'tar' entrega los libros sueltos en un .tar (la CLI, además,
+puede escribirlos en carpetas).
+
+Variables de entorno:
+    SEGMENTADOR_ZIP_MEMORIA_MB     tamaño a partir del cual el ZIP pasa a disco (por defecto 32 MB)
+    SEGMENTADOR_COMPRESION         formato por defecto (ver COMPRESIONES)
+"""
+import functools
+import io
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections import deque
+
+from segmentador.paralelo import TRABAJADORES_POR_DEFECTO, generar_libros
+
+MB = 1024 * 1024
+UMBRAL_ZIP_EN_MEMORIA = int(os.environ.get('SEGMENTADOR_ZIP_MEMORIA_MB', 32)) * MB
+
+# nombre -> (método ZIP, nivel de deflate, descripción); 'tar' no es un ZIP.
+COMPRESIONES = {
+    'almacenado': (zipfile.ZIP_STORED, None, 'ZIP sin compresión (el más rápido)'),
+    'rapido': (zipfile.ZIP_DEFLATED, 1, 'ZIP con deflate nivel 1'),
+    'normal': (zipfile.ZIP_DEFLATED, 6, 'ZIP con deflate nivel 6 (el de antes)'),
+    'maximo': (zipfile.ZIP_DEFLATED, 9, 'ZIP con deflate nivel 9'),
+    'tar': (None, None, 'TAR con los libros sueltos, sin compresión'),
+}
+COMPRESION_POR_DEFECTO = os.environ.get('SEGMENTADOR_COMPRESION', 'almacenado')
+
+
+def extension_salida(compresion=None):
+    return '.tar' if (compresion or COMPRESION_POR_DEFECTO) == 'tar' else '.zip'
+
+
+def mime_salida(compresion=None):
+    return 'application/x-tar' if (compresion or COMPRESION_POR_DEFECTO) == 'tar' else 'application/zip'
+
+
+def abrir_salida(compresion=None, umbral_en_memoria=None):
+    """`SalidaZip` o `SalidaTar` según `compresion` (nombre de COMPRESIONES)."""
+    compresion = compresion or COMPRESION_POR_DEFECTO
+    if compresion not in COMPRESIONES:
+        raise ValueError(f"Compresión desconocida '{compresion}'. Opciones: {', '.join(COMPRESIONES)}")
+    if compresion == 'tar':
+        return SalidaTar(umbral_en_memoria)
+    return SalidaZip(umbral_en_memoria, compresion)
+
+
+class _Salida:
+    """Lo común a ZIP y TAR: archivo temporal, tamaños y tiempos para el log."""
+
+    compresion = None
+
+    def __init__(self, umbral_en_memoria=None):
+        self.umbral_en_memoria = UMBRAL_ZIP_EN_MEMORIA if umbral_en_memoria is None else umbral_en_memoria
+        self.archivo = None
+        self.bytes_libros = 0
+        self.segundos_compresion = 0.0
+
+    def _abrir_archivo(self):
+        self.archivo = tempfile.SpooledTemporaryFile(max_size=self.umbral_en_memoria, mode='w+b')
+
+    @property
+    def en_disco(self):
+        return bool(getattr(self.archivo, '_rolled', False))
+
+    def tamano(self):
+        return tamano_resultado(self.archivo)
+
+    def para_descarga(self):
+        """
+        Manejador de archivo listo para `st.download_button` (que acepta
+        `io.BufferedReader`), posicionado al inicio.
+        """
+        self.archivo.seek(0)
+        return io.BufferedReader(self.archivo)
+
+    def bytes_comprimidos(self):
+        return self.tamano()
+
+    def resumen(self):
+        """Línea de log con el formato, la razón de compresión y su tiempo."""
+        comprimidos = self.bytes_comprimidos()
+        razon = comprimidos / self.bytes_libros if self.bytes_libros else 1.0
+        return (f"SALIDA   | {self.compresion}: {self.bytes_libros / MB:.1f} MB de libros -> {comprimidos / MB:.1f} MB "
+                f"({razon:.0%}) | compresión y escritura: {self.segundos_compresion:.2f} s")
+
+
+class SalidaZip(_Salida):
+    """
+    Uso:
+        with SalidaZip() as salida:
+            salida.agregar_libro("Reporte X.xlsx", libro_lima, reporte, base)
+        zip_file = salida.para_descarga()
+    """
+
+    def __init__(self, umbral_en_memoria=None, compresion=None):
+        super().__init__(umbral_en_memoria)
+        self.compresion = compresion or COMPRESION_POR_DEFECTO
+        self.metodo, self.nivel, _ = COMPRESIONES[self.compresion]
+        self.zf = None
+
+    def __enter__(self):
+        self._abrir_archivo()
+        self.zf = zipfile.ZipFile(self.archivo, 'w', self.metodo, compresslevel=self.nivel)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.zf.close()
+        return False
+
+    def agregar_libro(self, nombre_archivo, construir_libro, *argumentos):
+        """
+        Genera el libro escribiendo directamente en su entrada del ZIP.
+        Devuelve los segundos de (generación del libro, escritura en el ZIP).
+        """
+        t0 = time.perf_counter()
+        with self.zf.open(nombre_archivo, 'w') as entrada:
+            destino = _EscrituraMedida(entrada)
+            construir_libro(*argumentos, destino=destino)
+            self.bytes_libros += destino.bytes
+        total = time.perf_counter() - t0
+        self.segundos_compresion += destino.segundos
+        return total - destino.segundos, destino.segundos
+
+    def agregar_bytes(self, nombre_archivo, contenido):
+        """Agrega un libro ya generado. Devuelve los segundos de escritura en el ZIP."""
+        self.bytes_libros += len(contenido)
+        t0 = time.perf_counter()
+        self.zf.writestr(nombre_archivo, contenido)
+        segundos = time.perf_counter() - t0
+        self.segundos_compresion += segundos
+        return segundos
+
+    def bytes_comprimidos(self):
+        return sum(info.compress_size for info in self.zf.infolist())
+
+
+class SalidaTar(_Salida):
+    """Como `SalidaZip`, pero un .tar sin compresión con los libros sueltos."""
+
+    compresion = 'tar'
+
+    def __init__(self, umbral_en_memoria=None):
+        super().__init__(umbral_en_memoria)
+        self.tar = None
+
+    def __enter__(self):
+        self._abrir_archivo()
+        self.tar = tarfile.open(fileobj=self.archivo, mode='w', format=tarfile.PAX_FORMAT)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tar.close()
+        return False
+
+    def agregar_libro(self, nombre_archivo, construir_libro, *argumentos):
+        t0 = time.perf_counter()
+        contenido = construir_libro(*argumentos)
+        return time.perf_counter() - t0, self.agregar_bytes(nombre_archivo, contenido)
+
+    def agregar_bytes(self, nombre_archivo, contenido):
+        t0 = time.perf_counter()
+        info = tarfile.TarInfo(nombre_archivo)
+        info.size, info.mtime, info.mode = len(contenido), int(time.time()), 0o644
+        self.tar.addfile(info, io.BytesIO(contenido))
+        segundos = time.perf_counter() - t0
+        self.bytes_libros += len(contenido)
+        self.segundos_compresion += segundos
+        return segundos
+
+
+class _EscrituraMedida(io.RawIOBase):
+    """Envuelve la entrada del ZIP y acumula el tiempo y los bytes de sus escrituras (compresión y disco)."""
+
+    def __init__(self, destino):
+        super().__init__()
+        self._destino = destino
+        self.segundos = 0.0
+        self.bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        t0 = time.perf_counter()
+        escritos = self._destino.write(datos)
+        self.segundos += time.perf_counter() - t0
+        self.bytes += len(datos)
+        return escritos
+
+    def flush(self):
+        self._destino.flush()
+
+
+def _construir_midiendo(construir_libro, *argumentos):
+    """Genera el libro (en un trabajador) y devuelve (bytes, segundos)."""
+    t0 = time.perf_counter()
+    contenido = construir_libro(*argumentos)
+    return contenido, time.perf_counter() - t0
+
+
+def _filas(argumentos):
+    return sum(len(a) for a in argumentos if hasattr(a, '__len__'))
+
+
+def escribir_libros(salida, tareas, construir_libro, trabajadores=None, perfil=None, incremental=None):
+    """
+    Escribe en `salida` un libro por tarea `(nombre_archivo, argumentos)`, en orden.
+    En serie cada libro se escribe directamente en el ZIP; con varios
+    trabajadores los bytes llegan del pool y se agregan en el orden de las tareas.
+    Si se pasa un `PerfilEjecucion`, registra los tiempos de cada libro.
+    Con `incremental` (un `SegmentacionIncremental`), las agencias cuya huella
+    ya tiene un libro guardado lo reutilizan y solo se generan las demás.
+    """
+    trabajadores = TRABAJADORES_POR_DEFECTO if trabajadores is None else trabajadores
+    if incremental is not None and not incremental.activo:
+        incremental = None
+
+    def registrar(nombre_archivo, segundos_libro, segundos_zip, filas):
+        if perfil is not None:
+            perfil.registrar_agencia(nombre_archivo, segundos_libro, segundos_zip, filas)
+
+    def agregar_generado(nombre_archivo, huella, contenido, segundos_libro, filas):
+        if incremental is not None:
+            incremental.guardar(huella, contenido)
+            incremental.registrar(nombre_archivo, huella, reutilizado=False)
+        registrar(nombre_archivo, segundos_libro, salida.agregar_bytes(nombre_archivo, contenido), filas)
+
+    def agregar_reutilizado(nombre_archivo, huella, contenido, filas):
+        incremental.registrar(nombre_archivo, huella, reutilizado=True)
+        registrar(nombre_archivo, 0.0, salida.agregar_bytes(nombre_archivo, contenido), filas)
+
+    if trabajadores <= 1:
+        for nombre_archivo, argumentos in tareas:
+            if incremental is None:
+                segundos_libro, segundos_zip = salida.agregar_libro(nombre_archivo, construir_libro, *argumentos)
+                registrar(nombre_archivo, segundos_libro, segundos_zip, _filas(argumentos))
+                continue
+            huella, guardado = incremental.buscar(nombre_archivo, construir_libro, argumentos)
+            if guardado is not None:
+                agregar_reutilizado(nombre_archivo, huella, guardado, _filas(argumentos))
+                continue
+            contenido, segundos_libro = _construir_midiendo(construir_libro, *argumentos)
+            agregar_generado(nombre_archivo, huella, contenido, segundos_libro, _filas(argumentos))
+        return
+    # Los resultados llegan en el orden de las tareas. La cola guarda, en ese orden,
+    # (nombre, filas, huella, libro reutilizado o None) de cada tarea; al pool solo van las que hay que generar.
+    en_orden = deque()
+
+    def tareas_a_generar():
+        for nombre_archivo, argumentos in tareas:
+            huella, guardado = incremental.buscar(nombre_archivo, construir_libro, argumentos) if incremental else (None, None)
+            en_orden.append((nombre_archivo, _filas(argumentos), huella, guardado))
+            if guardado is None:
+                yield nombre_archivo, argumentos
+
+    construir_midiendo = functools.partial(_construir_midiendo, construir_libro)
+    for _, (contenido, segundos_libro) in generar_libros(tareas_a_generar(), construir_midiendo, trabajadores):
+        nombre_archivo, filas, huella, guardado = en_orden.popleft()
+        while guardado is not None:
+            agregar_reutilizado(nombre_archivo, huella, guardado, filas)
+            nombre_archivo, filas, huella, guardado = en_orden.popleft()
+        agregar_generado(nombre_archivo, huella, contenido, segundos_libro, filas)
+    for nombre_archivo, filas, huella, guardado in en_orden:
+        agregar_reutilizado(nombre_archivo, huella, guardado, filas)
+
+
+def tamano_resultado(zip_file):
+    """Tamaño en bytes de un resultado (BytesIO o manejador de archivo)."""
+    posicion = zip_file.tell()
+    zip_file.seek(0, io.SEEK_END)
+    tamano = zip_file.tell()
+    zip_file.seek(posicion)
+    return tamano
+
+
+def leer_bytes(zip_file):
+    """Lee completo un resultado (BytesIO o manejador de archivo) y lo deja al inicio."""
+    if isinstance(zip_file, io.BytesIO):
+        return zip_file.getvalue()
+    zip_file.seek(0)
+    contenido = zip_file.read()
+    zip_file.seek(0)
+    return contenido
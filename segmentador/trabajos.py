@@ -0,0 +1,324 @@
+# segmentador/trabajos.py
+"""
+Cola de trabajos en segundo plano para las páginas.
+
+Un trabajo es un archivo subido más los ajustes con que se procesa (modo de
+la CLI, zona, trabajadores, compresión, incremental). Se guarda en disco
+(`<directorio>/<id>/`: entrada.xlsx, estado.json, progreso.json y, al
+terminar, el resultado y el log), así el estado y el resultado sobreviven a
+los reruns y a recargar el navegador.
+
+Un hilo del servidor de Streamlit reparte los trabajos en cola: ejecuta cada
+uno en su propio proceso ('spawn'), nunca más de `simultaneos` a la vez ni
+sin un turno libre del gobernador de memoria (`segmentador.memoria`, el mismo
+límite de procesos pesados que usan las páginas), y elige el siguiente por usuario (primero el que tiene menos trabajos en
+proceso y lleva más tiempo sin arrancar uno), para que un usuario con muchos
+archivos no acapare la cola. Un trabajo se puede cancelar en cola o en
+proceso.
+
+Variables de entorno:
+    SEGMENTADOR_TRABAJOS_DIR          directorio de los trabajos (por defecto <tmp>/segmentador_trabajos)
+    SEGMENTADOR_TRABAJOS_SIMULTANEOS  trabajos en proceso a la vez (por defecto 1)
+    SEGMENTADOR_TRABAJOS_HORAS        horas que se conservan los trabajos terminados (por defecto 24)
+"""
+import atexit
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+
+from segmentador.cli import procesar_modo
+from segmentador.memoria import gobernador_global
+from segmentador.perfil import PerfilEjecucion
+from segmentador.salida import extension_salida
+
+EN_COLA = 'en cola'
+EN_PROCESO = 'en proceso'
+TERMINADO = 'terminado'
+ERROR = 'error'
+CANCELADO = 'cancelado'
+FINALES = (TERMINADO, ERROR, CANCELADO)
+
+INTERVALO_PLANIFICADOR = 0.5
+INTERVALO_PROGRESO = 0.5
+
+
+def _guardar_json(ruta, datos):
+    """Escritura atómica: quien lee nunca ve un JSON a medias."""
+    descriptor, temporal = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(ruta))
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+    os.replace(temporal, ruta)
+
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class _PerfilConProgreso(PerfilEjecucion):
+    """Perfil que además publica en `progreso.json` la etapa, las agencias terminadas y la ETA."""
+
+    def __init__(self, pagina, ruta):
+        super().__init__(pagina)
+        self._ruta = ruta
+        self._publicado = 0.0
+
+    def iniciar_etapa(self, nombre, filas=None):
+        super().iniciar_etapa(nombre, filas)
+        self._publicar(forzar=True)
+
+    def registrar_agencia(self, archivo, segundos_libro, segundos_zip, filas=None):
+        super().registrar_agencia(archivo, segundos_libro, segundos_zip, filas)
+        self._publicar()
+
+    def _publicar(self, forzar=False):
+        ahora = time.monotonic()
+        if not forzar and ahora - self._publicado < INTERVALO_PROGRESO:
+            return
+        self._publicado = ahora
+        evento = self.ultimo_evento or {}
+        _guardar_json(self._ruta, {'etapa': self._abierta[0]['etapa'] if self._abierta else None,
+                                   'agencias': len(self.agencias), 'total': self.total_agencias,
+                                   'ultima_agencia': self.agencias[-1]['archivo'] if self.agencias else None,
+                                   'ultimo_estado': evento.get('estado'),
+                                   'eta': None if evento.get('eta') is None else round(evento['eta'], 1),
+                                   'segundos': round(self.total_segundos(), 1)})
+
+
+def _ejecutar(directorio):
+    """Proceso de un trabajo: procesa la entrada y deja el resultado, el log y `fin.json`."""
+    datos = _leer_json(os.path.join(directorio, 'estado.json'))
+    perfil = _PerfilConProgreso(datos['modo'], os.path.join(directorio, 'progreso.json'))
+    fin = {'estado': ERROR, 'mensaje': None}
+    try:
+        with open(os.path.join(directorio, 'entrada.xlsx'), 'rb') as archivo:
+            _, resultado, log_output = procesar_modo(datos['modo'], archivo, datos['zona'], datos['trabajadores'], perfil,
+                                                     datos['compresion'], datos['incremental'],
+                                                     por_partes=datos.get('por_partes', False))[0]
+        with open(os.path.join(directorio, 'log.txt'), 'w', encoding='utf-8') as f:
+            f.write("\n".join(log_output) + "\n")
+        with open(os.path.join(directorio, 'perfil.json'), 'w', encoding='utf-8') as f:
+            f.write(perfil.a_json())
+        if resultado is not None:
+            with open(os.path.join(directorio, 'resultado' + extension_salida(datos['compresion'])), 'wb') as f:
+                shutil.copyfileobj(resultado, f)
+            fin['estado'] = TERMINADO
+        else:
+            fin['mensaje'] = "El proceso terminó con errores: ver el log."
+    except Exception:
+        fin['mensaje'] = traceback.format_exc(limit=5)
+    fin['segundos'] = round(perfil.total_segundos(), 1)
+    _guardar_json(os.path.join(directorio, 'fin.json'), fin)
+
+
+class ColaTrabajos:
+    """
+    Uso (lo hacen las páginas a través de `vista`):
+        cola = cola_global()
+        id_trabajo = cola.enviar(usuario, 'lima', uploaded_file.getvalue(), uploaded_file.name, pagina='lima')
+        cola.estado(id_trabajo)   # {'estado': 'en proceso', 'progreso': {...}, ...}
+        cola.cancelar(id_trabajo)
+        cola.ruta_resultado(id_trabajo), cola.log(id_trabajo)
+    """
+
+    def __init__(self, directorio, simultaneos=1, horas_retencion=24, gobernador=None):
+        self.directorio = directorio
+        self.simultaneos = max(1, simultaneos)
+        self.horas_retencion = horas_retencion
+        self.gobernador = gobernador
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.RLock()
+        self._procesos = {}
+        self._ultimo_inicio = {}
+        self._hilo = None
+        self._ultima_limpieza = 0.0
+        # Los que quedaron "en proceso" de una ejecución anterior del servidor ya no tienen proceso.
+        for datos in self.trabajos():
+            if datos['estado'] == EN_PROCESO:
+                self._actualizar(datos['id'], estado=ERROR, terminado=time.time(),
+                                 mensaje="Interrumpido: el servidor se reinició mientras se procesaba.")
+
+    def _ruta(self, id_trabajo, nombre=''):
+        return os.path.join(self.directorio, id_trabajo, nombre)
+
+    def _actualizar(self, id_trabajo, **cambios):
+        with self._lock:
+            datos = _leer_json(self._ruta(id_trabajo, 'estado.json'))
+            if datos is None:
+                return None
+            datos.update(cambios)
+            _guardar_json(self._ruta(id_trabajo, 'estado.json'), datos)
+            return datos
+
+    def enviar(self, usuario, modo, contenido, nombre_archivo, pagina=None, zona=None, trabajadores=1, compresion=None,
+               incremental=False, por_partes=False):
+        """Deja el trabajo en cola y devuelve su id."""
+        id_trabajo = uuid.uuid4().hex[:12]
+        os.makedirs(self._ruta(id_trabajo))
+        with open(self._ruta(id_trabajo, 'entrada.xlsx'), 'wb') as f:
+            f.write(contenido)
+        _guardar_json(self._ruta(id_trabajo, 'estado.json'), {
+            'id': id_trabajo, 'usuario': usuario, 'pagina': pagina or modo, 'modo': modo, 'archivo': nombre_archivo,
+            'zona': zona, 'trabajadores': int(trabajadores), 'compresion': compresion, 'incremental': bool(incremental),
+            'por_partes': bool(por_partes),
+            'estado': EN_COLA, 'creado': time.time(), 'iniciado': None, 'terminado': None, 'mensaje': None})
+        self.iniciar()
+        return id_trabajo
+
+    def trabajos(self, usuario=None):
+        """Estados de todos los trabajos (o los de `usuario`), del más antiguo al más nuevo."""
+        lista = []
+        for nombre in os.listdir(self.directorio):
+            datos = _leer_json(self._ruta(nombre, 'estado.json'))
+            if datos is not None and (usuario is None or datos['usuario'] == usuario):
+                lista.append(datos)
+        return sorted(lista, key=lambda datos: datos['creado'])
+
+    def estado(self, id_trabajo):
+        """Estado del trabajo con su progreso y, si está en cola, su posición; None si no existe."""
+        datos = _leer_json(self._ruta(id_trabajo, 'estado.json'))
+        if datos is None:
+            return None
+        datos['progreso'] = _leer_json(self._ruta(id_trabajo, 'progreso.json')) or {}
+        if datos['estado'] == EN_COLA:
+            datos['posicion'] = 1 + sum(1 for otro in self.trabajos()
+                                        if otro['estado'] == EN_COLA and otro['creado'] < datos['creado'])
+        return datos
+
+    def cancelar(self, id_trabajo):
+        with self._lock:
+            datos = _leer_json(self._ruta(id_trabajo, 'estado.json'))
+            if datos is None or datos['estado'] in FINALES:
+                return
+            proceso = self._procesos.pop(id_trabajo, None)
+            if proceso is not None:
+                proceso.terminate()
+                proceso.join(5)
+                self._soltar_turno()
+            self._actualizar(id_trabajo, estado=CANCELADO, terminado=time.time(), mensaje="Cancelado por el usuario.")
+
+    def ruta_resultado(self, id_trabajo):
+        datos = _leer_json(self._ruta(id_trabajo, 'estado.json'))
+        if datos is None or datos['estado'] != TERMINADO:
+            return None
+        return self._ruta(id_trabajo, 'resultado' + extension_salida(datos['compresion']))
+
+    def log(self, id_trabajo):
+        try:
+            with open(self._ruta(id_trabajo, 'log.txt'), encoding='utf-8') as f:
+                return f.read().splitlines()
+        except OSError:
+            return []
+
+    # --- Planificador ---
+
+    def iniciar(self):
+        """Arranca el hilo planificador (una sola vez por proceso)."""
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='segmentador-trabajos', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            try:
+                self.planificar()
+            except Exception:
+                traceback.print_exc()
+            time.sleep(INTERVALO_PLANIFICADOR)
+
+    def _siguiente(self, trabajos):
+        """El trabajo en cola del usuario con menos trabajos en proceso y que hace más que no arranca uno."""
+        en_cola = [datos for datos in trabajos if datos['estado'] == EN_COLA]
+        if not en_cola:
+            return None
+        en_proceso = Counter(datos['usuario'] for datos in trabajos if datos['estado'] == EN_PROCESO)
+        return min(en_cola, key=lambda datos: (en_proceso[datos['usuario']], self._ultimo_inicio.get(datos['usuario'], 0.0),
+                                               datos['creado']))
+
+    def planificar(self):
+        """Un paso: recoge los procesos terminados y arranca trabajos en cola hasta el límite."""
+        with self._lock:
+            for id_trabajo, proceso in list(self._procesos.items()):
+                if proceso.is_alive():
+                    continue
+                proceso.join()
+                del self._procesos[id_trabajo]
+                self._soltar_turno()
+                fin = _leer_json(self._ruta(id_trabajo, 'fin.json')) or {
+                    'estado': ERROR, 'mensaje': f"El proceso terminó inesperadamente (código {proceso.exitcode})."}
+                self._actualizar(id_trabajo, estado=fin['estado'], mensaje=fin['mensaje'], terminado=time.time())
+
+            trabajos = self.trabajos()
+            while len(self._procesos) < self.simultaneos:
+                datos = self._siguiente(trabajos)
+                if datos is None:
+                    break
+                if self.gobernador is not None and not self.gobernador.tomar_turno(esperar=False):
+                    break
+                proceso = multiprocessing.get_context('spawn').Process(target=_ejecutar, args=(self._ruta(datos['id']),),
+                                                                       name=f"trabajo-{datos['id']}")
+                proceso.start()
+                self._procesos[datos['id']] = proceso
+                self._ultimo_inicio[datos['usuario']] = time.monotonic()
+                actualizado = self._actualizar(datos['id'], estado=EN_PROCESO, iniciado=time.time())
+                if actualizado is None:
+                    # El trabajo se borró mientras arrancaba: no hay dónde dejar su resultado.
+                    proceso.terminate()
+                    proceso.join(5)
+                    del self._procesos[datos['id']]
+                    self._soltar_turno()
+                    datos['estado'] = CANCELADO
+                    continue
+                datos.update(actualizado)
+
+        if time.time() - self._ultima_limpieza > 3600:
+            self._ultima_limpieza = time.time()
+            self.limpiar()
+
+    def _soltar_turno(self):
+        if self.gobernador is not None:
+            self.gobernador.soltar_turno()
+
+    def limpiar(self):
+        """Borra los trabajos terminados hace más de `horas_retencion` horas."""
+        limite = time.time() - self.horas_retencion * 3600
+        for datos in self.trabajos():
+            if datos['estado'] in FINALES and (datos['terminado'] or datos['creado']) < limite:
+                shutil.rmtree(self._ruta(datos['id']), ignore_errors=True)
+
+    def detener(self):
+        """Termina los procesos en curso (al cerrar el servidor)."""
+        with self._lock:
+            for proceso in self._procesos.values():
+                proceso.terminate()
+
+
+_cola_global = None
+_lock_global = threading.Lock()
+
+
+def cola_global():
+    """Cola compartida por todas las sesiones del proceso de Streamlit."""
+    global _cola_global
+    with _lock_global:
+        if _cola_global is None:
+            _cola_global = ColaTrabajos(
+                os.environ.get('SEGMENTADOR_TRABAJOS_DIR', os.path.join(tempfile.gettempdir(), 'segmentador_trabajos')),
+                simultaneos=int(os.environ.get('SEGMENTADOR_TRABAJOS_SIMULTANEOS', 1)),
+                horas_retencion=float(os.environ.get('SEGMENTADOR_TRABAJOS_HORAS', 24)),
+                gobernador=gobernador_global(),
+            )
+            atexit.register(_cola_global.detener)
+            _cola_global.iniciar()
+        return _cola_global
@@ -0,0 +1,243 @@
+# segmentador/vista.py
+"""
+Piezas de interfaz de Streamlit compartidas por las páginas.
+"""
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from segmentador.cabeceras import revisar_cabeceras
+from segmentador.cache import cache_global, tamano_aproximado
+from segmentador.conciliacion import OK
+from segmentador.memoria import CATEGORIAS, MB, gobernador_global
+from segmentador.salida import COMPRESION_POR_DEFECTO, COMPRESIONES, extension_salida, mime_salida
+from segmentador.trabajos import CANCELADO, EN_COLA, FINALES, TERMINADO, cola_global
+
+# Segundos mínimos entre dos repintados de la tabla de avance (con miles de agencias no se repinta en cada una).
+INTERVALO_AVANCE = 0.5
+
+
+def mostrar_perfil(perfil, n_agencias=10):
+    """Tabla de tiempos por etapa, agencias más lentas y descarga del perfil en JSON."""
+    if not perfil.etapas:
+        # Resultado recuperado del cache: no hubo etapas que medir.
+        return
+    with st.expander("Perfil de la ejecución (tiempos y memoria)"):
+        st.caption(f"Tiempo total: {perfil.total_segundos():.2f} s")
+        st.dataframe(perfil.tabla_etapas(), hide_index=True)
+        if perfil.agencias:
+            st.markdown(f"**Las {min(n_agencias, len(perfil.agencias))} agencias más lentas**")
+            st.dataframe(perfil.agencias_mas_lentas(n_agencias), hide_index=True)
+        st.download_button(label="Descargar perfil (.json)", data=perfil.a_json(),
+                           file_name=f"Perfil_{perfil.pagina}_{perfil.inicio.strftime('%Y%m%d_%H%M%S')}.json",
+                           mime="application/json", key=f"perfil_{perfil.pagina}")
+
+
+def _texto_eta(segundos):
+    if segundos is None:
+        return ""
+    minutos, segundos = divmod(int(round(segundos)), 60)
+    return f" | quedan ~{minutos} min {segundos:02d} s" if minutos else f" | quedan ~{segundos} s"
+
+
+def mostrar_avance(perfil):
+    """
+    Barra de progreso con ETA y tabla ÉXITO/DESCUADRE que se llena con cada
+    agencia terminada (eventos de avance del `perfil`). Se llama antes de
+    procesar; devuelve la función que la deja completa al terminar.
+    """
+    barra = st.progress(0.0, text="Leyendo y preparando el archivo...")
+    resumen = st.empty()
+    tabla = st.empty()
+    filas = []
+    pintado = [0.0]
+
+    def pintar():
+        pintado[0] = time.monotonic()
+        if not filas:
+            return
+        df = pd.DataFrame(filas)
+        resumen.caption(f"Agencias terminadas: {len(df)} | ÉXITO: {int((df['ESTADO'] == OK).sum())} | "
+                        f"Para revisar: {int((df['ESTADO'] != OK).sum())}")
+        tabla.dataframe(df, hide_index=True)
+
+    def al_avanzar(evento):
+        filas.append({'AGENCIA': evento['agencia'], 'ESTADO': evento['estado'], 'ALTAS': evento['altas'],
+                      'REGISTROS_BASE': evento['registros_base'], 'FILAS': evento['filas'], 'SEGUNDOS': round(evento['segundos'], 2)})
+        total = '?' if evento['total'] is None else evento['total']
+        barra.progress(perfil.fraccion_avance() or 0.0,
+                       text=f"Agencias: {evento['indice']} de {total} | {evento['agencia']}{_texto_eta(evento['eta'])}")
+        if time.monotonic() - pintado[0] >= INTERVALO_AVANCE:
+            pintar()
+
+    perfil.escuchar(al_avanzar)
+
+    def terminar():
+        barra.empty()
+        pintar()
+    return terminar
+
+
+def revisar_archivo(uploaded_file, requisitos):
+    """
+    Revisa las hojas y cabeceras del archivo subido sin leerlo entero (ver
+    `segmentador.cabeceras`). Si falta algo lo muestra y devuelve False.
+    """
+    problemas = revisar_cabeceras(uploaded_file, requisitos)
+    if problemas:
+        st.error("El archivo no tiene la estructura esperada:\n\n" + "\n".join(f"- {problema}" for problema in problemas))
+    return not problemas
+
+
+def elegir_compresion(key):
+    """Desplegable con el formato del archivo de descarga (ver `salida.COMPRESIONES`)."""
+    opciones = list(COMPRESIONES)
+    return st.selectbox("Formato de la descarga", options=opciones, index=opciones.index(COMPRESION_POR_DEFECTO),
+                        format_func=lambda nombre: COMPRESIONES[nombre][2], key=key)
+
+
+def mostrar_conciliacion(conciliacion, log_data, nombre_base, key):
+    """Resultado del modo "solo validar": agencias que no cuadran y descarga de la tabla completa."""
+    if conciliacion is None:
+        st.error("Ocurrió un error al validar el archivo. Revisa los detalles a continuación.")
+        st.text_area("Log de Errores:", "\n".join(log_data), height=300)
+        return
+    st.subheader("Conciliación ALTAS vs BASE")
+    st.caption(conciliacion.resumen_log()[-1])
+    descuadres = conciliacion.descuadres()
+    if descuadres.empty:
+        st.success("Todas las agencias cuadran.")
+    else:
+        st.dataframe(descuadres, hide_index=True)
+    nombre = f"Conciliacion_{nombre_base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    columna_csv, columna_xlsx = st.columns(2)
+    columna_csv.download_button("Descargar tabla (.csv)", data=conciliacion.a_csv(), file_name=f"{nombre}.csv",
+                                mime="text/csv", key=f"{key}_conciliacion_csv")
+    columna_xlsx.download_button("Descargar tabla (.xlsx)", data=conciliacion.a_xlsx(), file_name=f"{nombre}.xlsx",
+                                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                 key=f"{key}_conciliacion_xlsx")
+    with st.expander("Log de la validación"):
+        st.text_area("Resultado de la validación:", "\n".join(log_data), height=300, key=f"{key}_conciliacion_log")
+
+
+def elegir_segundo_plano(key):
+    return st.checkbox("Ejecutar en segundo plano (la página no se bloquea y el resultado sobrevive a una recarga)", key=key)
+
+
+def usuario_sesion():
+    """Id del usuario para el reparto de la cola: uno por sesión del navegador."""
+    if 'usuario_trabajos' not in st.session_state:
+        st.session_state['usuario_trabajos'] = uuid.uuid4().hex
+    return st.session_state['usuario_trabajos']
+
+
+def enviar_trabajo(pagina, uploaded_file, modo, **ajustes):
+    """Deja el archivo en la cola de trabajos; la página lo sigue con `mostrar_trabajo`."""
+    id_trabajo = cola_global().enviar(usuario_sesion(), modo, uploaded_file.getvalue(), uploaded_file.name,
+                                      pagina=pagina, **ajustes)
+    st.session_state[f"{pagina}_trabajo"] = id_trabajo
+    # En la URL, para volver a encontrarlo después de recargar el navegador.
+    st.query_params['trabajo'] = id_trabajo
+
+
+def mostrar_trabajo(pagina, nombre_base):
+    """
+    Estado del último trabajo en segundo plano de la página: progreso,
+    cancelación y descarga. Sigue visible tras un rerun o una recarga (el id
+    del trabajo queda en la sesión y en la URL).
+    """
+    id_trabajo = st.session_state.get(f"{pagina}_trabajo") or st.query_params.get('trabajo')
+    datos = cola_global().estado(id_trabajo) if id_trabajo else None
+    if datos is None or datos['pagina'] != pagina:
+        return
+    st.subheader("Trabajo en segundo plano")
+    if datos['estado'] not in FINALES:
+        _seguir_trabajo(id_trabajo)
+        return
+    cola = cola_global()
+    st.caption(f"Archivo: {datos['archivo']} | id: {id_trabajo}")
+    if datos['estado'] == TERMINADO:
+        st.success("¡Proceso completado!")
+    elif datos['estado'] == CANCELADO:
+        st.warning(datos['mensaje'])
+    else:
+        st.error(datos['mensaje'] or "Ocurrió un error al procesar el archivo.")
+    log_data = cola.log(id_trabajo)
+    if log_data:
+        st.text_area("Log del proceso:", "\n".join(log_data), height=300, key=f"{pagina}_trabajo_log")
+    ruta = cola.ruta_resultado(id_trabajo)
+    if ruta:
+        # El archivo se lee recién al hacer clic: no queda en la memoria de la sesión.
+        st.download_button(label=f"Descargar todos los reportes ({extension_salida(datos['compresion'])})", data=_leer_al_descargar(ruta),
+                           file_name=f"Reportes_{nombre_base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension_salida(datos['compresion'])}",
+                           mime=mime_salida(datos['compresion']), key=f"{pagina}_trabajo_descarga")
+
+
+def _leer_al_descargar(ruta):
+    def leer():
+        with open(ruta, 'rb') as f:
+            return f.read()
+    return leer
+
+
+@st.fragment(run_every=2)
+def _seguir_trabajo(id_trabajo):
+    cola = cola_global()
+    datos = cola.estado(id_trabajo)
+    if datos['estado'] in FINALES:
+        # Terminó: se vuelve a ejecutar la página entera para mostrar el resultado.
+        st.rerun()
+    if datos['estado'] == EN_COLA:
+        st.info(f"En cola (posición {datos['posicion']}): {datos['archivo']}")
+    else:
+        progreso = datos['progreso']
+        st.info(f"Procesando {datos['archivo']} | etapa: {progreso.get('etapa') or '...'} | "
+                f"agencias generadas: {progreso.get('agencias', 0)} | {progreso.get('segundos', 0):.0f} s")
+        if progreso.get('total'):
+            st.progress(min(progreso.get('agencias', 0) / progreso['total'], 1.0),
+                        text=f"{progreso.get('agencias', 0)} de {progreso['total']} agencias{_texto_eta(progreso.get('eta'))}")
+        if progreso.get('ultima_agencia'):
+            st.caption(f"Última agencia: {progreso['ultima_agencia']} ({progreso.get('ultimo_estado') or '-'})")
+    if st.button("Cancelar trabajo", key=f"cancelar_{id_trabajo}"):
+        cola.cancelar(id_trabajo)
+        st.rerun()
+
+
+def registrar_subida(pagina, uploaded_file):
+    """Cuenta el archivo subido en la memoria de la sesión (ver `segmentador.memoria`)."""
+    gobernador_global().registrar(usuario_sesion(), f"{pagina}_subida", 'subidas', uploaded_file.size)
+
+
+def registrar_tabla(pagina, libro):
+    """Cuenta un libro ya leído (`LibroCargado`) en la memoria de la sesión."""
+    gobernador_global().registrar(usuario_sesion(), f"{pagina}_tabla", 'tablas', tamano_aproximado(libro))
+
+
+def datos_descarga(pagina, zip_file):
+    """
+    Lo que se pasa como `data` a `st.download_button` para el resultado de la
+    página: el resultado mismo o, si la sesión pasó su presupuesto, una
+    función que lo lee del disco al hacer clic.
+    """
+    return gobernador_global().guardar_resultado(usuario_sesion(), f"{pagina}_resultado", zip_file)
+
+
+def mostrar_memoria():
+    """Uso de memoria de la sesión y del servidor en la barra lateral."""
+    gobernador = gobernador_global()
+    gobernador.recortar()
+    uso = gobernador.uso(usuario_sesion())
+    en_memoria = sum(uso[categoria] for categoria in CATEGORIAS)
+    with st.sidebar:
+        st.subheader("Memoria")
+        st.progress(min(en_memoria / gobernador.presupuesto_sesion, 1.0),
+                    text=f"Esta sesión: {en_memoria / MB:.1f} de {gobernador.presupuesto_sesion / MB:.0f} MB")
+        st.caption(" | ".join(f"{etiqueta}: {uso[categoria] / MB:.1f} MB" for categoria, etiqueta in CATEGORIAS.items())
+                   + (f" | En disco: {uso['disco'] / MB:.1f} MB" if uso['disco'] else ""))
+        sesiones, memoria, disco = gobernador.uso_total()
+        st.caption(f"Servidor: {sesiones} sesiones, {memoria / MB:.0f} MB en memoria y {disco / MB:.0f} MB en disco | "
+                   f"cache {cache_global().bytes_en_uso / MB:.0f} MB")
+        st.caption(f"Procesos pesados: {gobernador.en_curso} de {gobernador.procesos_pesados} en curso, {gobernador.en_espera} en espera")
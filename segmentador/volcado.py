@@ -0,0 +1,255 @@
+# segmentador/volcado.py
+"""
+Lectura por partes de la hoja BASE, para libros demasiado grandes para
+cargarla entera.
+
+La hoja se recorre con openpyxl en modo `read_only` (fila a fila, sin tener
+el libro en memoria) en bloques de `filas_por_bloque` filas. Con el motor
+'calamine' la lectura es varias veces más rápida, pero calamine guarda la
+hoja completa (en Rust, más compacta que un DataFrame) mientras se recorre:
+sirve cuando la hoja cabe así pero no como DataFrame. Cada bloque se
+convierte con el mismo parser que usa `pd.read_excel` y se reparte por
+agencia (la clave de cruce, normalizada y con los alias resueltos) en un
+archivo de volcado por agencia en disco. Así nunca hay en memoria más que un
+bloque al leer, y una agencia a la vez al generar los libros:
+`BaseVolcada.obtener(agencia)` se usa igual que `Particion.obtener`.
+
+Las columnas se toman por posición, no por nombre: dos cabeceras que quedan
+iguales al normalizarlas ('X' y 'X ') se exportan las dos, cada una con sus
+valores, igual que al leer la hoja entera.
+
+Los tipos se infieren por bloque: si una columna tiene, por ejemplo, números
+como texto en un bloque y texto en otro, puede quedar distinta que al leer la
+hoja entera.
+
+Variables de entorno:
+    SEGMENTADOR_VOLCADO_DIR        directorio de los volcados (por defecto el temporal del sistema)
+    SEGMENTADOR_FILAS_POR_BLOQUE   filas por bloque (por defecto 50000)
+    SEGMENTADOR_MOTOR_VOLCADO      'openpyxl' (por defecto, memoria acotada) o 'calamine'
+    SEGMENTADOR_POR_PARTES_MB      tamaño de archivo desde el que las páginas leen la BASE por partes (por defecto 150; 0 = nunca)
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import weakref
+from collections import Counter
+from contextlib import closing
+from datetime import date
+
+import openpyxl
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from segmentador.salida import tamano_resultado
+from segmentador.particion import aplicar_alias
+
+MB = 1024 * 1024
+FILAS_POR_BLOQUE = int(os.environ.get('SEGMENTADOR_FILAS_POR_BLOQUE', 50_000))
+MOTOR_VOLCADO = os.environ.get('SEGMENTADOR_MOTOR_VOLCADO', 'openpyxl')
+UMBRAL_POR_PARTES_MB = float(os.environ.get('SEGMENTADOR_POR_PARTES_MB', 150))
+
+
+def usar_por_partes(archivo_excel):
+    """True si el archivo supera el umbral para leer la BASE por partes."""
+    return UMBRAL_POR_PARTES_MB > 0 and tamano_resultado(archivo_excel) >= UMBRAL_POR_PARTES_MB * MB
+
+
+def _normalizar(cabecera):
+    return str(cabecera).strip().upper()
+
+
+def _celda_calamine(valor):
+    # Mismas conversiones que el lector calamine de pandas: vacío a nulo, enteros y fechas.
+    if valor == '':
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if isinstance(valor, date):
+        return pd.Timestamp(valor)
+    return valor
+
+
+def _filas_hoja(archivo_excel, nombre_hoja, motor):
+    """Generador de tuplas con los valores de cada fila (None si la hoja no existe)."""
+    if hasattr(archivo_excel, 'seek'): archivo_excel.seek(0)
+    if motor == 'calamine':
+        from python_calamine import CalamineWorkbook
+        libro = CalamineWorkbook.from_path(archivo_excel) if isinstance(archivo_excel, (str, os.PathLike)) \
+            else CalamineWorkbook.from_filelike(archivo_excel)
+        if nombre_hoja not in libro.sheet_names:
+            libro.close()
+            return None
+        # calamine carga la hoja entera aquí (ver el docstring del módulo); el libro se cierra al agotar las filas.
+        hoja_calamine = libro.get_sheet_by_name(nombre_hoja)
+
+        def filas_calamine():
+            try:
+                for fila in hoja_calamine.iter_rows():
+                    yield tuple(map(_celda_calamine, fila))
+            finally:
+                libro.close()
+        return filas_calamine()
+    libro = openpyxl.load_workbook(archivo_excel, read_only=True, data_only=True)
+    if nombre_hoja not in libro.sheetnames:
+        libro.close()
+        return None
+    hoja = libro[nombre_hoja]
+    # Las dimensiones guardadas en el archivo pueden estar mal; se leen las filas reales.
+    hoja.reset_dimensions()
+
+    def filas():
+        try:
+            yield from hoja.iter_rows(values_only=True)
+        finally:
+            libro.close()
+    return filas()
+
+
+class BaseVolcada:
+    """Filas de la BASE repartidas por agencia en archivos de volcado; mismo uso que `Particion`."""
+
+    def __init__(self, directorio, cabeceras, columnas):
+        self.directorio = directorio
+        # Cabecera completa del archivo (normalizada) y columnas que se exportan.
+        self.cabeceras = cabeceras
+        self.columnas = columnas
+        self._archivos = {}
+        self._filas = Counter()
+        # Valores distintos (sin nulos, en orden de aparición) de las columnas pedidas al volcar.
+        self._unicos = {}
+        self.filas_leidas = 0
+        self.bloques = 0
+        self.segundos = 0.0
+        # El directorio se borra al liberar el objeto (o al salir del proceso).
+        self._finalizador = weakref.finalize(self, shutil.rmtree, directorio, True)
+
+    def __contains__(self, clave):
+        return clave in self._archivos
+
+    def __len__(self):
+        return len(self._archivos)
+
+    def claves(self):
+        return list(self._archivos)
+
+    def filas(self, clave):
+        return self._filas.get(clave, 0)
+
+    def conteos(self):
+        """Registros por agencia, como `conciliacion.conteo_base`."""
+        conteos = pd.Series(list(self._filas.values()), index=pd.Index(list(self._filas), dtype=object), dtype='int64')
+        return conteos
+
+    def valores_unicos(self, columna):
+        return list(self._unicos.get(columna.upper(), ()))
+
+    def validar_cabeceras(self, cabeceras_esperadas):
+        return all(cabecera.upper() in self.cabeceras for cabecera in cabeceras_esperadas)
+
+    def agregar(self, clave, porcion):
+        ruta = self._archivos.get(clave)
+        if ruta is None:
+            ruta = os.path.join(self.directorio, hashlib.sha1(repr(clave).encode('utf-8')).hexdigest()[:20] + '.pkl')
+            self._archivos[clave] = ruta
+        with open(ruta, 'ab') as f:
+            pickle.dump(porcion, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._filas[clave] += len(porcion)
+
+    def obtener(self, clave):
+        """Filas de la agencia en su orden original (vacío, con las columnas, si no tiene)."""
+        ruta = self._archivos.get(clave)
+        if ruta is None:
+            return pd.DataFrame(columns=self.columnas)
+        porciones = []
+        with open(ruta, 'rb') as f:
+            while True:
+                try:
+                    porciones.append(pickle.load(f))
+                except EOFError:
+                    break
+        return pd.concat(porciones, ignore_index=True) if len(porciones) > 1 else porciones[0]
+
+    def bytes_en_disco(self):
+        return sum(os.path.getsize(ruta) for ruta in self._archivos.values())
+
+    def resumen_log(self):
+        return [f"VOLCADO  | BASE leída por partes: {self.filas_leidas} filas en {self.bloques} bloques | "
+                f"{len(self)} agencias | {self.bytes_en_disco() / MB:.1f} MB en disco | {self.segundos:.2f} s"]
+
+    def cerrar(self):
+        self._finalizador()
+
+
+def volcar_base(archivo_excel, columna_clave='ASESOR', normalizar_clave=None, mapeo_alias=None, columnas_hasta=None,
+                unicos=(), nombre_hoja='BASE', filas_por_bloque=None, directorio=None, motor=None):
+    """
+    Recorre `nombre_hoja` por bloques y la reparte por agencia en disco.
+
+    La clave de cada fila es `columna_clave`, pasada por `normalizar_clave`
+    (una función sobre la Serie, p. ej. `normalizar_nombres`) y con
+    `mapeo_alias` aplicado. Las cabeceras quedan en mayúsculas y sin espacios
+    extremos, como las dejan las páginas. Si se indica `columnas_hasta`, solo
+    se exportan las columnas hasta esa (inclusive). De las columnas en
+    `unicos` se guardan los valores distintos (`BaseVolcada.valores_unicos`).
+
+    Si la hoja no existe devuelve None; si falta la columna clave o
+    `columnas_hasta`, devuelve una `BaseVolcada` vacía con la cabecera, para
+    que la página reporte qué falta.
+    """
+    inicio = time.perf_counter()
+    filas_por_bloque = filas_por_bloque or FILAS_POR_BLOQUE
+    filas = _filas_hoja(archivo_excel, nombre_hoja, motor or MOTOR_VOLCADO)
+    if filas is None:
+        return None
+    with closing(filas):
+        cabecera = next(filas, ())
+        nombres = [_normalizar(valor) if valor is not None else f"UNNAMED: {i}" for i, valor in enumerate(cabecera)]
+        columnas = nombres
+        if columnas_hasta and columnas_hasta.upper() in nombres:
+            columnas = nombres[:nombres.index(columnas_hasta.upper()) + 1]
+        base = BaseVolcada(tempfile.mkdtemp(prefix='segmentador_volcado_', dir=directorio or os.environ.get('SEGMENTADOR_VOLCADO_DIR')),
+                           nombres, columnas)
+        if columna_clave.upper() not in nombres or (columnas_hasta and columnas_hasta.upper() not in nombres):
+            return base
+        for columna in unicos:
+            if columna.upper() in nombres:
+                base._unicos[columna.upper()] = {}
+
+        ancho = len(nombres)
+        posicion_clave = nombres.index(columna_clave.upper())
+        posiciones_unicos = {columna: nombres.index(columna) for columna in base._unicos}
+
+        def repartir(bloque):
+            # Nombres por posición: con `names=nombres` el parser renombraría los repetidos ('X', 'X.1').
+            df = TextParser(bloque, names=list(range(ancho)), header=None).read()
+            claves = df[posicion_clave]
+            if normalizar_clave is not None:
+                claves = normalizar_clave(claves)
+            claves = aplicar_alias(claves, mapeo_alias)
+            for columna, vistos in base._unicos.items():
+                vistos.update(dict.fromkeys(df[posiciones_unicos[columna]].dropna().unique().tolist()))
+            exportadas = df.iloc[:, :len(columnas)]
+            exportadas.columns = columnas
+            for clave, posiciones in exportadas.groupby(claves.to_numpy(), sort=False).indices.items():
+                base.agregar(clave, exportadas.take(posiciones).reset_index(drop=True))
+            base.filas_leidas += len(df)
+            base.bloques += 1
+
+        bloque = []
+        for fila in filas:
+            # Filas más cortas o más largas que la cabecera (read_only no conoce el ancho real).
+            if len(fila) != ancho:
+                fila = (fila + (None,) * ancho)[:ancho]
+            if all(valor is None for valor in fila):
+                continue
+            bloque.append(fila)
+            if len(bloque) >= filas_por_bloque:
+                repartir(bloque)
+                bloque = []
+        if bloque:
+            repartir(bloque)
+    base.segundos = time.perf_counter() - inicio
+    return base
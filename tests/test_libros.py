@@ -0,0 +1,130 @@
+# tests/test_libros.py
+"""
+`libro_lima` y `libro_corte_2` contra el `to_excel` de las páginas originales,
+celda por celda: valores, formatos de número, estilo de cabecera y anchos.
+"""
+import io
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+
+from segmentador import escritor
+from segmentador.libros import libro_corte_2, libro_lima
+
+
+# --- Escritura de las páginas originales (sin cambios) ---
+
+def original_lima(reporte_agencia, base_agencia_final):
+    output_buffer = io.BytesIO()
+    with pd.ExcelWriter(output_buffer, engine='xlsxwriter') as writer: # type: ignore
+        reporte_agencia.to_excel(writer, sheet_name='Reporte Agencia', index=False) # type: ignore
+        base_agencia_final.to_excel(writer, sheet_name='BASE', index=False) # type: ignore
+        workbook, worksheet = writer.book, writer.sheets['Reporte Agencia']
+        percent_format, number_format = workbook.add_format({'num_format': '0.00%'}), workbook.add_format({'num_format': '#,##0.00'})
+        header = list(reporte_agencia.columns)
+        try:
+            worksheet.set_column(header.index('CUMPLIMIENTO ALTAS %'), header.index('CUMPLIMIENTO ALTAS %'), 18, percent_format)
+            worksheet.set_column(header.index('TOTAL A PAGAR'), header.index('TOTAL A PAGAR'), 18, number_format)
+        except ValueError: pass
+    return output_buffer.getvalue()
+
+
+def original_corte_2(reporte_agencia_final, base_agencia):
+    output_buffer = io.BytesIO()
+    with pd.ExcelWriter(output_buffer, engine='xlsxwriter') as writer: # type: ignore
+        reporte_agencia_final.to_excel(writer, sheet_name='Reporte CORTE 2', index=False)
+        base_agencia.to_excel(writer, sheet_name='BASE', index=False)
+
+        workbook, worksheet = writer.book, writer.sheets['Reporte CORTE 2']
+        percent_format = workbook.add_format({'num_format': '0.00%'})
+        header_penalidad = workbook.add_format({'bold': True, 'font_color': 'white', 'fg_color': '#0070C0', 'border': 1})
+        header_clawback = workbook.add_format({'bold': True, 'font_color': 'white', 'fg_color': '#002060', 'border': 1})
+        default_header = workbook.add_format({'bold': True, 'fg_color': '#FFC000', 'border': 1})
+
+        header = reporte_agencia_final.columns.tolist()
+        for i, h_text in enumerate(header):
+            if h_text.startswith('PENALIDAD 1 -'): worksheet.write(0, i, h_text, header_penalidad)
+            elif h_text.startswith('CLAWBACK 1 -'): worksheet.write(0, i, h_text, header_clawback)
+            else: worksheet.write(0, i, h_text, default_header)
+
+        for col_name in ['Cumplimiento Altas %', 'CLAWBACK 1 - Cumplimiento Corte 2 %']:
+            try:
+                worksheet.set_column(header.index(col_name), header.index(col_name), 18, percent_format)
+            except ValueError: pass
+    return output_buffer.getvalue()
+
+
+def _hojas(contenido):
+    """{hoja: (celdas, columnas)} con todo lo que se ve del libro."""
+    libro = openpyxl.load_workbook(io.BytesIO(contenido))
+    hojas = {}
+    for hoja in libro.worksheets:
+        celdas = {
+            celda.coordinate: (celda.value, celda.number_format, celda.font.b, celda.font.color and celda.font.color.rgb,
+                               celda.fill.fgColor.rgb, celda.border.left.style)
+            for fila in hoja.iter_rows() for celda in fila
+        }
+        columnas = {letra: (dim.width, dim.number_format) for letra, dim in hoja.column_dimensions.items() if dim.customWidth}
+        hojas[hoja.title] = (celdas, columnas)
+    return hojas
+
+
+def _base(filas):
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        'COD_PEDIDO': np.arange(filas),
+        'ASESOR': 'AGENCIA 1',
+        'PRECIO': rng.random(filas) * 100,
+        'FECHA': pd.Timestamp('2024-03-01') + pd.to_timedelta(np.arange(filas), unit='h'),
+        'PLAN': [None if i % 5 == 0 else f"PLAN {i % 3}" for i in range(filas)],
+    })
+
+
+def _reporte_lima(columnas):
+    reporte = pd.DataFrame({
+        'AGENCIA': ['AGENCIA 1'], 'ALTAS': [12], 'CUMPLIMIENTO ALTAS %': [0.8731],
+        'TOTAL A PAGAR': [1234.5], 'NOTA': [np.nan], 'TOPE': [np.inf], 'CORTE': [datetime(2024, 3, 31)],
+    })
+    return reporte[columnas]
+
+
+LIMA = {
+    'completo': ['AGENCIA', 'ALTAS', 'CUMPLIMIENTO ALTAS %', 'TOTAL A PAGAR', 'NOTA', 'TOPE', 'CORTE'],
+    'sin_cumplimiento': ['AGENCIA', 'ALTAS', 'TOTAL A PAGAR', 'NOTA'],
+    'sin_total': ['AGENCIA', 'CUMPLIMIENTO ALTAS %', 'ALTAS'],
+    'orden_invertido': ['TOTAL A PAGAR', 'AGENCIA', 'CUMPLIMIENTO ALTAS %'],
+}
+
+CORTE_2 = {
+    'completo': ['RUC', 'AGENCIA', 'Cumplimiento Altas %', 'PENALIDAD 1 - Monto', 'CLAWBACK 1 - Cumplimiento Corte 2 %', 'CLAWBACK 1 - Monto'],
+    'sin_cumplimiento_altas': ['RUC', 'AGENCIA', 'PENALIDAD 1 - Monto', 'CLAWBACK 1 - Cumplimiento Corte 2 %'],
+    'sin_porcentajes': ['RUC', 'AGENCIA', 'PENALIDAD 1 - Monto'],
+}
+
+
+def _reporte_corte_2(columnas):
+    valores = {'RUC': ['20123456789'], 'AGENCIA': ['AGENCIA 1'], 'Cumplimiento Altas %': [0.95],
+               'PENALIDAD 1 - Monto': [np.nan], 'CLAWBACK 1 - Cumplimiento Corte 2 %': [1.02], 'CLAWBACK 1 - Monto': [-15.25]}
+    return pd.DataFrame({nombre: valores[nombre] for nombre in columnas})
+
+
+@pytest.fixture(params=['en_memoria', 'constant_memory'])
+def modo(request, monkeypatch):
+    if request.param == 'constant_memory':
+        monkeypatch.setattr(escritor, 'FILAS_STREAMING', 0)
+    return request.param
+
+
+@pytest.mark.parametrize('caso', list(LIMA))
+def test_libro_lima_igual_al_original(caso, modo):
+    reporte, base = _reporte_lima(LIMA[caso]), _base(40)
+    assert _hojas(libro_lima(reporte, base)) == _hojas(original_lima(reporte, base))
+
+
+@pytest.mark.parametrize('caso', list(CORTE_2))
+def test_libro_corte_2_igual_al_original(caso, modo):
+    reporte, base = _reporte_corte_2(CORTE_2[caso]), _base(40)
+    assert _hojas(libro_corte_2(reporte, base)) == _hojas(original_corte_2(reporte, base))
@@ -0,0 +1,121 @@
+# tests/test_normalizacion.py
+"""
+Prueba diferencial: las versiones vectorizadas de `segmentador.normalizacion`
+deben dar exactamente lo mismo que las funciones originales de las páginas,
+copiadas aquí tal cual.
+"""
+import random
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from segmentador.normalizacion import (agencias_base, agencias_base_comparando_normalizado, normalizar_nombre,
+                                       normalizar_nombres)
+
+
+# --- Originales (Pages/2_Reportes_Provincia.py y Pages/4_Reportes_Provincia_Corte_2.py) ---
+def normalizar_nombre_original(nombre):
+    if not isinstance(nombre, str): return ""
+    nombre_limpio = nombre.upper().replace('.', '').replace(',', '').replace('-', '')
+    return re.sub(r'\s+', ' ', nombre_limpio).strip()
+
+def get_agencia_base_corte_1(nombre_completo, lista_departamentos):
+    if not isinstance(nombre_completo, str): return ""
+    nombre_completo_norm = normalizar_nombre_original(nombre_completo)
+    for depto in lista_departamentos:
+        if nombre_completo_norm.endswith(normalizar_nombre_original(depto)):
+            nombre_base = nombre_completo[:-len(depto)].strip()
+            return nombre_base
+    return nombre_completo.strip()
+
+def get_agencia_base_corte_2(nombre_completo, lista_departamentos):
+    """
+    Separa el nombre base de la agencia del departamento de forma robusta.
+    Ej: 'MI AGENCIA PIURA' -> 'MI AGENCIA'
+    """
+    if not isinstance(nombre_completo, str):
+        return ""
+    
+    # La lista de departamentos ya viene ordenada del más largo al más corto.
+    for depto in lista_departamentos:
+        # Creamos un patrón para buscar el departamento al final del string,
+        # precedido de al menos un espacio. Es insensible a mayúsculas/minúsculas.
+        pattern = r'\s+' + re.escape(depto) + '$'
+        
+        # Intentamos sustituir el patrón encontrado por una cadena vacía.
+        cleaned_name, num_subs = re.subn(pattern, '', nombre_completo, flags=re.IGNORECASE)
+        
+        # Si se hizo una sustitución, encontramos el departamento.
+        if num_subs > 0:
+            return cleaned_name.strip()
+            
+    # Si no se encontró ningún departamento como sufijo, devolvemos el nombre original.
+    return nombre_completo.strip()
+
+
+# Con departamentos que son sufijo de otros ('MARTIN' / 'SAN MARTIN', 'LIMA' / 'PROVINCIA LIMA') y con tildes.
+DEPARTAMENTOS = ['LIMA', 'PROVINCIA LIMA', 'SAN MARTIN', 'MARTIN', 'ÁNCASH', 'ANCASH', 'La Libertad', 'PIURA', 'Junín',
+                 'MADRE DE DIOS', 'DIOS', 'CUSCO']
+EXTREMOS = [
+    'MI AGENCIA PIURA', 'mi agencia piura', 'AGENCIA  SAN   MARTIN', 'AGENCIA SAN MARTIN', 'AGENCIA XSAN MARTIN',
+    'AGENCIA MARTIN', 'AGENCIA PROVINCIA LIMA', 'AGENCIA LIMA', 'AGENCIALIMA', 'LIMA', 'lima', ' PIURA ', 'SAN MARTIN',
+    'AGENCIA ÁNCASH', 'AGENCIA áncash', 'AGENCIA ANCASH', 'AGENCIA JUNÍN', 'AGENCIA junín', 'Ñandú E.I.R.L. La Libertad',
+    'S.A.C. - PIURA', 'AGENCIA S.A.C.', 'AGENCIA, S.A.C. MADRE DE DIOS', 'AGENCIA DIOS', 'AGENCIA\tCUSCO', 'AGENCIA CUSCO\n',
+    'AGENCIA PIURA.', 'AGENCIA PI-URA', '', '   ', 'Á', np.nan, None, 123, 4.5, pd.NaT,
+]
+
+
+def _nombres_aleatorios(cantidad, semilla):
+    azar = random.Random(semilla)
+    palabras = ['AGENCIA', 'Agencia', 'SAC', 'S.A.C.', 'E.I.R.L.', 'ÑANDÚ', 'Peña', 'TELECOM', 'san', 'lima', 'DEL', '-', ',', 'Ó']
+    separadores = [' ', '  ', '\t', ' \n ', '', '.', '-']
+    nombres = []
+    for _ in range(cantidad):
+        nombre = ''.join(azar.choice(palabras) + azar.choice(separadores) for _ in range(azar.randint(1, 4)))
+        if azar.random() < 0.7:
+            depto = azar.choice(DEPARTAMENTOS)
+            depto = azar.choice([depto, depto.upper(), depto.lower(), depto.replace(' ', '  ')])
+            nombre += azar.choice(separadores) + depto
+        if azar.random() < 0.2:
+            nombre = azar.choice(['', ' ']) + nombre + azar.choice(['', ' ', '.'])
+        nombres.append(nombre)
+    return nombres
+
+
+def _casos():
+    return EXTREMOS + _nombres_aleatorios(3000, semilla=7)
+
+
+def _departamentos(departamentos):
+    # Como en las páginas: del más largo al más corto.
+    return sorted(departamentos, key=len, reverse=True)
+
+
+def test_normalizar_nombre():
+    casos = _casos()
+    esperado = [normalizar_nombre_original(nombre) for nombre in casos]
+    assert [normalizar_nombre(nombre) for nombre in casos] == esperado
+    assert normalizar_nombres(pd.Series(casos, dtype=object)).tolist() == esperado
+
+
+@pytest.mark.parametrize('departamentos', [DEPARTAMENTOS, DEPARTAMENTOS[:3], ['LIMA'], []])
+def test_agencias_base_corte_2(departamentos):
+    casos, lista = _casos(), _departamentos(departamentos)
+    esperado = [get_agencia_base_corte_2(nombre, lista) for nombre in casos]
+    assert agencias_base(pd.Series(casos, dtype=object), lista).tolist() == esperado
+
+
+@pytest.mark.parametrize('departamentos', [DEPARTAMENTOS, DEPARTAMENTOS[:3], ['LIMA'], []])
+def test_agencias_base_comparando_normalizado_corte_1(departamentos):
+    casos, lista = _casos(), _departamentos(departamentos)
+    esperado = [get_agencia_base_corte_1(nombre, lista) for nombre in casos]
+    assert agencias_base_comparando_normalizado(pd.Series(casos, dtype=object), lista).tolist() == esperado
+
+
+def test_conserva_indice_y_nombre():
+    serie = pd.Series(['AGENCIA LIMA', np.nan, 'AGENCIA LIMA'], index=[10, 20, 30], name='AGENCIA')
+    for resultado in (normalizar_nombres(serie), agencias_base(serie, ['LIMA']), agencias_base_comparando_normalizado(serie, ['LIMA'])):
+        assert resultado.index.tolist() == [10, 20, 30]
+        assert resultado.name == 'AGENCIA'
@@ -0,0 +1,45 @@
+# tests/test_salida.py
+"""Cada formato de `COMPRESIONES` entrega los libros intactos, en orden y con el método pedido."""
+import io
+import tarfile
+import zipfile
+
+import pandas as pd
+import pytest
+
+from segmentador.libros import libro_lima
+from segmentador.salida import COMPRESIONES, abrir_salida, escribir_libros
+
+
+def _tareas():
+    for i in range(5):
+        reporte = pd.DataFrame({'AGENCIA': [f"AG {i}"], 'ALTAS': [i], 'CUMPLIMIENTO ALTAS %': [0.5], 'TOTAL A PAGAR': [10.0 * i]})
+        base = pd.DataFrame({'COD_PEDIDO': range(i * 10), 'ASESOR': f"AG {i}"})
+        yield f"Reporte AG {i}.xlsx", (reporte, base)
+
+
+@pytest.mark.parametrize('compresion', list(COMPRESIONES))
+@pytest.mark.parametrize('trabajadores', [1, 2])
+def test_libros_intactos(compresion, trabajadores):
+    esperados = {nombre: libro_lima(*argumentos) for nombre, argumentos in _tareas()}
+    with abrir_salida(compresion, umbral_en_memoria=0) as salida:
+        escribir_libros(salida, _tareas(), libro_lima, trabajadores)
+    resultado = io.BytesIO(salida.para_descarga().read())
+    if compresion == 'tar':
+        with tarfile.open(fileobj=resultado) as tar:
+            obtenidos = {miembro.name: tar.extractfile(miembro).read() for miembro in tar.getmembers()}
+            nombres = tar.getnames()
+    else:
+        with zipfile.ZipFile(resultado) as zf:
+            assert zf.testzip() is None
+            assert {info.compress_type for info in zf.infolist()} == {COMPRESIONES[compresion][0]}
+            obtenidos = {nombre: zf.read(nombre) for nombre in zf.namelist()}
+            nombres = zf.namelist()
+    assert nombres == list(esperados)
+    # Los .xlsx llevan la fecha de creación: se comparan las hojas, no los bytes.
+    for nombre, contenido in obtenidos.items():
+        leido = pd.read_excel(io.BytesIO(contenido), sheet_name=None)
+        original = pd.read_excel(io.BytesIO(esperados[nombre]), sheet_name=None)
+        assert leido.keys() == original.keys()
+        for hoja in leido:
+            pd.testing.assert_frame_equal(leido[hoja], original[hoja])
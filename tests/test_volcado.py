@@ -0,0 +1,104 @@
+# tests/test_volcado.py
+"""La BASE volcada por partes debe coincidir, columna por columna, con la leída entera."""
+import os
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from segmentador.volcado import volcar_base
+
+
+def _libro(ruta, cabecera, filas):
+    libro = openpyxl.Workbook()
+    hoja = libro.active
+    hoja.title = 'BASE'
+    hoja.append(cabecera)
+    for fila in filas:
+        hoja.append(fila)
+    libro.save(ruta)
+    return ruta
+
+
+def _en_memoria(ruta):
+    df = pd.read_excel(ruta, sheet_name='BASE')
+    df.columns = df.columns.str.strip().str.upper()
+    return df
+
+
+@pytest.mark.parametrize('motor', ['openpyxl', 'calamine'])
+@pytest.mark.parametrize('filas_por_bloque', [1, 2, 1000])
+def test_cabeceras_repetidas_al_normalizar(tmp_path, motor, filas_por_bloque):
+    if motor == 'calamine':
+        pytest.importorskip('python_calamine')
+    ruta = _libro(tmp_path / 'base.xlsx', ['X', 'X ', 'ASESOR', 'RECIBO1_PAGADO', 'OTRA'],
+                  [[1, 4, 'A', 'SI', 'z'], [7, 8, 'B', 'NO', 'z'], [3, 6, 'A', 'NO', 'z']])
+    base = volcar_base(ruta, 'ASESOR', columnas_hasta='RECIBO1_PAGADO', filas_por_bloque=filas_por_bloque,
+                       directorio=tmp_path, motor=motor)
+    try:
+        completa = _en_memoria(ruta).iloc[:, :4]
+        assert base.columnas == list(completa.columns)
+        for asesor in ('A', 'B'):
+            esperado = completa[completa['ASESOR'].to_numpy() == asesor].reset_index(drop=True)
+            pd.testing.assert_frame_equal(base.obtener(asesor), esperado)
+        assert base.obtener('A').iloc[:, :2].values.tolist() == [[1, 4], [3, 6]]
+    finally:
+        base.cerrar()
+
+
+@pytest.mark.parametrize('motor', ['openpyxl', 'calamine'])
+def test_misma_base_que_en_memoria(tmp_path, motor):
+    if motor == 'calamine':
+        pytest.importorskip('python_calamine')
+    filas = [[i, f"D{i:05d}", ['AG 1', 'AG 2', 'AG 3'][i % 3], i * 1.5, None if i % 4 else 'x', 'SI'] for i in range(50)]
+    ruta = _libro(tmp_path / 'base.xlsx', [' COD_PEDIDO', 'dni_cliente', 'ASESOR', 'MONTO', 'NOTA', 'RECIBO1_PAGADO'], filas)
+    base = volcar_base(ruta, 'ASESOR', filas_por_bloque=7, directorio=tmp_path, motor=motor)
+    try:
+        completa = _en_memoria(ruta)
+        assert base.cabeceras == list(completa.columns)
+        assert base.filas_leidas == len(completa)
+        for asesor in completa['ASESOR'].unique():
+            esperado = completa[completa['ASESOR'] == asesor].reset_index(drop=True)
+            pd.testing.assert_frame_equal(base.obtener(asesor), esperado, check_dtype=False)
+    finally:
+        base.cerrar()
+
+
+def _consolidado_lima(ruta):
+    libro = openpyxl.Workbook()
+    reporte = libro.active
+    reporte.title = 'Reporte CORTE 1'
+    reporte.append(['RUC', 'AGENCIA', 'ALTAS', 'TOTAL A PAGAR'])
+    reporte.append(['20100000001', 'AG 1', 2, 10.0])
+    base = libro.create_sheet('BASE')
+    base.append(['COD_PEDIDO', 'DNI_CLIENTE', 'ASESOR', 'RECIBO1_PAGADO'])
+    base.append([1, '40000001', 'AG 1', 'SI'])
+    base.append([2, '40000002', 'AG 1', 'NO'])
+    libro.save(ruta)
+    return ruta
+
+
+def _fallar(*args, **kwargs):
+    raise RuntimeError("fallo al escribir")
+
+
+@pytest.mark.parametrize('caso', ['solo_validar', 'error_al_escribir'])
+def test_volcado_se_borra_al_terminar(tmp_path, monkeypatch, caso):
+    from segmentador import lima
+    # Se guarda una referencia a cada volcado: el directorio solo puede borrarlo `cerrar()`, no el recolector.
+    volcados = []
+
+    def volcar(*args, **kwargs):
+        volcados.append(volcar_base(*args, directorio=tmp_path, **kwargs))
+        return volcados[-1]
+    monkeypatch.setattr(lima, 'volcar_base', volcar)
+    with open(_consolidado_lima(tmp_path / 'lima.xlsx'), 'rb') as archivo:
+        if caso == 'solo_validar':
+            conciliacion, _ = lima.procesar_archivos_excel(archivo, solo_validar=True, por_partes=True)
+            assert conciliacion is not None
+        else:
+            monkeypatch.setattr(lima, 'escribir_libros', _fallar)
+            with pytest.raises(RuntimeError):
+                lima.procesar_archivos_excel(archivo, por_partes=True)
+    assert len(volcados) == 1
+    assert not os.path.exists(volcados[0].directorio)